@@ -0,0 +1,63 @@
+""" Compare reading SRIM output tables with np.genfromtxt and pysrim
+
+Run from the root of the repository::
+
+    python benchmarks/read_table.py [repeat]
+"""
+import os
+import re
+import sys
+import timeit
+from io import BytesIO
+
+import numpy as np
+
+# srim is imported from this checkout, installed or not
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from srim.output import _read_table_start, _read_numeric_block
+
+
+TESTDATA_DIRECTORY = 'test_files'
+FILENAMES = ['IONIZ.txt', 'VACANCY.txt', 'NOVAC.txt', 'E2RECOIL.txt', 'PHONON.txt', 'RANGE.txt']
+
+
+def read_table_genfromtxt(output):
+    """Implementation of pysrim <= 0.5.10"""
+    match = re.search(b'=+(.*)-+(?:\\s+-+)+', output, re.DOTALL)
+    return np.genfromtxt(BytesIO(output[match.end():]), max_rows=100)
+
+
+def read_table(output):
+    return _read_numeric_block(output, _read_table_start(output).end())
+
+
+def outputs():
+    for directory in sorted(os.listdir(TESTDATA_DIRECTORY)):
+        for filename in FILENAMES:
+            path = os.path.join(TESTDATA_DIRECTORY, directory, filename)
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                output = f.read()
+            if b'Kinchin-Pease' in output and filename == 'NOVAC.txt':
+                continue
+            yield path, output
+
+
+def main(repeat=200):
+    total_old = total_new = 0.0
+    print('{:32} {:>10} {:>10} {:>8}'.format('file', 'genfromtxt', 'pysrim', 'speedup'))
+    for path, output in outputs():
+        assert np.array_equal(read_table_genfromtxt(output), read_table(output))
+        old = min(timeit.repeat(lambda: read_table_genfromtxt(output), number=repeat, repeat=3)) / repeat
+        new = min(timeit.repeat(lambda: read_table(output), number=repeat, repeat=3)) / repeat
+        total_old += old
+        total_new += new
+        print('{:32} {:>8.1f}us {:>8.1f}us {:>7.1f}x'.format(path, old * 1e6, new * 1e6, old / new))
+    print('{:32} {:>8.1f}us {:>8.1f}us {:>7.1f}x'.format(
+        'total', total_old * 1e6, total_new * 1e6, total_old / total_new))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,77 @@
+""" Compare reading SR_OUTPUT.txt stopping tables line by line and vectorized
+
+Run from the root of the repository::
+
+    python benchmarks/sr_output.py [repeat]
+"""
+import os
+import re
+import sys
+import timeit
+from io import BytesIO
+
+import numpy as np
+
+# srim is imported from this checkout, installed or not
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from srim.output import SRResults
+
+
+TESTDATA_DIRECTORY = 'test_files'
+DIRECTORIES = ['SRIM', '5']
+
+
+def read_stopping_table_lines(output):
+    """Implementation of pysrim <= 0.5.10"""
+    table_header_regexp = r'\s+Ion\s+dE/dx\s+(.*\r\n){3}'
+    table_header_match = re.search(table_header_regexp.encode('utf-8'), output)
+
+    table_footer_regexp = r'\s*-*\r\n\sMultiply'
+    table_footer_match = re.search(table_footer_regexp.encode('utf-8'), output)
+
+    start_idx = table_header_match.end()
+    stop_idx = table_footer_match.start()
+
+    rawdata = BytesIO(output[start_idx:stop_idx]).read().decode('utf-8')
+
+    output_array = [[] for i in range(6)]
+
+    energy_conversion = lambda a: 1 if ('keV' in a) else (1e3 if ('MeV' in a) else (1e6 if 'GeV' in a else (1e-3 if 'eV' in a else None)))
+    length_conversion = lambda a: 1 if ('um' in a) else (1e-4 if ('A' in a) else (1e3 if ('mm' in a) else None))
+
+    for line in rawdata.split('\r\n'):
+        line_array = line.split()
+        E_coeff = list(map(energy_conversion,(filter(energy_conversion, line_array))))[0]
+        L_coeff = list(map(length_conversion, filter(length_conversion, line_array)))
+
+        energy = float(line_array[0])*E_coeff
+        Se = float(line_array[2])
+        Sn = float(line_array[3])
+        Range = float(line_array[4])*L_coeff[0]
+        long_straggle = float(line_array[6])*L_coeff[1]
+        lat_straggle = float(line_array[8])*L_coeff[2]
+
+        [output_array[i].append(d) for i, d in zip(range(6), [energy, Se, Sn, Range, long_straggle, lat_straggle])]
+
+    return np.array(output_array)
+
+
+def read_stopping_table(output):
+    return SRResults._read_stopping_table(None, output)
+
+
+def main(repeat=200):
+    print('{:32} {:>10} {:>10} {:>8}'.format('file', 'lines', 'pysrim', 'speedup'))
+    for directory in DIRECTORIES:
+        path = os.path.join(TESTDATA_DIRECTORY, directory, 'SR_OUTPUT.txt')
+        with open(path, 'rb') as f:
+            output = f.read()
+        assert np.allclose(read_stopping_table_lines(output), read_stopping_table(output), rtol=1e-12)
+        old = min(timeit.repeat(lambda: read_stopping_table_lines(output), number=repeat, repeat=3)) / repeat
+        new = min(timeit.repeat(lambda: read_stopping_table(output), number=repeat, repeat=3)) / repeat
+        print('{:32} {:>8.1f}us {:>8.1f}us {:>7.1f}x'.format(path, old * 1e6, new * 1e6, old / new))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
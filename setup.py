@@ -41,5 +41,8 @@ setup(
     },
     setup_requires=['pytest-runner', 'setuptools>=38.6.0'],  # >38.6.0 needed for markdown README.md
     install_requires=['pyyaml', 'numpy>=1.10.0'],
+    entry_points={
+        'console_scripts': ['pysrim=srim.cli:main'],
+    },
     tests_require=['pytest', 'pytest-mock', 'pytest-cov'],
 )
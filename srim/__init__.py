@@ -1,3 +1,7 @@
 from .srim import TRIM, SR
+from .pool import TRIMPool, run_many
+from .sweep import Sweep
+from .zbl import ZBL
+from .library import StoppingLibrary
 
 from .core import ElementDB, Element, Material, Ion, Layer, Target
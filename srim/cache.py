@@ -0,0 +1,339 @@
+""" On-disk cache of SRIM calculations
+
+TRIM results are keyed on the exact bytes of the generated input files
+and SR results on a canonical description of the ion, layer and
+settings. Both include the identity of the SRIM executable. Identical
+calculations therefore only need to be run once.
+
+Each cache entry is a directory of output files. The modification
+time of an entry records when it was last used and the least recently
+used entries are removed first when the cache exceeds its maximum
+size.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from collections import namedtuple
+
+from .sandbox import TRIM_OUTPUT_FILES
+from .output import SRResults
+from .config import DEFAULT_CACHE_DIRECTORY
+
+
+CacheEntry = namedtuple('CacheEntry', ['key', 'path', 'size', 'last_used'])
+
+_executable_digests = {}
+
+
+def executable_digest(filename):
+    """sha256 digest of an executable
+
+    Digests are remembered for the lifetime of the process as long as
+    the size and modification time of the file do not change.
+    """
+    filename = os.path.realpath(filename)
+    stat = os.stat(filename)
+    identity = (filename, stat.st_size, stat.st_mtime)
+    if identity not in _executable_digests:
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _executable_digests[identity] = digest.hexdigest()
+    return _executable_digests[identity]
+
+
+def _directory_size(directory):
+    size = 0
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            size += os.path.getsize(os.path.join(root, filename))
+    return size
+
+
+class Cache(object):
+    """ Size bounded directory of cache entries
+
+    Parameters
+    ----------
+    directory : :obj:`str`, optional
+        directory to store entries in. Default
+        ``$XDG_CACHE_HOME/pysrim`` (``~/.cache/pysrim``)
+    max_size : :obj:`int`, optional
+        maximum size in bytes of all entries. Default ``None``
+        (unbounded)
+    """
+    namespace = None
+
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY, max_size=None):
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+
+    @property
+    def entries_directory(self):
+        """Directory containing cache entries"""
+        return os.path.join(self.directory, self.namespace)
+
+    def _entry_path(self, key):
+        return os.path.join(self.entries_directory, key)
+
+    def get(self, key):
+        """Path to cache entry ``key`` or ``None`` if missing
+
+        Marks entry as most recently used.
+        """
+        path = self._entry_path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:  # removed by another process
+            return None
+        return path
+
+    def _put_directory(self, key, directory):
+        """Atomically move ``directory`` into cache as entry ``key``"""
+        path = self._entry_path(key)
+        try:
+            os.rename(directory, path)
+        except OSError:  # another process stored the same entry
+            shutil.rmtree(directory, ignore_errors=True)
+        if self.max_size is not None:
+            self.prune(self.max_size)
+        return path
+
+    def _new_entry_directory(self):
+        if not os.path.isdir(self.entries_directory):
+            os.makedirs(self.entries_directory)
+        return tempfile.mkdtemp(prefix='.tmp-', dir=self.entries_directory)
+
+    def entries(self):
+        """All cache entries ordered from least to most recently used
+
+        Returns
+        -------
+        :obj:`list` of :class:`srim.cache.CacheEntry`
+        """
+        if not os.path.isdir(self.entries_directory):
+            return []
+
+        entries = []
+        for key in os.listdir(self.entries_directory):
+            path = self._entry_path(key)
+            if key.startswith('.') or not os.path.isdir(path):
+                continue
+            try:
+                entries.append(CacheEntry(key, path, _directory_size(path), os.path.getmtime(path)))
+            except OSError:  # removed by another process
+                continue
+        return sorted(entries, key=lambda entry: entry.last_used)
+
+    @property
+    def size(self):
+        """Total size in bytes of cache entries"""
+        return sum(entry.size for entry in self.entries())
+
+    def remove(self, key):
+        """Remove cache entry ``key``"""
+        shutil.rmtree(self._entry_path(key), ignore_errors=True)
+
+    def prune(self, max_size=None):
+        """Remove least recently used entries until cache is at most ``max_size`` bytes
+
+        Parameters
+        ----------
+        max_size : :obj:`int`, optional
+            Default ``max_size`` of cache. Zero removes all entries.
+
+        Returns
+        -------
+        :obj:`list` of :class:`srim.cache.CacheEntry`
+            removed entries
+        """
+        if max_size is None:
+            max_size = self.max_size
+        if max_size is None:
+            return []
+
+        entries = self.entries()
+        size = sum(entry.size for entry in entries)
+        removed = []
+        for entry in entries:
+            if size <= max_size:
+                break
+            self.remove(entry.key)
+            size -= entry.size
+            removed.append(entry)
+        return removed
+
+    def clear(self):
+        """Remove all cache entries"""
+        return self.prune(0)
+
+
+class TRIMCache(Cache):
+    """ Cache of TRIM output files
+
+    Key is the sha256 of ``TRIMAUTO``, ``TRIM.IN`` and
+    ``TRIM.exe``. Since the random seed is part of ``TRIM.IN``
+    calculations are only reused when a ``random_seed`` is supplied
+    to :class:`srim.srim.TRIM`.
+
+    See :class:`srim.cache.Cache` for parameters.
+
+    Examples
+    --------
+    >>> cache = TRIMCache(max_size=10 * 1024**3)
+    >>> results = trim.run('/tmp/srim', cache=cache)
+    """
+    namespace = 'trim'
+
+    def key(self, trim, srim_directory):
+        """Cache key of TRIM calculation
+
+        Parameters
+        ----------
+        trim : :class:`srim.srim.TRIM`
+            calculation
+        srim_directory : :obj:`str`
+            path to srim directory containing ``TRIM.exe``
+        """
+        digest = hashlib.sha256()
+        for input_file in trim._input_files():
+            digest.update(input_file.to_bytes())
+            digest.update(b'\0')
+        digest.update(executable_digest(os.path.join(srim_directory, 'TRIM.exe')).encode('utf-8'))
+        return digest.hexdigest()
+
+    def put(self, key, srim_directory):
+        """Copy TRIM input and output files in ``srim_directory`` to cache entry ``key``
+
+        Output files are looked for in ``srim_directory`` and
+        ``<srim_directory>/SRIM Outputs``. Files are copied not moved.
+
+        Returns
+        -------
+        :obj:`str`
+            path to cache entry
+        """
+        entry_directory = self._new_entry_directory()
+        for filename in {'TRIM.IN'} | TRIM_OUTPUT_FILES:
+            for directory in [srim_directory, os.path.join(srim_directory, 'SRIM Outputs')]:
+                path = os.path.join(directory, filename)
+                if os.path.isfile(path):
+                    shutil.copy(path, entry_directory)
+                    break
+        return self._put_directory(key, entry_directory)
+
+
+class SRCache(Cache):
+    """ Cache of parsed SR stopping tables
+
+    Key is the sha256 of a canonical fingerprint of the layer
+    (phase, density and elements with mass and stoichiometry), the
+    ion (atomic number and mass), the SR settings and
+    ``SRModule.exe``. The ion energy is not part of the key: a cached
+    table is reused for any ion energy it covers and replaced when a
+    calculation with a larger energy range is stored.
+
+    Entries store :class:`srim.output.SRResults` with
+    :meth:`srim.output.SRResults.save`.
+
+    See :class:`srim.cache.Cache` for parameters.
+
+    Examples
+    --------
+    >>> cache = SRCache()
+    >>> results = sr.run('/tmp/srim', cache=cache)
+    """
+    namespace = 'sr'
+    filename = 'SR_OUTPUT.npz'
+
+    @staticmethod
+    def fingerprint(sr):
+        """Canonical description of everything that determines an SR table except ion energy"""
+        elements = sorted(
+            [element.atomic_number, repr(float(element.mass)), repr(properties['stoich'])]
+            for element, properties in sr.layer.elements.items())
+        return {
+            'ion': [sr.ion.atomic_number, repr(float(sr.ion.mass))],
+            'layer': {
+                'phase': sr.layer.phase,
+                'density': repr(sr.layer.density),
+                'elements': elements,
+            },
+            'settings': {
+                'energy_min': repr(sr.settings.energy_min),
+                'output_type': sr.settings.output_type,
+                'correction': repr(sr.settings.correction),
+            },
+        }
+
+    def key(self, sr, srim_directory):
+        """Cache key of SR calculation
+
+        Parameters
+        ----------
+        sr : :class:`srim.srim.SR`
+            calculation
+        srim_directory : :obj:`str`
+            path to srim directory containing ``SR Module/SRModule.exe``
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self.fingerprint(sr), sort_keys=True).encode('utf-8'))
+        digest.update(executable_digest(os.path.join(
+            srim_directory, 'SR Module', 'SRModule.exe')).encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _energy_max(sr):
+        """Maximum energy [keV] of SR calculation"""
+        return sr.ion.energy / 1.0e3
+
+    def lookup(self, key, sr):
+        """Cached results covering the energy range of ``sr`` or ``None``
+
+        Rows above the ion energy of ``sr`` are removed from the
+        returned table.
+        """
+        path = self.get(key)
+        if path is None:
+            return None
+
+        try:
+            with open(os.path.join(path, 'energy_max')) as f:
+                energy_max = float(f.read())
+            if energy_max < self._energy_max(sr):
+                return None
+            results = SRResults.load(os.path.join(path, self.filename))
+        except (IOError, OSError, ValueError):  # incomplete or removed entry
+            return None
+
+        results._data = results._data[:, results._data[0] <= self._energy_max(sr) * (1.0 + 1e-9)]
+        return results
+
+    def put(self, key, sr, results):
+        """Store ``results`` of ``sr`` unless a table with a larger energy range is cached
+
+        Returns
+        -------
+        :obj:`str`
+            path to cache entry
+        """
+        path = self.get(key)
+        if path is not None:
+            try:
+                with open(os.path.join(path, 'energy_max')) as f:
+                    if float(f.read()) >= self._energy_max(sr):
+                        return path
+            except (IOError, OSError, ValueError):
+                pass
+            self.remove(key)
+
+        entry_directory = self._new_entry_directory()
+        results.save(os.path.join(entry_directory, self.filename))
+        with open(os.path.join(entry_directory, 'energy_max'), 'w') as f:
+            f.write(repr(self._energy_max(sr)))
+        return self._put_directory(key, entry_directory)
@@ -0,0 +1,435 @@
+""" Durable queue of SRIM calculations
+
+A campaign directory holds a SQLite database recording every TRIM and
+SR job (canonical input, state, attempts, timings and output
+location) and an output directory per job. Any number of worker
+processes, on any machines sharing the directory, pull jobs from the
+queue. When a campaign is interrupted :meth:`Campaign.resume`
+requeues failed and interrupted jobs while completed jobs are never
+run again.
+
+Writes are serialized with an exclusive lock on
+``<directory>/campaign.lock`` in addition to SQLite's own locking
+which is unreliable on network filesystems.
+"""
+import os
+import json
+import time
+import pickle
+import socket
+import sqlite3
+import hashlib
+import contextlib
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+from .srim import TRIM, SR
+from .input import SRInput
+from .output import Results, SRResults
+from .cache import TRIMCache, SRCache
+from .sandbox import reset_sandbox
+from .config import DEFAULT_SRIM_DIRECTORY
+
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+STATES = (PENDING, RUNNING, DONE, FAILED)
+
+Job = namedtuple('Job', [
+    'id', 'key', 'kind', 'name', 'state', 'attempts', 'worker',
+    'created', 'started', 'finished', 'output', 'error',
+])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    input BLOB NOT NULL,
+    job BLOB NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    output TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+_JOB_COLUMNS = ', '.join(Job._fields)
+
+
+def canonical_input(job):
+    """Exact bytes of the input files generated for ``job``
+
+    Parameters
+    ----------
+    job : :class:`srim.srim.TRIM` or :class:`srim.srim.SR`
+
+    Returns
+    -------
+    kind : :obj:`str`
+        ``'trim'`` or ``'sr'``
+    data : :obj:`bytes`
+        input files separated by null bytes
+    """
+    if isinstance(job, TRIM):
+        return 'trim', b'\0'.join(input_file.to_bytes() for input_file in job._input_files())
+    elif isinstance(job, SR):
+        return 'sr', SRInput(job).to_bytes()
+    raise TypeError('job must be TRIM or SR not {}'.format(type(job).__name__))
+
+
+def _worker_name():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+class Campaign(object):
+    """ Persistent queue of TRIM and SR jobs in a directory
+
+    Parameters
+    ----------
+    directory : :obj:`str`
+        campaign directory. Created if it does not exist.
+
+    Notes
+    -----
+        Each process must create its own :class:`Campaign` since
+        SQLite connections can not be shared between processes.
+
+    Examples
+    --------
+    Queue a sweep and run it with as many workers as you like.
+
+    >>> campaign = Campaign('/shared/campaign')
+    >>> campaign.add_sweep(sweep)
+    >>> campaign.work('/tmp/srim')     # in every worker
+
+    After a crash requeue interrupted jobs and continue.
+
+    >>> campaign.resume()
+    >>> campaign.work('/tmp/srim')
+    """
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.jobs_directory = os.path.join(self.directory, 'jobs')
+        if not os.path.isdir(self.jobs_directory):
+            os.makedirs(self.jobs_directory)
+
+        self._lock_filename = os.path.join(self.directory, 'campaign.lock')
+        self._connection = sqlite3.connect(
+            os.path.join(self.directory, 'campaign.sqlite'),
+            timeout=60.0, isolation_level=None)
+        with self._lock():
+            self._connection.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """Exclusive lock on campaign across processes and machines"""
+        with open(self._lock_filename, 'a') as lock:
+            if fcntl is not None:
+                fcntl.lockf(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(lock, fcntl.LOCK_UN)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Exclusive write transaction"""
+        with self._lock():
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+
+    def close(self):
+        """Close database connection"""
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, job, name=None):
+        """Queue a job unless an identical job is already queued
+
+        Parameters
+        ----------
+        job : :class:`srim.srim.TRIM` or :class:`srim.srim.SR`
+            calculation
+        name : :obj:`str`, optional
+            label of job e.g. its coordinates in a sweep
+
+        Returns
+        -------
+        :obj:`int`
+            id of job
+        """
+        return self.add_many([(job, name)])[0]
+
+    def add_many(self, jobs):
+        """Queue many ``(job, name)`` pairs in one transaction
+
+        Returns
+        -------
+        :obj:`list` of :obj:`int`
+            id of every job
+        """
+        rows = []
+        for job, name in jobs:
+            kind, data = canonical_input(job)
+            key = hashlib.sha256(kind.encode('utf-8') + b'\0' + data).hexdigest()
+            rows.append((key, kind, name, data, pickle.dumps(job, protocol=2)))
+
+        ids = []
+        with self._transaction() as cursor:
+            for key, kind, name, data, pickled_job in rows:
+                cursor.execute(
+                    'INSERT OR IGNORE INTO jobs (key, kind, name, input, job, state, created) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (key, kind, name, data, pickled_job, PENDING, time.time()))
+                cursor.execute('SELECT id FROM jobs WHERE key = ?', (key,))
+                ids.append(cursor.fetchone()[0])
+        return ids
+
+    def add_sweep(self, sweep):
+        """Queue every calculation of a :class:`srim.sweep.Sweep`
+
+        Jobs are named with the JSON encoded index of their first
+        occurrence in the sweep.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            job id at every position of the sweep
+        """
+        ids = np.empty(sweep.shape, dtype=int)
+        groups = sweep.unique()
+        job_ids = self.add_many((trim, json.dumps(indicies[0])) for trim, indicies in groups)
+        for (_, indicies), job_id in zip(groups, job_ids):
+            for index in indicies:
+                ids[index] = job_id
+        return ids
+
+    def _select(self, where='', parameters=()):
+        cursor = self._connection.execute(
+            'SELECT {} FROM jobs {} ORDER BY id'.format(_JOB_COLUMNS, where), parameters)
+        return [Job(*row) for row in cursor.fetchall()]
+
+    def get(self, job_id):
+        """Job with id ``job_id``
+
+        Returns
+        -------
+        :class:`srim.campaign.Job`
+        """
+        jobs = self._select('WHERE id = ?', (int(job_id),))
+        if not jobs:
+            raise KeyError(job_id)
+        return jobs[0]
+
+    def jobs(self, state=None):
+        """All jobs optionally only those in ``state``
+
+        Returns
+        -------
+        :obj:`list` of :class:`srim.campaign.Job`
+        """
+        if state is None:
+            return self._select()
+        return self._select('WHERE state = ?', (state,))
+
+    def counts(self):
+        """Number of jobs in each state
+
+        Returns
+        -------
+        :obj:`dict`
+            state to number of jobs
+        """
+        counts = {state: 0 for state in STATES}
+        for state, count in self._connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state'):
+            counts[state] = count
+        return counts
+
+    def load(self, job_id):
+        """Calculation of job ``job_id``
+
+        Returns
+        -------
+        :class:`srim.srim.TRIM` or :class:`srim.srim.SR`
+        """
+        row = self._connection.execute('SELECT job FROM jobs WHERE id = ?', (int(job_id),)).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        return pickle.loads(row[0])
+
+    def claim(self, worker=None):
+        """Take the next pending job and mark it running
+
+        Parameters
+        ----------
+        worker : :obj:`str`, optional
+            name recorded for job. Default ``<hostname>:<pid>``.
+
+        Returns
+        -------
+        :class:`srim.campaign.Job` or ``None``
+            ``None`` when no job is pending
+        """
+        with self._transaction() as cursor:
+            cursor.execute('SELECT id FROM jobs WHERE state = ? ORDER BY id LIMIT 1', (PENDING,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            output = os.path.join(self.jobs_directory, str(row[0]))
+            cursor.execute(
+                'UPDATE jobs SET state = ?, attempts = attempts + 1, worker = ?, '
+                'started = ?, finished = NULL, output = ?, error = NULL WHERE id = ?',
+                (RUNNING, worker or _worker_name(), time.time(), output, row[0]))
+        return self.get(row[0])
+
+    def complete(self, job_id):
+        """Mark job done"""
+        with self._transaction() as cursor:
+            cursor.execute('UPDATE jobs SET state = ?, finished = ? WHERE id = ?',
+                           (DONE, time.time(), job_id))
+
+    def fail(self, job_id, error):
+        """Mark job failed recording ``error``"""
+        with self._transaction() as cursor:
+            cursor.execute('UPDATE jobs SET state = ?, finished = ?, error = ? WHERE id = ?',
+                           (FAILED, time.time(), str(error), job_id))
+
+    def resume(self, max_attempts=None, running_timeout=None):
+        """Requeue failed and interrupted jobs
+
+        Completed jobs are left alone.
+
+        Parameters
+        ----------
+        max_attempts : :obj:`int`, optional
+            only requeue jobs attempted fewer times. Default no limit.
+        running_timeout : :obj:`float`, optional
+            only requeue running jobs started more than this many
+            seconds ago so that jobs of live workers are not taken
+            away. Default requeue all running jobs.
+
+        Returns
+        -------
+        :obj:`int`
+            number of requeued jobs
+        """
+        conditions = ['(state = ? OR (state = ? AND started < ?))']
+        parameters = [FAILED, RUNNING, float('inf') if running_timeout is None else time.time() - running_timeout]
+        if max_attempts is not None:
+            conditions.append('attempts < ?')
+            parameters.append(max_attempts)
+
+        with self._transaction() as cursor:
+            cursor.execute(
+                'UPDATE jobs SET state = ?, worker = NULL WHERE {}'.format(' AND '.join(conditions)),
+                [PENDING] + parameters)
+            return cursor.rowcount
+
+    def results(self, job_id):
+        """Results of completed job
+
+        Returns
+        -------
+        :class:`srim.output.Results` or :class:`srim.output.SRResults`
+        """
+        job = self.get(job_id)
+        if job.state != DONE:
+            raise ValueError('job {} is {} not {}'.format(job_id, job.state, DONE))
+        if job.kind == 'sr':
+            return SRResults.load(os.path.join(job.output, 'SR_OUTPUT.npz'))
+        return Results.open(job.output)
+
+    def run_job(self, job, srim_directory=DEFAULT_SRIM_DIRECTORY, cache=None, watchdog=None, retry=None):
+        """Run a claimed job in ``srim_directory`` and record the outcome
+
+        TRIM output files are copied to the output directory of the
+        job (or merged results of a split calculation saved, see
+        :meth:`srim.srim.TRIM.store_results`). SR results are saved there as ``SR_OUTPUT.npz``.
+
+        Returns
+        -------
+        :obj:`bool`
+            whether the job succeeded
+        """
+        calculation = self.load(job.id)
+        caches = cache if isinstance(cache, (tuple, list)) else [cache]
+        trim_cache = next((c for c in caches if isinstance(c, TRIMCache)), None)
+        sr_cache = next((c for c in caches if isinstance(c, SRCache)), None)
+        try:
+            if not os.path.isdir(job.output):
+                os.makedirs(job.output)
+            # srim_directory may be the user's installation
+            reset_sandbox(srim_directory, owned=False)
+            if job.kind == 'trim':
+                results = calculation.run(srim_directory, trim_cache, watchdog, retry)
+                TRIM.store_results(results, job.output)
+            else:
+                calculation.run(srim_directory, sr_cache).save(os.path.join(job.output, 'SR_OUTPUT.npz'))
+        except Exception as error:
+            self.fail(job.id, '{}: {}'.format(type(error).__name__, error))
+            return False
+        self.complete(job.id)
+        return True
+
+    def work(self, srim_directory=DEFAULT_SRIM_DIRECTORY, max_jobs=None,
+             cache=None, watchdog=None, retry=None, worker=None):
+        """Claim and run jobs until none are pending
+
+        ``srim_directory`` must not be used by any other worker. See
+        :mod:`srim.sandbox`.
+
+        Parameters
+        ----------
+        srim_directory : :obj:`str`, optional
+            path to srim directory. Default ``/tmp/srim``.
+        max_jobs : :obj:`int`, optional
+            stop after this many jobs. Default no limit.
+        cache : :class:`srim.cache.TRIMCache` or :class:`srim.cache.SRCache`, optional
+            used by TRIM or SR jobs respectively. A :obj:`tuple` of
+            both caches is used by both kinds of jobs.
+        watchdog, retry :
+            see :meth:`srim.srim.TRIM.run`
+        worker : :obj:`str`, optional
+            see :meth:`claim`
+
+        Returns
+        -------
+        :obj:`int`
+            number of jobs run
+        """
+        num_jobs = 0
+        while max_jobs is None or num_jobs < max_jobs:
+            job = self.claim(worker)
+            if job is None:
+                break
+            self.run_job(job, srim_directory, cache, watchdog, retry)
+            num_jobs += 1
+        return num_jobs
@@ -0,0 +1,109 @@
+""" Snapshots of TRIM autosave state
+
+When ``autosave`` is set TRIM periodically writes the state of the
+calculation to ``<srim_directory>/SRIM Restore``. A
+:class:`Checkpoint` copies that state to a job directory (which
+survives the loss of the sandbox or node) and copies it back so TRIM
+can resume with ``TRIMAUTO`` mode 2.
+"""
+import os
+import shutil
+
+
+RESTORE_DIRECTORY = 'SRIM Restore'
+
+
+def _signature(directory):
+    """(name, size, mtime) of every file in directory"""
+    if not os.path.isdir(directory):
+        return None
+    signature = []
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            signature.append((filename, stat.st_size, stat.st_mtime))
+    return tuple(signature) or None
+
+
+class Checkpoint(object):
+    """ Copy of TRIM autosave files in a job directory
+
+    Parameters
+    ----------
+    directory : :obj:`str`
+        directory to store snapshot in
+    """
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self._saved_signature = None
+        self._last_signature = None
+
+        # Recover from interruption in the middle of save
+        old_directory = self.directory + '.old'
+        if not self.exists and os.path.isdir(old_directory):
+            os.rename(old_directory, self.directory)
+
+    @property
+    def exists(self):
+        """Whether a snapshot is available to resume from"""
+        return os.path.isdir(self.directory)
+
+    def clear_restore_directory(self, srim_directory):
+        """Remove autosave files of earlier calculations in ``srim_directory``"""
+        restore_directory = os.path.join(srim_directory, RESTORE_DIRECTORY)
+        shutil.rmtree(restore_directory, ignore_errors=True)
+        os.makedirs(restore_directory)
+        self._saved_signature = self._last_signature = None
+
+    def update(self, srim_directory):
+        """Snapshot autosave files if they changed and are no longer being written
+
+        Files are only copied when they are unchanged since the
+        previous call so that a save in progress is never
+        copied. Intended to be called periodically while TRIM runs.
+
+        Returns
+        -------
+        :obj:`bool`
+            whether a new snapshot was taken
+        """
+        signature = _signature(os.path.join(srim_directory, RESTORE_DIRECTORY))
+        stable = signature == self._last_signature
+        self._last_signature = signature
+        if signature is None or not stable or signature == self._saved_signature:
+            return False
+        self.save(srim_directory)
+        self._saved_signature = signature
+        return True
+
+    def save(self, srim_directory):
+        """Atomically replace snapshot with autosave files in ``srim_directory``"""
+        restore_directory = os.path.join(srim_directory, RESTORE_DIRECTORY)
+        if _signature(restore_directory) is None:
+            return
+
+        parent_directory = os.path.dirname(self.directory)
+        if not os.path.isdir(parent_directory):
+            os.makedirs(parent_directory)
+
+        new_directory = self.directory + '.new'
+        old_directory = self.directory + '.old'
+        shutil.rmtree(new_directory, ignore_errors=True)
+        shutil.copytree(restore_directory, new_directory)
+        if self.exists:
+            shutil.rmtree(old_directory, ignore_errors=True)
+            os.rename(self.directory, old_directory)
+        os.rename(new_directory, self.directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+    def restore(self, srim_directory):
+        """Copy snapshot to ``<srim_directory>/SRIM Restore``"""
+        restore_directory = os.path.join(srim_directory, RESTORE_DIRECTORY)
+        shutil.rmtree(restore_directory, ignore_errors=True)
+        shutil.copytree(self.directory, restore_directory)
+        self._saved_signature = self._last_signature = _signature(restore_directory)
+
+    def clear(self):
+        """Remove snapshot"""
+        shutil.rmtree(self.directory, ignore_errors=True)
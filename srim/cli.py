@@ -0,0 +1,146 @@
+""" Command line interface ``pysrim``
+
+Inspect and prune the result cache and run campaigns.
+
+.. code-block:: bash
+
+   pysrim cache info
+   pysrim cache list
+   pysrim cache prune --max-size 10G
+   pysrim cache clear
+
+   pysrim campaign /shared/campaign status
+   pysrim campaign /shared/campaign resume --running-timeout 3600
+   pysrim campaign /shared/campaign work --srim-directory /tmp/srim
+"""
+import re
+import sys
+import time
+import argparse
+
+from .cache import TRIMCache, SRCache
+from .campaign import Campaign, STATES
+from .config import DEFAULT_CACHE_DIRECTORY, DEFAULT_SRIM_DIRECTORY
+
+
+CACHES = {
+    'trim': TRIMCache,
+    'sr': SRCache,
+}
+
+_size_units = {'': 1, 'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+
+
+def parse_size(value):
+    """Convert size string ``10``, ``512K``, ``1.5G`` to bytes"""
+    match = re.match(r'^\s*(\d+(?:\.\d*)?)\s*([KMGT]?)B?\s*$', value, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError('invalid size {}'.format(value))
+    return int(float(match.group(1)) * _size_units[match.group(2).upper()])
+
+
+def format_size(size):
+    """Convert bytes to human readable size"""
+    for unit in ['', 'K', 'M', 'G']:
+        if size < 1024:
+            return '{:.1f}{}B'.format(size, unit)
+        size /= 1024.0
+    return '{:.1f}TB'.format(size)
+
+
+def _caches(args):
+    kinds = sorted(CACHES) if args.kind == 'all' else [args.kind]
+    return [(kind, CACHES[kind](args.directory)) for kind in kinds]
+
+
+def cache_info(args):
+    for kind, cache in _caches(args):
+        entries = cache.entries()
+        print('{:5} {} entries {} {}'.format(
+            kind, len(entries), format_size(sum(entry.size for entry in entries)),
+            cache.entries_directory))
+
+
+def cache_list(args):
+    for kind, cache in _caches(args):
+        for entry in reversed(cache.entries()):
+            print('{:5} {} {:>9} {}'.format(
+                kind, entry.key, format_size(entry.size),
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.last_used))))
+
+
+def cache_prune(args):
+    for kind, cache in _caches(args):
+        removed = cache.prune(args.max_size)
+        print('{:5} removed {} entries {}'.format(
+            kind, len(removed), format_size(sum(entry.size for entry in removed))))
+
+
+def cache_clear(args):
+    args.max_size = 0
+    cache_prune(args)
+
+
+def campaign_status(args):
+    with Campaign(args.directory) as campaign:
+        counts = campaign.counts()
+        print(' '.join('{} {}'.format(state, counts[state]) for state in STATES))
+        for job in campaign.jobs('failed'):
+            print('failed {} {} attempts {}'.format(job.id, job.name or '', job.attempts))
+            print('    {}'.format(job.error))
+
+
+def campaign_resume(args):
+    with Campaign(args.directory) as campaign:
+        print('requeued {} jobs'.format(
+            campaign.resume(args.max_attempts, args.running_timeout)))
+
+
+def campaign_work(args):
+    with Campaign(args.directory) as campaign:
+        print('ran {} jobs'.format(campaign.work(args.srim_directory, args.max_jobs)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pysrim', description='pysrim utilities')
+    subparsers = parser.add_subparsers(dest='command')
+
+    cache_parser = subparsers.add_parser('cache', help='inspect and prune result cache')
+    cache_parser.add_argument('--directory', default=DEFAULT_CACHE_DIRECTORY,
+                              help='cache directory (default {})'.format(DEFAULT_CACHE_DIRECTORY))
+    cache_parser.add_argument('--kind', choices=sorted(CACHES) + ['all'], default='all',
+                              help='cache to operate on (default all)')
+    cache_subparsers = cache_parser.add_subparsers(dest='cache_command')
+    cache_subparsers.add_parser('info', help='number and size of entries').set_defaults(func=cache_info)
+    cache_subparsers.add_parser('list', help='list entries most recently used first').set_defaults(func=cache_list)
+    prune_parser = cache_subparsers.add_parser('prune', help='remove least recently used entries')
+    prune_parser.add_argument('--max-size', type=parse_size, required=True,
+                              help='size to prune cache to e.g. 500M, 10G')
+    prune_parser.set_defaults(func=cache_prune)
+    cache_subparsers.add_parser('clear', help='remove all entries').set_defaults(func=cache_clear)
+
+    campaign_parser = subparsers.add_parser('campaign', help='inspect, resume and run campaigns')
+    campaign_parser.add_argument('directory', help='campaign directory')
+    campaign_subparsers = campaign_parser.add_subparsers(dest='campaign_command')
+    campaign_subparsers.add_parser('status', help='number of jobs in each state').set_defaults(func=campaign_status)
+    resume_parser = campaign_subparsers.add_parser('resume', help='requeue failed and interrupted jobs')
+    resume_parser.add_argument('--max-attempts', type=int, help='skip jobs attempted this many times')
+    resume_parser.add_argument('--running-timeout', type=float,
+                               help='only requeue running jobs started this many seconds ago')
+    resume_parser.set_defaults(func=campaign_resume)
+    work_parser = campaign_subparsers.add_parser('work', help='run pending jobs')
+    work_parser.add_argument('--srim-directory', default=DEFAULT_SRIM_DIRECTORY,
+                             help='private srim directory (default {})'.format(DEFAULT_SRIM_DIRECTORY))
+    work_parser.add_argument('--max-jobs', type=int, help='stop after this many jobs')
+    work_parser.set_defaults(func=campaign_work)
+
+    args = parser.parse_args(argv)
+    if not hasattr(args, 'func'):
+        parser.print_help()
+        return 1
+    args.func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,7 @@
 import os
 
 DEFAULT_SRIM_DIRECTORY = os.path.join(os.sep, 'tmp', 'srim')
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+    'pysrim')
@@ -1,10 +1,12 @@
 """ Write Inputfile for SRIM and TRIM calculations
 
 """
+import os
+import warnings
 
 
 class AutoTRIM(object):
-    def __init__(self, mode=1, restart_directroy=None):
+    def __init__(self, mode=1, restart_directory=None, restart_directroy=None):
         """Writes a file AUTOTRIM to TRIM directory for autostart
 
         Parameters
@@ -14,14 +16,34 @@ class AutoTRIM(object):
             (2) TRIM resumes running its last saved calculation. Default 1
             and is really the only sane option when using Python for automation
         restart_directory : str
-            currently not implemented. default None
+            directory (relative to TRIM directory) of the saved
+            calculation to resume in mode 2. default None uses TRIM
+            default ``SRIM Restore``
+        restart_directroy : str
+            deprecated misspelling of ``restart_directory``
         """
+        if restart_directroy is not None:
+            warnings.warn('restart_directroy is deprecated, use restart_directory',
+                          DeprecationWarning, stacklevel=2)
+            if restart_directory is None:
+                restart_directory = restart_directroy
+        if mode not in range(3):
+            raise ValueError('mode must be 0, 1, or 2')
         self._mode = mode
+        self._restart_directory = restart_directory
 
-    def write(self):
-        """ write AUTOTRIM in current directory """
-        with open('TRIMAUTO', 'w') as f:
-            f.write('{}'.format(self._mode))
+    def to_bytes(self):
+        """Contents of ``TRIMAUTO``"""
+        contents = '{}'.format(self._mode)
+        if self._mode == 2 and self._restart_directory:
+            # TRIM uses windows paths ending in a separator
+            contents += '\r\n{}\\'.format(self._restart_directory.rstrip('\\/').replace('/', '\\'))
+        return contents.encode('utf-8')
+
+    def write(self, directory='.'):
+        """ write AUTOTRIM to directory (default current directory) """
+        with open(os.path.join(directory, 'TRIMAUTO'), 'wb') as f:
+            f.write(self.to_bytes())
 
 
 class TRIMInput(object):
@@ -187,31 +209,35 @@ class TRIMInput(object):
             'Stopping Power Version (1=2011, 0=2011)'
         ) + self.newline + '{}'.format(self._trim.settings.version) + self.newline
 
-    def write(self):
-        """Write TRIMInput class to ``TRIM.IN``"""
-        with open('TRIM.IN', 'wb') as f:
-            methods = [
-                self._write_title,
-                self._write_ion,
-                self._write_cascade_options,
-                self._write_plot_on_off,
-                self._write_target,
-                self._write_plot_options,
-                self._write_elements,
-                self._write_layer,
-                self._write_solid_gas,
-                self._write_bragg_correction,
-                self._write_displacement_energies,
-                self._write_lattice_binding,
-                self._write_surface_binding,
-                self._write_version
-            ]
-
-            input_str = ''
-            for method in methods:
-                input_str += method.__call__()
-
-            f.write(input_str.encode('utf-8'))
+    def to_bytes(self):
+        """Contents of ``TRIM.IN``"""
+        methods = [
+            self._write_title,
+            self._write_ion,
+            self._write_cascade_options,
+            self._write_plot_on_off,
+            self._write_target,
+            self._write_plot_options,
+            self._write_elements,
+            self._write_layer,
+            self._write_solid_gas,
+            self._write_bragg_correction,
+            self._write_displacement_energies,
+            self._write_lattice_binding,
+            self._write_surface_binding,
+            self._write_version
+        ]
+
+        input_str = ''
+        for method in methods:
+            input_str += method.__call__()
+
+        return input_str.encode('utf-8')
+
+    def write(self, directory='.'):
+        """Write TRIMInput class to ``<directory>/TRIM.IN``"""
+        with open(os.path.join(directory, 'TRIM.IN'), 'wb') as f:
+            f.write(self.to_bytes())
 
 
 class SRInput(object):
@@ -286,20 +312,24 @@ class SRInput(object):
             self._sr.ion.energy / 1.0e3
         ) + self.newline
 
-    def write(self):
-        """Write SR calcualtion to ``SR.IN``"""
-        with open('SR.IN', 'wb') as f:
-            methods = [
-                self._write_filename,
-                self._write_ion,
-                self._write_layer_info,
-                self._write_elements,
-                self._write_output_options,
-                self._write_ion_energy_range
-            ]
-
-            input_str = ''
-            for method in methods:
-                input_str += method.__call__()
-
-            f.write(input_str.encode('utf-8'))
+    def to_bytes(self):
+        """Contents of ``SR.IN``"""
+        methods = [
+            self._write_filename,
+            self._write_ion,
+            self._write_layer_info,
+            self._write_elements,
+            self._write_output_options,
+            self._write_ion_energy_range
+        ]
+
+        input_str = ''
+        for method in methods:
+            input_str += method.__call__()
+
+        return input_str.encode('utf-8')
+
+    def write(self, directory='.'):
+        """Write SR calcualtion to ``<directory>/SR.IN``"""
+        with open(os.path.join(directory, 'SR.IN'), 'wb') as f:
+            f.write(self.to_bytes())
@@ -0,0 +1,236 @@
+""" Compound stopping from a library of elemental stopping tables
+
+Stopping per atom of a compound is the sum of the stopping per atom of
+its elements weighted by atom fraction (Bragg additivity). A
+:class:`StoppingLibrary` holds one table per ion and target element in
+eV/(1E15 atoms/cm2) so that stopping of any composition of those
+elements is a matrix product instead of an SRModule calculation.
+"""
+import numpy as np
+
+from .core.element import Element
+from .core.layer import Layer
+from .output import SR_STOPPING_UNITS, _stopping_unit_key
+from .srim import SR
+from .config import DEFAULT_SRIM_DIRECTORY
+from .zbl import ZBL, stopping_conversions
+
+
+ATOMIC_UNITS = 'eV/(1E15 atoms/cm2)'
+
+
+class StoppingLibrary(object):
+    """ Elemental stopping tables of ions
+
+    Tables are keyed by ion (atomic number and mass) and target
+    element (atomic number and mass). All tables share the energy
+    grid of the first table added. Later tables are interpolated
+    (log-log) onto it.
+
+    Parameters
+    ----------
+    energy : :class:`numpy.ndarray`, optional
+        energies [keV] of library. Default energies of first table.
+
+    Examples
+    --------
+    Build library once (or load it) and sweep compositions
+
+    >>> library = StoppingLibrary()
+    >>> library.build(Ion('Xe', 1e9), ['Si', 'C', 'O'], '/tmp/srim', cache=SRCache())
+    >>> library.save('xenon.npz')
+    >>> fractions = np.random.dirichlet([1, 1, 1], size=10000)
+    >>> electronic, nuclear = library.compound_stopping(Ion('Xe', 1e9), ['Si', 'C', 'O'], fractions)
+
+    Stopping of an SR calculation without running SRModule
+
+    >>> electronic, nuclear = library.stopping(SR(layer, ion, correction=0.95))
+    """
+    def __init__(self, energy=None):
+        self.energy = None if energy is None else np.asarray(energy, dtype=np.float64)
+        self._tables = {}
+
+    @staticmethod
+    def key(ion, element):
+        """Library key of ion in target element"""
+        return (ion.atomic_number, round(float(ion.mass), 6),
+                element.atomic_number, round(float(element.mass), 6))
+
+    def __len__(self):
+        return len(self._tables)
+
+    def __contains__(self, key):
+        return key in self._tables
+
+    def keys(self):
+        """Keys of all tables in library"""
+        return list(self._tables)
+
+    def add(self, ion, element, results):
+        """Add stopping table of ion in pure element
+
+        Parameters
+        ----------
+        ion : :class:`srim.core.ion.Ion`
+            ion of table
+        element : :class:`srim.core.element.Element`
+            target element of table
+        results : :class:`srim.output.SRResults`
+            SR calculation of ion in a layer of only ``element``
+        """
+        energy = results.data[0]
+        electronic, nuclear = results.stopping(ATOMIC_UNITS)
+        if self.energy is None:
+            self.energy = energy
+        elif len(energy) != len(self.energy) or not np.allclose(energy, self.energy, rtol=1e-9):
+            if energy[0] > self.energy[0] * (1 + 1e-6) or energy[-1] < self.energy[-1] * (1 - 1e-6):
+                raise ValueError('table {} - {} keV does not cover library energies {} - {} keV'.format(
+                    energy[0], energy[-1], self.energy[0], self.energy[-1]))
+            log_energy = np.log(self.energy)
+            electronic, nuclear = (np.exp(np.interp(log_energy, np.log(energy), np.log(stopping)))
+                                   for stopping in (electronic, nuclear))
+        self._tables[self.key(ion, element)] = (electronic, nuclear)
+
+    def build(self, ion, elements, srim_directory=DEFAULT_SRIM_DIRECTORY, cache=None,
+              energy_min=1.0E3, offline=False):
+        """Calculate tables of ion for elements missing from library
+
+        Parameters
+        ----------
+        ion : :class:`srim.core.ion.Ion`
+            ion. Its energy is the highest energy of the tables.
+        elements : :obj:`list`
+            elements (:class:`srim.core.element.Element`, :obj:`str`,
+            or :obj:`int`)
+        srim_directory : :obj:`str`, optional
+            path to srim directory. Default ``/tmp/srim``.
+        cache : :class:`srim.cache.SRCache`, optional
+            cache of SR calculations
+        energy_min : :obj:`float`, optional
+            lowest energy [eV] of tables. Default 1 keV.
+        offline : :obj:`bool`, optional
+            calculate tables with :class:`srim.zbl.ZBL` instead of
+            SRModule. Default False.
+
+        Returns
+        -------
+        :obj:`int`
+            number of tables calculated
+        """
+        calculated = 0
+        for element in elements:
+            if not isinstance(element, Element):
+                element = Element(element)
+            if self.key(ion, element) in self._tables:
+                continue
+            # stopping per atom does not depend on density
+            layer = Layer({element: 1.0}, density=1.0, width=1.0)
+            if offline:
+                results = ZBL(layer, ion, energy_min=energy_min).run(
+                    None if self.energy is None else self.energy)
+            else:
+                results = SR(layer, ion, energy_min=energy_min, output_type=7).run(srim_directory, cache=cache)
+            self.add(ion, element, results)
+            calculated += 1
+        return calculated
+
+    def _stopping_tables(self, ion, elements):
+        """Electronic and nuclear stopping tables of elements (elements x energies)"""
+        electronic, nuclear = [], []
+        for element in elements:
+            key = self.key(ion, element)
+            if key not in self._tables:
+                raise KeyError('no stopping table of {} in {} in library'.format(ion.symbol, element.symbol))
+            electronic.append(self._tables[key][0])
+            nuclear.append(self._tables[key][1])
+        return np.array(electronic), np.array(nuclear)
+
+    def compound_stopping(self, ion, elements, fractions, correction=1.0):
+        """Stopping of many compositions of the same elements
+
+        Parameters
+        ----------
+        ion : :class:`srim.core.ion.Ion`
+            ion
+        elements : :obj:`list`
+            elements (:class:`srim.core.element.Element`, :obj:`str`,
+            or :obj:`int`) of compounds
+        fractions : :class:`numpy.ndarray`
+            stoichiometry of compounds with shape ``(..., len(elements))``.
+            Normalized to 1.
+        correction : :obj:`float` or :class:`numpy.ndarray`, optional
+            compound correction of electronic stopping, see
+            :class:`srim.srim.SRSettings`. Scalar or one per
+            compound. Default 1.0.
+
+        Returns
+        -------
+        electronic : :class:`numpy.ndarray`
+            electronic stopping [eV/(1E15 atoms/cm2)] with shape
+            ``(..., len(energy))``
+        nuclear : :class:`numpy.ndarray`
+            nuclear stopping [eV/(1E15 atoms/cm2)] with shape
+            ``(..., len(energy))``
+        """
+        elements = [element if isinstance(element, Element) else Element(element) for element in elements]
+        electronic, nuclear = self._stopping_tables(ion, elements)
+        fractions = np.asarray(fractions, dtype=np.float64)
+        if fractions.shape[-1] != len(elements):
+            raise ValueError('fractions must have a stoichiometry for each of {} elements'.format(len(elements)))
+        fractions = fractions / fractions.sum(axis=-1, keepdims=True)
+        correction = np.asarray(correction, dtype=np.float64)[..., None]
+        return correction * np.dot(fractions, electronic), np.dot(fractions, nuclear)
+
+    def stopping(self, sr, units=None):
+        """Stopping of SR calculation from library tables
+
+        Parameters
+        ----------
+        sr : :class:`srim.srim.SR`
+            calculation (or :class:`srim.zbl.ZBL`). Uses ion, layer
+            elements and stoichiometry and ``correction``.
+        units : :obj:`str` or :obj:`int`, optional
+            stopping units name or ``output_type`` (1-8). Default
+            ``output_type`` of ``sr``.
+
+        Returns
+        -------
+        electronic : :class:`numpy.ndarray`
+            electronic stopping at each of :attr:`energy`
+        nuclear : :class:`numpy.ndarray`
+            nuclear stopping at each of :attr:`energy`
+        """
+        elements = list(sr.layer.elements)
+        fractions = [sr.layer.elements[element]['stoich'] for element in elements]
+        electronic, nuclear = self.compound_stopping(sr.ion, elements, fractions, sr.settings.correction)
+
+        if units is None:
+            units = sr.settings.output_type
+        if isinstance(units, (int, np.integer)):
+            units = SR_STOPPING_UNITS[units - 1]
+        conversions = {_stopping_unit_key(name): factor
+                       for name, factor in stopping_conversions(sr.ion, sr.layer).items()}
+        try:
+            factor = conversions[_stopping_unit_key(units)]
+        except KeyError:
+            raise ValueError('stopping units {} not in {}'.format(units, ', '.join(SR_STOPPING_UNITS)))
+        return electronic * factor, nuclear * factor
+
+    def save(self, filename):
+        """Save library to ``.npz`` file"""
+        keys = self.keys()
+        np.savez(filename,
+                 energy=self.energy if self.energy is not None else np.empty(0),
+                 keys=np.array(keys, dtype=np.float64).reshape(len(keys), 4),
+                 electronic=np.array([self._tables[key][0] for key in keys]),
+                 nuclear=np.array([self._tables[key][1] for key in keys]))
+
+    @classmethod
+    def load(cls, filename):
+        """Load library saved with :meth:`save`"""
+        with np.load(filename) as npz:
+            library = cls(npz['energy'] if len(npz['energy']) else None)
+            for key, electronic, nuclear in zip(npz['keys'], npz['electronic'], npz['nuclear']):
+                key = (int(key[0]), float(key[1]), int(key[2]), float(key[3]))
+                library._tables[key] = (electronic, nuclear)
+        return library
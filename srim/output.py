@@ -4,11 +4,17 @@ TODO: Read header information
 """
 import os
 import re
-from io import BytesIO
+import json
+import mmap
+import pickle
+import contextlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 
 from .core.ion import Ion
+from .core.element import Element
 
 # Valid double_regex 4, 4.0, 4.0e100
 double_regex = r'[-+]?\d+\.?\d*(?:[eE][-+]?\d+)?'
@@ -16,6 +22,66 @@ symbol_regex = r'[A-Z][a-z]?'
 int_regex = '[+-]?\d+'
 
 
+# Line of dashes separating the header of a table from its rows
+_table_separator_regex = re.compile(br'^[ \t]*-+(?:[ \t]+-+)+[ \t]*\r?$', re.MULTILINE)
+
+# Character that can not be part of a number
+_non_numeric_regex = re.compile(br'[^-+.\deE \t\r\n]')
+
+
+def _read_table_start(output):
+    """Table separator line in output or ``None``"""
+    return _table_separator_regex.search(output)
+
+
+def _read_numeric_block(output, start=0):
+    """Parse rows of numbers starting at offset ``start`` into a 2D array
+
+    The block ends at the first blank line or line containing
+    anything other than numbers (footer, end of file). The number of
+    rows is that of the block and all numbers are converted in one
+    pass into a single float array.
+    """
+    if output.startswith(b'\r\n', start):
+        start += 2
+    elif output.startswith(b'\n', start):
+        start += 1
+
+    end = len(output)
+    for blank_line in [b'\n\r\n', b'\n\n']:
+        index = output.find(blank_line, start, end)
+        if index != -1:
+            end = index
+
+    try:
+        return _parse_numeric_block(output[start:end])
+    except (ValueError, SRIMOutputParseError):
+        pass
+
+    # Rare: block is followed by text without a blank line in between
+    match = _non_numeric_regex.search(output, start, end)
+    if match is not None:
+        end = max(output.rfind(b'\n', start, match.start()), start)
+    try:
+        return _parse_numeric_block(output[start:end])
+    except ValueError:
+        raise SRIMOutputParseError('unable to parse numbers in table')
+
+
+def _parse_numeric_block(block):
+    """Convert block containing only rows of numbers to a 2D array"""
+    block = block.rstrip()
+    if not block:
+        return np.empty((0, 0))
+    num_rows = block.count(b'\n') + 1
+    tokens = block.split()
+    data = np.empty(len(tokens), dtype=np.float64)
+    data[:] = tokens
+    if data.size % num_rows:
+        raise SRIMOutputParseError('rows of table have different number of columns')
+    return data.reshape(num_rows, data.size // num_rows)
+
+
 class SRIMOutputParseError(Exception):
     """SRIM error reading output file"""
     pass
@@ -72,53 +138,197 @@ class SRIM_Output(object):
         raise SRIMOutputParseError("unable to extract total ions from file")
 
     def _read_table(self, output):
-        match = re.search((
-            b'=+(.*)'
-            b'-+(?:\s+-+)+'
-        ), output, re.DOTALL)
-        # Read Data from table
-
+        match = _read_table_start(output)
         if match:
-            # Headers TODO: name the columns in table
-            header = None
-
-            # Data
-            data = np.genfromtxt(BytesIO(output[match.end():]), max_rows=100)
-            return data
+            return _read_numeric_block(output, match.end())
         raise SRIMOutputParseError("unable to extract table from file")
 
+    @classmethod
+    def merge(cls, outputs):
+        """Combine outputs of independent calculations of the same target
+
+        All tables in SRIM output files are normalized per ion. The
+        tables are combined by an average weighted by the number of
+        ions in each calculation. Depth bins must be identical.
+
+        Parameters
+        ----------
+        outputs : :obj:`list`
+            outputs of type ``cls`` to combine
+        """
+        outputs = list(outputs)
+        if not outputs:
+            raise ValueError('must supply at least one output to merge')
+
+        total_ions = sum(output.num_ions for output in outputs)
+        merged = cls.__new__(cls)
+        for key, value in vars(outputs[0]).items():
+            if key == '_num_ions':
+                value = total_ions
+            elif key == '_depth':
+                for output in outputs[1:]:
+                    if not np.array_equal(value, output._depth):
+                        raise ValueError('cannot merge outputs with different depth bins')
+            elif isinstance(value, np.ndarray):
+                value = sum(getattr(output, key) * output.num_ions for output in outputs) / total_ions
+            setattr(merged, key, value)
+        return merged
+
+
+MERGED_RESULTS_FILENAME = 'RESULTS.pickle'
+
 
 class Results(object):
     """ Gathers all results from folder
 
+    Each output file is only read on first access of its attribute
+    (``results.ioniz``, ``results.vacancy``, ...) and kept
+    afterwards. Files that are never accessed are never opened and
+    need not exist.
+
     Parameters
     ----------
     directory : :obj:`str`
         directory to look for TRIM calculations
+    only : :obj:`list` of :obj:`str`, optional
+        names of the only outputs to make available
+    exclude : :obj:`list` of :obj:`str`, optional
+        names of outputs to make unavailable. Accessing them raises
+        :class:`AttributeError`.
 
     Notes
     -----
     Files that are looked for:
-      - ``IONIZ.txt`` handled by :class:`srim.output.Ioniz`
-      - ``VACANCY.txt`` handled by :class:`srim.output.Vacancy`
-      - ``NOVAC.txt`` handled by :class:`srim.output.NoVacancy`
-      - ``E2RECOIL.txt`` handled by :class:`srim.output.EnergyToRecoils`
-      - ``PHONON.txt`` handled by :class:`srim.output.Phonons`
-      - ``RANGE.txt`` handled by :class:`srim.output.Range`
+      - ``IONIZ.txt`` handled by :class:`srim.output.Ioniz` as ``ioniz``
+      - ``VACANCY.txt`` handled by :class:`srim.output.Vacancy` as ``vacancy``
+      - ``NOVAC.txt`` handled by :class:`srim.output.NoVacancy` as
+        ``novac`` (``None`` for calculations without it)
+      - ``E2RECOIL.txt`` handled by :class:`srim.output.EnergyToRecoils` as ``etorecoils``
+      - ``PHONON.txt`` handled by :class:`srim.output.Phonons` as ``phonons``
+      - ``RANGE.txt`` handled by :class:`srim.output.Range` as ``range``
+      - ``RANGE_3D.txt`` handled by :class:`srim.output.Range3D` as
+        ``range3d`` (``None`` unless ``ranges`` was set)
+      - ``LATERAL.txt`` handled by :class:`srim.output.Lateral` as ``lateral``
+      - ``TDATA.txt`` handled by :class:`srim.output.TData` as
+        ``tdata`` (``None`` for calculations without it)
+
+    Examples
+    --------
+    Only read the vacancy profile of many calculations.
+
+    >>> profiles = [Results(directory, only=['vacancy']).vacancy.knock_ons
+    ...             for directory in directories]
     """
-    def __init__(self, directory):
+    outputs = ('ioniz', 'vacancy', 'novac', 'etorecoils', 'phonons', 'range', 'range3d',
+               'lateral', 'tdata')
+
+    def __init__(self, directory, only=None, exclude=None):
         """ Retrives all the calculation files in a given directory"""
-        self.ioniz = Ioniz(directory)
-        self.vacancy = Vacancy(directory)
+        names = set(self.outputs if only is None else only) - set(exclude or [])
+        unknown = names - set(self.outputs)
+        if unknown:
+            raise ValueError('unknown outputs {}'.format(', '.join(sorted(unknown))))
+        self.directory = directory
+        self._names = tuple(name for name in self.outputs if name in names)
 
-        try:
-            self.novac = NoVacancy(directory)
-        except ValueError:
-            self.novac = None
+    @property
+    def names(self):
+        """Names of available outputs"""
+        return self._names
+
+    def _read(self, name):
+        if name == 'novac':
+            try:
+                return NoVacancy(self.directory)
+            except ValueError:
+                return None
+        optional_files = {'range3d': 'RANGE_3D.txt', 'tdata': 'TDATA.txt'}
+        if name in optional_files and not os.path.isfile(os.path.join(self.directory, optional_files[name])):
+            return None
+        return _RESULTS_OUTPUTS[name](self.directory)
+
+    def __getattr__(self, attr):
+        # only called for outputs not read yet
+        if attr in Results.outputs:
+            if attr not in self.__dict__.get('_names', ()):
+                raise AttributeError('{} was not selected when loading {}'.format(
+                    attr, self.__dict__.get('directory')))
+            value = self.__dict__[attr] = self._read(attr)
+            return value
+        raise AttributeError('{} object has no attribute {}'.format(type(self).__name__, attr))
+
+    def load(self):
+        """Read all available outputs now
+
+        Needed before the directory is removed or reused.
+
+        Returns
+        -------
+        :class:`srim.output.Results`
+            self
+        """
+        for name in self._names:
+            getattr(self, name)
+        return self
+
+    def save(self, directory):
+        """Store all outputs in ``<directory>/RESULTS.pickle``
 
-        self.etorecoils = EnergyToRecoils(directory)
-        self.phonons = Phonons(directory)
-        self.range = Range(directory)
+        Used for results without output files of their own such as
+        those combined with :meth:`merge`.
+
+        Parameters
+        ----------
+        directory : :obj:`str`
+            directory to store results in
+        """
+        self.load()
+        with open(os.path.join(directory, MERGED_RESULTS_FILENAME), 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def open(cls, directory, only=None, exclude=None):
+        """Results stored with :meth:`save` in directory or else its TRIM output files
+
+        Parameters
+        ----------
+        directory : :obj:`str`
+            directory of calculation
+        only, exclude :
+            see :class:`srim.output.Results`. Ignored for stored results.
+        """
+        filename = os.path.join(directory, MERGED_RESULTS_FILENAME)
+        if os.path.isfile(filename):
+            with open(filename, 'rb') as f:
+                return pickle.load(f)
+        return cls(directory, only, exclude)
+
+    @classmethod
+    def merge(cls, results):
+        """Combine results of calculations that only differ in random seed and number of ions
+
+        See :meth:`srim.output.SRIM_Output.merge`. ``novac``,
+        ``range3d`` and ``tdata`` are ``None`` if any of the results is
+        missing them. Only outputs
+        available in every result are merged.
+
+        Parameters
+        ----------
+        results : :obj:`list` of :class:`srim.output.Results`
+            results to combine
+        """
+        results = list(results)
+        merged = cls.__new__(cls)
+        merged.directory = None
+        merged._names = tuple(name for name in cls.outputs
+                              if all(name in result.names for result in results))
+        for name in merged._names:
+            outputs = [getattr(result, name) for result in results]
+            if any(output is None for output in outputs):
+                setattr(merged, name, None)
+            else:
+                setattr(merged, name, _RESULTS_OUTPUTS[name].merge(outputs))
+        return merged
 
 
 class Ioniz(SRIM_Output):
@@ -439,29 +649,1027 @@ class Range(SRIM_Output):
         return self._elements
 
 
+class Lateral(SRIM_Output):
+    """``LATERAL.txt`` Lateral spread of ions by depth
+
+    Parameters
+    ----------
+    directory : :obj:`str`
+         directory of calculation
+    filename : :obj:`str`, optional
+         filename for Lateral. Default ``LATERAL.txt``
+    """
+    def __init__(self, directory, filename='LATERAL.txt'):
+        with open(os.path.join(directory, filename), 'rb') as f:
+            output = f.read()
+            ion = self._read_ion(output)
+            num_ions = self._read_num_ions(output)
+            data = self._read_table(output)
+
+        self._ion = ion
+        self._num_ions = num_ions
+        self._depth = data[:, 0]
+        self._projected_range = data[:, 1]
+        self._projected_straggle = data[:, 2]
+        self._radial_range = data[:, 3]
+        self._radial_straggle = data[:, 4]
+
+    @property
+    def ion(self):
+        """Ion used in SRIM calculation
+
+        **mass** could be wrong
+        """
+        return self._ion
+
+    @property
+    def num_ions(self):
+        """Number of Ions in SRIM simulation"""
+        return self._num_ions
+
+    @property
+    def depth(self):
+        """Depth [Ang] of bins in SRIM Calculation"""
+        return self._depth
+
+    @property
+    def projected_range(self):
+        """Lateral projected range [Ang] of ions stopped at depth"""
+        return self._projected_range
+
+    @property
+    def projected_straggle(self):
+        """Lateral projected straggling [Ang] of ions stopped at depth"""
+        return self._projected_straggle
+
+    @property
+    def radial_range(self):
+        """Radial range [Ang] of ions stopped at depth"""
+        return self._radial_range
+
+    @property
+    def radial_straggle(self):
+        """Radial straggling [Ang] of ions stopped at depth"""
+        return self._radial_straggle
+
+
+class TData(object):
+    """``TDATA.txt`` Summary of TRIM calculation
+
+    The smallest output file of a calculation. Holds the ion, target,
+    type of calculation and totals so it is the cheapest way to
+    catalog many calculations.
+
+    Parameters
+    ----------
+    directory : :obj:`str`
+         directory of calculation
+    filename : :obj:`str`, optional
+         filename for TData. Default ``TDATA.txt``
 
-class Backscat(object):
-    """ The kinetics of all backscattered ions (energy, location and trajectory)
+    Examples
+    --------
+    Ion and number of ions of every calculation in a directory.
 
-    TODO: one day to be implemented! submit pull request please!
+    >>> for directory in directories:
+    ...     tdata = Results(directory, only=['tdata']).tdata
+    ...     print(directory, tdata.ion, tdata.num_ions)
     """
-    pass
+    def __init__(self, directory, filename='TDATA.txt'):
+        with open(os.path.join(directory, filename), 'rb') as f:
+            output = f.read().decode('latin-1')
+
+        title = re.search(r'^=+\s*(.*?)\s*=+\s*$', output, re.MULTILINE)
+        self.title = title.group(1) if title else None
+        version = re.search(r'(SRIM-[\d.]+)', output)
+        self.version = version.group(1) if version else None
+        calculation = re.search(r'Calculations made with\s+(.*?)\s*$', output, re.MULTILINE)
+        self.calculation = calculation.group(1) if calculation else None
+
+        ion = re.search(r'Ion\s+=\s+({0})\s+\(\s*\d+\)\s+Ion Mass=\s*({1})\s+Energy\s+=\s+({1})\s+keV'.format(
+            symbol_regex, double_regex), output)
+        if ion is None:
+            raise SRIMOutputParseError("unable to extract ion from file")
+        self.ion = Ion(ion.group(1), 1000.0 * float(ion.group(3)), float(ion.group(2)))
+        self.angle = self._read_number(output, r'Ion Angle to Surface\s+=\s+({})')
+
+        self.layers = self._read_layers(output)
+        self.target_energies = [{
+            'symbol': symbol,
+            'displacement': float(displacement),
+            'binding': float(binding),
+            'surface': float(surface),
+        } for symbol, displacement, binding, surface in re.findall(
+            r'target atom\s+=\s+({0})\s+Displacement\s+=\s+({1})\s+eV,\s+Binding\s+=\s+({1})\s+eV,'
+            r'\s+Surface\s+=\s+({1})\s+eV'.format(symbol_regex, double_regex), output)]
+
+        depth_range = re.search(r'Depth Range of Tabulated Data=\s*({0})\s+-\s+({0})'.format(double_regex), output)
+        self.depth_range = tuple(float(value) for value in depth_range.groups()) if depth_range else None
+
+        num_ions = self._read_number(output, r'Total Ions calculated\s+=\s*({})')
+        if num_ions is None:
+            raise SRIMOutputParseError("unable to extract total ions from file")
+        self.num_ions = int(num_ions)
+        self.average_range = self._read_number(output, r'Average Range\s+=\s+({})')
+        self.average_straggling = self._read_number(output, r'Average Straggling\s+=\s+({})')
+        self.vacancies_per_ion = self._read_number(output, r'Average Vacancy/Ion\s+=\s+({})')
+        backscattered = self._read_number(output, r'Total Backscattered Ions=\s*({})')
+        self.backscattered = None if backscattered is None else int(backscattered)
+        transmitted = self._read_number(output, r'Total Transmitted Ions\s+=\s*({})')
+        self.transmitted = None if transmitted is None else int(transmitted)
+
+    @staticmethod
+    def _read_number(output, regex):
+        match = re.search(regex.format(double_regex), output)
+        return float(match.group(1)) if match else None
+
+    @staticmethod
+    def _read_layers(output):
+        """Layers of target
+
+        Each layer is a :obj:`dict` with ``name``, ``depth`` (of bottom
+        [Ang]), ``density atoms/cm3``, ``density g/cm3`` and
+        ``elements`` (symbol to atomic and mass percent).
+        """
+        layers = []
+        for match in re.finditer(r'Layer # (\d+) - Bottom Depth=\s*({})\s+A'.format(double_regex), output):
+            i = match.group(1)
+            name = re.search(r'Layer # {} - (?!Bottom Depth)(.*?)\s*$'.format(i), output, re.MULTILINE)
+            density = re.search(r'Layer # {0}- Density = ({1}) atoms/cm3 = ({1}) g/cm3'.format(
+                i, double_regex), output)
+            elements = re.findall(r'Layer # {0}-\s+({1})\s+=\s+({2})\s+Atomic Percent\s+=\s+({2})\s+Mass Percent'.format(
+                i, symbol_regex, double_regex), output)
+            layers.append({
+                'name': name.group(1) if name else None,
+                'depth': float(match.group(2)),
+                'density atoms/cm3': float(density.group(1)) if density else None,
+                'density g/cm3': float(density.group(2)) if density else None,
+                'elements': {symbol: {'atomic percent': float(atomic), 'mass percent': float(mass)}
+                             for symbol, atomic, mass in elements},
+            })
+        return layers
+
+    @classmethod
+    def merge(cls, outputs):
+        """Combine summaries of calculations that only differ in random seed and number of ions
+
+        Totals are added and averages weighted by the number of ions.
+        """
+        outputs = list(outputs)
+        if not outputs:
+            raise ValueError('must supply at least one output to merge')
+
+        merged = cls.__new__(cls)
+        merged.__dict__.update(vars(outputs[0]))
+        merged.num_ions = sum(output.num_ions for output in outputs)
+        for key in ['backscattered', 'transmitted']:
+            values = [getattr(output, key) for output in outputs]
+            setattr(merged, key, None if None in values else sum(values))
+        for key in ['average_range', 'average_straggling', 'vacancies_per_ion']:
+            values = [getattr(output, key) for output in outputs]
+            if None in values:
+                setattr(merged, key, None)
+            else:
+                setattr(merged, key, sum(value * output.num_ions for value, output in zip(values, outputs)) / merged.num_ions)
+        return merged
+
 
+def _fixed_width_columns(separator):
+    """End offsets of columns given the line of dashes under a table header"""
+    return [match.end() for match in re.finditer(br'-+', separator)]
 
-class Transmit(object):
-    """ The kinetics of all transmitted ions (energy, location and trajectory)
 
-    TODO: one day to be implemented! submit pull request please!
+def _parse_fixed_width_rows(data, ends, start=0):
+    """Parse rows of fixed width numeric columns into a 2D array
+
+    Column ``i`` spans from the end of column ``i - 1`` (``start`` for
+    the first) to ``ends[i]`` (the last column to the end of the
+    line). Every line must have the length of the first, columns are
+    sliced out of a byte matrix and converted in one pass. Returns
+    ``None`` when lines differ in length or columns are not numbers
+    so the caller can fall back to splitting on whitespace. A final
+    line shorter than the others and without line ending (file still
+    being written) is ignored.
     """
-    pass
+    line_length = data.find(b'\n') + 1
+    if line_length <= ends[-1]:
+        return None
+    line_ending = b'\r\n' if data.startswith(b'\r\n', line_length - 2) else b'\n'
+    num_rows = len(data) // line_length
+    if len(data) - num_rows * line_length == line_length - len(line_ending):
+        # complete last line without line ending
+        data = data + line_ending
+        num_rows += 1
+    lines = np.frombuffer(data, dtype=np.uint8, count=num_rows * line_length)
+    lines = lines.reshape(num_rows, line_length)
+    if not np.all(lines[:, -1] == ord('\n')):
+        return None
+
+    bounds = [start] + list(ends[:-1]) + [line_length - len(line_ending)]
+    values = np.empty((num_rows, len(ends)), dtype=np.float64)
+    # transposed in blocks that fit in cache
+    for row in range(0, num_rows, 16384):
+        block = lines[row:row + 16384]
+        characters = np.ascontiguousarray(block.T)
+        for i, (column_start, column_end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            column = _parse_fixed_layout_column(
+                characters[column_start:column_end], lines[0, column_start:column_end])
+            if column is None:
+                column = np.ascontiguousarray(block[:, column_start:column_end])
+                column = column.view('S{}'.format(column_end - column_start))[:, 0]
+                try:
+                    column = column.astype(np.float64)
+                except ValueError:
+                    return None
+            values[row:row + len(block), i] = column
+    return values
+
+
+_POWERS_OF_TEN = 10.0 ** np.arange(23)
+
+
+def _parse_fixed_layout_column(characters, first):
+    """Convert numbers all formatted like ``first``
+
+    ``characters[i, j]`` is the ``i``-th character of row ``j`` (one
+    contiguous array per character position). SRIM writes every
+    number of a column with the same number of digits and the decimal
+    point and exponent at the same place (``-3.6408E+03``), only signs
+    differ. The digits at each place are then combined arithmetically
+    with one operation per place instead of parsing every
+    number. Returns ``None`` if any row differs in layout from
+    ``first``.
+    """
+    positions = np.arange(len(first))
+    is_digit = first - np.uint8(ord('0')) <= 9
+    is_sign = (first == ord(' ')) | (first == ord('+')) | (first == ord('-'))
+    exponent_markers = positions[(first | 0x20) == ord('e')]
+    exponent_start = exponent_markers[0] if len(exponent_markers) else len(first)
+    decimal_points = positions[:exponent_start][first[:exponent_start] == ord('.')]
+    if (not is_digit.any() or np.sum(is_digit[:exponent_start]) > 18
+            or len(exponent_markers) > 1 or len(decimal_points) > 1):
+        return None
+
+    mantissa = np.zeros(characters.shape[1], dtype=np.int64)
+    exponent = np.zeros(characters.shape[1], dtype=np.int64)
+    negative = np.zeros(characters.shape[1], dtype=bool)
+    negative_exponent = np.zeros(characters.shape[1], dtype=bool)
+    for position, row in zip(positions, characters):
+        if is_digit[position]:
+            if np.any(row - np.uint8(ord('0')) > 9):
+                return None
+            number = mantissa if position < exponent_start else exponent
+            number *= 10
+            number += row
+            number -= ord('0')
+        elif is_sign[position]:
+            minus = row == ord('-')
+            if not np.all(minus | (row == ord(' ')) | (row == ord('+'))):
+                return None
+            (negative if position < exponent_start else negative_exponent)[minus] = True
+        elif np.any(row != first[position]):
+            return None
+
+    num_decimals = 0
+    if len(decimal_points):
+        num_decimals = np.sum(is_digit[decimal_points[0]:exponent_start])
+    scale = np.where(negative_exponent, -exponent, exponent) - num_decimals
+    if np.any(np.abs(scale) >= len(_POWERS_OF_TEN)):
+        return None
+    values = mantissa * _POWERS_OF_TEN[np.maximum(scale, 0)] / _POWERS_OF_TEN[np.maximum(-scale, 0)]
+    return np.where(negative, -values, values)
+
+
+class Range3D(object):
+    """``RANGE_3D.txt`` Final position of every ion
+
+    Written by TRIM when ``ranges`` is set in
+    :class:`srim.srim.TRIMSettings`. Unlike the 100 depth bins of
+    :class:`srim.output.Range` every ion is available so statistics
+    and histograms are exact.
+
+    Parameters
+    ----------
+    directory : :obj:`str`
+         directory of calculation
+    filename : :obj:`str`, optional
+         filename for Range3D. Default ``RANGE_3D.txt``
+
+    Examples
+    --------
+    >>> range3d = Range3D(directory)
+    >>> range3d.projected_range, range3d.longitudinal_straggle
+    >>> counts, edges = range3d.histogram(np.linspace(0, 3e4, 301))
+    """
+    def __init__(self, directory, filename='RANGE_3D.txt'):
+        with open(os.path.join(directory, filename), 'rb') as f:
+            output = f.read()
+        self._ion = self._read_ion(output)
+
+        match = _read_table_start(output)
+        if match is None:
+            raise SRIMOutputParseError("unable to extract table from file")
+        start = output.find(b'\n', match.end()) + 1
+        data = _parse_fixed_width_rows(output[start:], _fixed_width_columns(match.group(0)))
+        if data is None:
+            data = self._parse_rows(output[start:])
+
+        self._ion_numbers = data[:, 0].astype(np.int64)
+        self._positions = np.ascontiguousarray(data[:, 1:4])
+
+    @staticmethod
+    def _read_ion(output):
+        ion_regex = r'Ion\s+=\s+({0})\s+\(\d+\)\s+Ion Mass=\s*({1})\s+Energy\s+=\s+({1})\s+keV'.format(
+            symbol_regex, double_regex)
+        match = re.search(ion_regex.encode('utf-8'), output)
+        if match:
+            symbol = str(match.group(1).decode('utf-8'))
+            mass = float(match.group(2))
+            energy = float(match.group(3))  # keV
+            return Ion(symbol, 1000.0 * energy, mass)
+        raise SRIMOutputParseError("unable to extract ion from file")
 
+    @staticmethod
+    def _parse_rows(data):
+        """Slow path for rows that are not fixed width"""
+        if not data.endswith(b'\n'):
+            # drop last line which is still being written
+            data = data[:data.rfind(b'\n') + 1]
+        try:
+            return _parse_numeric_block(data).reshape(-1, 4)
+        except (ValueError, SRIMOutputParseError):
+            raise SRIMOutputParseError('unable to parse ion positions')
+
+    @classmethod
+    def merge(cls, outputs):
+        """Concatenate final ion positions of independent calculations
+
+        Ion numbers of each calculation are offset to continue those
+        of the previous one.
+        """
+        outputs = list(outputs)
+        if not outputs:
+            raise ValueError('must supply at least one output to merge')
+
+        merged = cls.__new__(cls)
+        merged._ion = outputs[0]._ion
+        merged._positions = np.concatenate([output._positions for output in outputs])
+        ion_numbers, offset = [], 0
+        for output in outputs:
+            # ions missing from an output (e.g. transmitted) leave gaps
+            ion_numbers.append(output._ion_numbers + offset)
+            if len(output._ion_numbers):
+                offset = ion_numbers[-1].max()
+        merged._ion_numbers = np.concatenate(ion_numbers)
+        return merged
+
+    @property
+    def ion(self):
+        """Ion used in SRIM calculation"""
+        return self._ion
+
+    @property
+    def num_ions(self):
+        """Number of ions with a final position in the file"""
+        return len(self._positions)
+
+    @property
+    def ion_numbers(self):
+        """Number of each ion"""
+        return self._ion_numbers
+
+    @property
+    def positions(self):
+        """Final (depth, lateral y, lateral z) [Ang] of each ion as (N, 3) array"""
+        return self._positions
+
+    @property
+    def depth(self):
+        """Final depth [Ang] of each ion"""
+        return self._positions[:, 0]
 
-class Sputter(object):
-    """ The kinetics of all target atoms sputtered from the target.
+    @property
+    def radial(self):
+        """Final lateral distance [Ang] of each ion from the beam axis"""
+        return np.hypot(self._positions[:, 1], self._positions[:, 2])
+
+    @property
+    def projected_range(self):
+        """Mean depth [Ang]"""
+        return self.depth.mean()
+
+    @property
+    def longitudinal_straggle(self):
+        """Standard deviation of depth [Ang]"""
+        return self.depth.std()
+
+    @property
+    def lateral_range(self):
+        """Mean of absolute lateral y and z [Ang]"""
+        return np.abs(self._positions[:, 1:]).mean()
+
+    @property
+    def lateral_straggle(self):
+        """Root mean square of lateral y and z [Ang]"""
+        return np.sqrt(np.mean(self._positions[:, 1:]**2))
 
-    TODO: one day to be implemented! submit pull request please!
+    @property
+    def radial_range(self):
+        """Mean lateral distance [Ang] from the beam axis"""
+        return self.radial.mean()
+
+    @property
+    def radial_straggle(self):
+        """Standard deviation of lateral distance [Ang] from the beam axis"""
+        return self.radial.std()
+
+    @property
+    def skewness(self):
+        """Skewness of depth distribution"""
+        return self._moment(self.depth, 3)
+
+    @property
+    def kurtosis(self):
+        """Kurtosis of depth distribution (3 for a normal distribution)"""
+        return self._moment(self.depth, 4)
+
+    @staticmethod
+    def _moment(values, order):
+        deviation = values - values.mean()
+        return np.mean(deviation**order) / np.mean(deviation**2)**(order / 2)
+
+    def histogram(self, bins=100, axis='depth', range=None, density=False):
+        """Histogram of final ion positions
+
+        Parameters
+        ----------
+        bins : :obj:`int` or :class:`numpy.ndarray`
+            number of bins or bin edges [Ang]. Default 100.
+        axis : :obj:`str`, optional
+            ``'depth'``, ``'y'``, ``'z'`` or ``'radial'``. Default ``'depth'``.
+        range : :obj:`tuple`, optional
+            lower and upper edge when ``bins`` is a number
+        density : :obj:`bool`, optional
+            return ion concentration [(Atoms/cm3)/(Atoms/cm2)] as in
+            :attr:`srim.output.Range.ions` instead of counts. Default
+            False.
+
+        Returns
+        -------
+        values : :class:`numpy.ndarray`
+            counts or concentration in each bin
+        edges : :class:`numpy.ndarray`
+            bin edges [Ang]
+        """
+        columns = {'depth': 0, 'y': 1, 'z': 2}
+        if axis == 'radial':
+            values = self.radial
+        elif axis in columns:
+            values = self._positions[:, columns[axis]]
+        else:
+            raise ValueError('axis must be one of depth, y, z or radial')
+
+        counts, edges = np.histogram(values, bins=bins, range=range)
+        if density:
+            # per ion and bin width converted from Angstroms to cm
+            return counts / (self.num_ions * np.diff(edges) * 1e-8), edges
+        return counts, edges
+
+
+_RESULTS_OUTPUTS = {
+    'ioniz': Ioniz,
+    'vacancy': Vacancy,
+    'novac': NoVacancy,
+    'etorecoils': EnergyToRecoils,
+    'phonons': Phonons,
+    'range': Range,
+    'range3d': Range3D,
+    'lateral': Lateral,
+    'tdata': TData,
+}
+
+
+PARTICLE_DTYPE = np.dtype([
+    ('ion_number', np.int64),          # incident ion
+    ('atom', np.int64),                # atomic number
+    ('energy', np.float64),            # [eV]
+    ('x', np.float64),                 # [Angstroms]
+    ('y', np.float64),                 # [Angstroms]
+    ('z', np.float64),                 # [Angstroms]
+    ('cos_x', np.float64),             # direction cosines
+    ('cos_y', np.float64),
+    ('cos_z', np.float64),
+])
+
+
+def _parse_particles(data, tag):
+    """Rows of ``data`` starting with ``tag`` as ``PARTICLE_DTYPE`` array
+
+    Values may be separated by whitespace or commas.
     """
-    pass
+    values = _parse_fixed_width_particles(data, tag)
+    if values is not None:
+        particles = np.empty(len(values), dtype=PARTICLE_DTYPE)
+        for i, name in enumerate(PARTICLE_DTYPE.names):
+            particles[name] = values[:, i]
+        return particles
+
+    rows = re.findall(b'^' + tag + b'[ \t,]+([^\r\n]*)', data, re.MULTILINE)
+    particles = np.empty(len(rows), dtype=PARTICLE_DTYPE)
+    if not rows:
+        return particles
+    tokens = b' '.join(rows).replace(b',', b' ').split()
+    if len(tokens) != len(rows) * len(PARTICLE_DTYPE.names):
+        raise SRIMOutputParseError('rows of {} particles do not have {} values'.format(
+            tag.decode('ascii'), len(PARTICLE_DTYPE.names)))
+    values = np.empty(len(tokens), dtype=np.float64)
+    try:
+        values[:] = tokens
+    except ValueError:
+        raise SRIMOutputParseError('unable to parse numbers of {} particles'.format(tag.decode('ascii')))
+    values = values.reshape(len(rows), len(PARTICLE_DTYPE.names))
+    for i, name in enumerate(PARTICLE_DTYPE.names):
+        particles[name] = values[:, i]
+    return particles
+
+
+def _parse_fixed_width_particles(data, tag):
+    """Fast path of :func:`_parse_particles` for consecutive fixed width rows
+
+    Columns are taken from the first row. Returns ``None`` unless
+    every line from the first row to the end of ``data`` is a row of
+    the same width.
+    """
+    match = re.search(b'^' + tag + b'[ \t]', data, re.MULTILINE)
+    if match is None:
+        return None
+    data = data[match.start():]
+    line_length = data.find(b'\n') + 1
+    ends = [token.end() for token in re.finditer(br'[^ \t\r\n]+', data[:line_length])]
+    if len(ends) != len(PARTICLE_DTYPE.names) + 1:
+        return None
+    values = _parse_fixed_width_rows(data, ends[1:], start=ends[0])
+    if values is None or data[:len(values) * line_length:line_length] != tag * len(values):
+        return None
+    return values
+
+
+class _ParticleOutput(object):
+    """ Particles leaving the target written one per line
+
+    ``BACKSCAT.txt``, ``TRANSMIT.txt`` and ``SPUTTER.txt`` list the
+    final energy, position and direction of every particle leaving
+    the target on a line starting with a one letter tag. The file is
+    read on first access of :attr:`data` or streamed with
+    :meth:`iter_chunks`.
+    """
+    default_filename = None
+    tag = None
+
+    def __init__(self, directory, filename=None):
+        self.filename = os.path.join(directory, filename or self.default_filename)
+        if not os.path.isfile(self.filename):
+            raise IOError('{} does not exist'.format(self.filename))
+        self._data = None
+
+    def iter_chunks(self, chunk_size=100000, buffer_size=64 * 1024**2):
+        """Iterate over particles in fixed size batches
+
+        The file is read ``buffer_size`` bytes at a time so memory use
+        is bounded regardless of file size.
+
+        Parameters
+        ----------
+        chunk_size : :obj:`int`, optional
+            number of particles per batch (the last may be
+            smaller). Default 100000.
+        buffer_size : :obj:`int`, optional
+            bytes read at a time. Default 64 MB.
+
+        Yields
+        ------
+        :class:`numpy.ndarray`
+            ``PARTICLE_DTYPE`` structured array
+        """
+        def blocks():
+            with open(self.filename, 'rb') as f:
+                remainder = b''
+                while True:
+                    buffer = f.read(buffer_size)
+                    if not buffer:
+                        break
+                    data = remainder + buffer
+                    end = data.rfind(b'\n') + 1
+                    remainder = data[end:]
+                    yield _parse_particles(data[:end], self.tag)
+                if remainder:
+                    yield _parse_particles(remainder, self.tag)
+
+        return _rebatch(blocks(), chunk_size)
+
+    @property
+    def data(self):
+        """All particles as ``PARTICLE_DTYPE`` structured array"""
+        if self._data is None:
+            with open(self.filename, 'rb') as f:
+                self._data = _parse_particles(f.read(), self.tag)
+        return self._data
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def ion_numbers(self):
+        """Incident ion of each particle"""
+        return self.data['ion_number']
+
+    @property
+    def atoms(self):
+        """Atomic number of each particle"""
+        return self.data['atom']
+
+    @property
+    def energy(self):
+        """Energy [eV] of each particle"""
+        return self.data['energy']
+
+    @property
+    def positions(self):
+        """(x, y, z) [Ang] where each particle left the target as (N, 3) array"""
+        return np.stack([self.data['x'], self.data['y'], self.data['z']], axis=1)
+
+    @property
+    def directions(self):
+        """Direction cosines (x, y, z) of each particle as (N, 3) array"""
+        return np.stack([self.data['cos_x'], self.data['cos_y'], self.data['cos_z']], axis=1)
+
+    @property
+    def polar_angle(self):
+        """Angle [degrees] of each particle to the target normal (x axis)"""
+        return np.degrees(np.arccos(np.clip(np.abs(self.data['cos_x']), 0.0, 1.0)))
+
+    def _select(self, atom):
+        if atom is None:
+            return self.data
+        if not isinstance(atom, (int, np.integer)):
+            atom = Element(atom).atomic_number
+        return self.data[self.data['atom'] == atom]
+
+    def yield_per_ion(self, num_ions, atom=None):
+        """Particles per incident ion
+
+        Parameters
+        ----------
+        num_ions : :obj:`int`
+            number of ions of calculation e.g. ``results.range.num_ions``
+        atom : :obj:`int` or :obj:`str`, optional
+            only count particles of this element (atomic number or
+            symbol). Default all.
+        """
+        return len(self._select(atom)) / num_ions
+
+    def energy_spectrum(self, bins=100, range=None, atom=None, num_ions=None):
+        """Histogram of particle energy
+
+        Parameters
+        ----------
+        bins : :obj:`int` or :class:`numpy.ndarray`
+            number of bins or bin edges [eV]. Default 100.
+        range : :obj:`tuple`, optional
+            lower and upper edge when ``bins`` is a number
+        atom : :obj:`int` or :obj:`str`, optional
+            only particles of this element. Default all.
+        num_ions : :obj:`int`, optional
+            normalize to particles per incident ion per eV
+
+        Returns
+        -------
+        values : :class:`numpy.ndarray`
+            counts (or particles/ion/eV) in each bin
+        edges : :class:`numpy.ndarray`
+            bin edges [eV]
+        """
+        counts, edges = np.histogram(self._select(atom)['energy'], bins=bins, range=range)
+        if num_ions is not None:
+            return counts / (num_ions * np.diff(edges)), edges
+        return counts, edges
+
+    def angular_distribution(self, bins=18, atom=None, num_ions=None):
+        """Histogram of angle to the target normal
+
+        Parameters
+        ----------
+        bins : :obj:`int` or :class:`numpy.ndarray`
+            number of bins between 0 and 90 degrees or bin edges
+            [degrees]. Default 18.
+        atom : :obj:`int` or :obj:`str`, optional
+            only particles of this element. Default all.
+        num_ions : :obj:`int`, optional
+            normalize to particles per incident ion per steradian
+
+        Returns
+        -------
+        values : :class:`numpy.ndarray`
+            counts (or particles/ion/sr) in each bin
+        edges : :class:`numpy.ndarray`
+            bin edges [degrees]
+        """
+        cos_x = np.clip(np.abs(self._select(atom)['cos_x']), 0.0, 1.0)
+        counts, edges = np.histogram(np.degrees(np.arccos(cos_x)), bins=bins, range=(0.0, 90.0))
+        if num_ions is not None:
+            solid_angle = 2 * np.pi * -np.diff(np.cos(np.radians(edges)))
+            return counts / (num_ions * solid_angle), edges
+        return counts, edges
+
+
+class Backscat(_ParticleOutput):
+    """``BACKSCAT.txt`` Energy, location and direction of all backscattered ions
+
+    Written by TRIM when ``backscattered`` is set in
+    :class:`srim.srim.TRIMSettings`.
+
+    Parameters
+    ----------
+    directory : :obj:`str`
+         directory of calculation
+    filename : :obj:`str`, optional
+         filename for Backscat. Default ``BACKSCAT.txt``
+    """
+    default_filename = 'BACKSCAT.txt'
+    tag = b'B'
+
+
+class Transmit(_ParticleOutput):
+    """``TRANSMIT.txt`` Energy, location and direction of all transmitted ions
+
+    Written by TRIM when ``transmit`` is set in
+    :class:`srim.srim.TRIMSettings`.
+
+    Parameters
+    ----------
+    directory : :obj:`str`
+         directory of calculation
+    filename : :obj:`str`, optional
+         filename for Transmit. Default ``TRANSMIT.txt``
+    """
+    default_filename = 'TRANSMIT.txt'
+    tag = b'T'
+
+
+class Sputter(_ParticleOutput):
+    """``SPUTTER.txt`` Energy, location and direction of all target atoms sputtered from the target
+
+    Written by TRIM when ``sputtered`` is set in
+    :class:`srim.srim.TRIMSettings`.
+
+    Parameters
+    ----------
+    directory : :obj:`str`
+         directory of calculation
+    filename : :obj:`str`, optional
+         filename for Sputter. Default ``SPUTTER.txt``
+
+    Examples
+    --------
+    Sputtering yield and energy spectrum of sputtered oxygen.
+
+    >>> sputter = Sputter(directory)
+    >>> sputter.yield_per_ion(results.range.num_ions, atom='O')
+    >>> spectrum, edges = sputter.energy_spectrum(np.logspace(0, 3, 31), atom='O')
+    """
+    default_filename = 'SPUTTER.txt'
+    tag = b'S'
+
+
+COLLISION_DTYPE = np.dtype([
+    ('ion_number', np.int64),
+    ('kinetic_energy', np.float64),    # [keV]
+    ('depth', np.float64),             # [Angstroms]
+    ('lat_y_dist', np.float64),        # [Angstroms]
+    ('lat_z_dist', np.float64),        # [Angstroms]
+    ('stopping_energy', np.float64),   # [eV/Angstrom]
+    ('atom', 'S2'),
+    ('recoil_energy', np.float64),     # [eV]
+    ('target_disp', np.float64),
+    ('target_vac', np.float64),
+    ('target_replac', np.float64),
+    ('target_inter', np.float64),
+])
+
+ION_SUMMARY_DTYPE = np.dtype([('ion_number', np.int64)] + [(name, np.float64) for name in [
+    'displacements', 'avg_displacements',
+    'replacements', 'avg_replacements',
+    'vacancies', 'avg_vacancies',
+    'interstitials', 'avg_interstitials',
+    'sputtered_atoms', 'avg_sputtered_atoms',
+    'transmitted_atoms', 'avg_transmitted_atoms',
+]])
+
+RECOIL_DTYPE = np.dtype([
+    ('recoil', np.int64),
+    ('atom', np.int64),
+    ('recoil_energy', np.float64),     # [eV]
+    ('x', np.float64),                 # [Angstroms]
+    ('y', np.float64),                 # [Angstroms]
+    ('z', np.float64),                 # [Angstroms]
+    ('vac', np.int64),
+    ('repl', np.int64),
+])
+
+CollisionArrays = namedtuple('CollisionArrays', [
+    'ions',            # ION_SUMMARY_DTYPE one row per ion
+    'collisions',      # COLLISION_DTYPE one row per collision
+    'recoils',         # RECOIL_DTYPE one row per cascade recoil
+    'ion_offsets',     # collisions of ions[i] are collisions[ion_offsets[i]:ion_offsets[i+1]]
+    'recoil_offsets',  # recoils of collisions[j] are recoils[recoil_offsets[j]:recoil_offsets[j+1]]
+])
+
+_COLLISION_SEPARATOR = b'\xb3'
+_double_bytes_regex = re.compile(double_regex.encode('ascii'))
+_int_bytes_regex = re.compile(int_regex.encode('ascii'))
+
+
+def _is_line_of(line, character):
+    return bool(line) and not line.strip(character)
+
+
+def _collision_filter(atoms=None, min_recoil_energy=None, depth_range=None):
+    """Predicate on the fields of a collision line or ``None`` to keep all
+
+    Only the fields needed by the requested filters are converted.
+    """
+    if atoms is None and min_recoil_energy is None and depth_range is None:
+        return None
+
+    if atoms is not None:
+        atoms = {getattr(atom, 'symbol', atom) for atom in atoms}
+        atoms = {atom.encode('ascii') if not isinstance(atom, bytes) else atom for atom in atoms}
+    if depth_range is not None:
+        min_depth, max_depth = depth_range
+
+    def row_filter(tokens):
+        if atoms is not None and tokens[7].strip() not in atoms:
+            return False
+        if min_recoil_energy is not None and float(tokens[8]) < min_recoil_energy:
+            return False
+        if depth_range is not None and not min_depth <= float(tokens[3]) <= max_depth:
+            return False
+        return True
+    return row_filter
+
+
+def _parse_collisions(data, row_filter=None):
+    """Parse whole ions of COLLISON.txt into :class:`srim.output.CollisionArrays`
+
+    Follows the same grammar as :meth:`srim.output.Collision._read_ion`
+    but only splits each line once and collects numbers in flat lists
+    that are converted to arrays at the end. Cascade summaries
+    missing from the file are ``nan``.
+
+    ``row_filter`` is called with the fields of every collision line
+    (see :func:`_collision_filter`). Rejected collisions and their
+    cascades are skipped without converting any numbers.
+    """
+    collision_values = []    # 7 numbers per collision
+    collision_atoms = []
+    target_values = []       # 4 numbers per collision
+    recoil_values = []       # 8 numbers per recoil
+    recoil_offsets = [0]
+    ion_values = []          # 13 numbers per ion
+    ion_offsets = [0]
+
+    nan = b'nan'
+    keep = True
+    state = 'header'
+    footer = []
+    for line in data.split(b'\n'):
+        line = line.rstrip(b'\r')
+        if state == 'header':
+            if _is_line_of(line, b'-'):
+                state = 'collisions'
+        elif state == 'collisions':
+            if _is_line_of(line, b'='):
+                state = 'ion_number'
+                continue
+            # ion, energy, depth, y, z, stopping, atom, recoil energy, disp or cascade
+            tokens = line.split(_COLLISION_SEPARATOR)
+            keep = row_filter is None or row_filter(tokens)
+            if keep:
+                collision_values.extend(tokens[1:7])
+                collision_values.append(tokens[8])
+                collision_atoms.append(tokens[7].strip())
+            if b'<== Start of New Cascade' in tokens[-2]:
+                state = 'cascade_separator'
+            elif keep:
+                target_values.extend([tokens[-2], b'0', b'0', b'0'])
+                recoil_offsets.append(len(recoil_values) // 8)
+        elif state == 'cascade_separator':
+            state = 'cascade_header'
+        elif state == 'cascade_header':
+            state = 'recoils'
+        elif state == 'recoils':
+            if _is_line_of(line, b'='):
+                if keep:
+                    recoil_offsets.append(len(recoil_values) // 8)
+                if line.count(b'=') > 100:  # ion ended without cascade summary
+                    if keep:
+                        target_values.extend([nan] * 4)
+                    state = 'ion_number'
+                else:
+                    state = 'cascade_summary'
+                continue
+            if keep:
+                recoil_values.extend(line.split()[1:-1])
+        elif state == 'cascade_summary':
+            tokens = line.split(_COLLISION_SEPARATOR)[1:-1]
+            if tokens:
+                if keep:
+                    target_values.extend(tokens[2:6])
+                state = 'collisions'
+            else:
+                if keep:
+                    target_values.extend([nan] * 4)
+                state = 'ion_number'
+        elif state == 'ion_number':
+            ion_values.append(_int_bytes_regex.search(line).group(0))
+            footer = []
+            state = 'footer'
+        elif state == 'footer':
+            if _is_line_of(line, b'='):
+                ion_values.extend(_double_bytes_regex.findall(b''.join(footer))[:12])
+                ion_offsets.append(len(collision_atoms))
+                state = 'header'
+            else:
+                footer.append(line)
+
+    num_collisions = len(collision_atoms)
+    collisions = np.empty(num_collisions, dtype=COLLISION_DTYPE)
+    values = np.array(collision_values, dtype=np.float64).reshape(num_collisions, 7)
+    collisions['ion_number'] = values[:, 0]
+    for i, name in enumerate(['kinetic_energy', 'depth', 'lat_y_dist', 'lat_z_dist', 'stopping_energy']):
+        collisions[name] = values[:, i + 1]
+    collisions['recoil_energy'] = values[:, 6]
+    collisions['atom'] = collision_atoms
+    values = np.array(target_values, dtype=np.float64).reshape(num_collisions, 4)
+    for i, name in enumerate(['target_disp', 'target_vac', 'target_replac', 'target_inter']):
+        collisions[name] = values[:, i]
+
+    values = np.array(recoil_values, dtype=np.float64).reshape(-1, 8)
+    recoils = np.empty(len(values), dtype=RECOIL_DTYPE)
+    for i, name in enumerate(RECOIL_DTYPE.names):
+        recoils[name] = values[:, i]
+
+    values = np.array(ion_values, dtype=np.float64).reshape(-1, 13)
+    ions = np.empty(len(values), dtype=ION_SUMMARY_DTYPE)
+    for i, name in enumerate(ION_SUMMARY_DTYPE.names):
+        ions[name] = values[:, i]
+
+    return CollisionArrays(
+        ions, collisions, recoils,
+        np.array(ion_offsets, dtype=np.int64),
+        np.array(recoil_offsets, dtype=np.int64))
+
+
+def _rebatch(blocks, chunk_size):
+    """Regroup iterable of arrays into arrays of ``chunk_size`` (last may be smaller)"""
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1')
+    pending = None
+    for block in blocks:
+        pending = block if pending is None or not len(pending) else np.concatenate([pending, block])
+        num_chunks = len(pending) // chunk_size
+        for i in range(num_chunks):
+            yield pending[i * chunk_size:(i + 1) * chunk_size]
+        pending = pending[num_chunks * chunk_size:].copy()
+    if pending is not None and len(pending):
+        yield pending
+
+
+def _parse_collision_range(filename, start, end):
+    """Parse bytes ``start`` to ``end`` (whole ions) of COLLISON.txt read with mmap"""
+    if end <= start:
+        return _parse_collisions(b'')
+    with open(filename, 'rb') as f:
+        with contextlib.closing(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) as mm:
+            return _parse_collisions(mm[start:end])
+
+
+def _concatenate_collision_arrays(parts):
+    """Join :class:`srim.output.CollisionArrays` of consecutive ion ranges"""
+    ion_offsets = [np.zeros(1, dtype=np.int64)]
+    recoil_offsets = [np.zeros(1, dtype=np.int64)]
+    num_collisions = num_recoils = 0
+    for part in parts:
+        ion_offsets.append(part.ion_offsets[1:] + num_collisions)
+        recoil_offsets.append(part.recoil_offsets[1:] + num_recoils)
+        num_collisions += len(part.collisions)
+        num_recoils += len(part.recoils)
+    return CollisionArrays(
+        np.concatenate([part.ions for part in parts]),
+        np.concatenate([part.collisions for part in parts]),
+        np.concatenate([part.recoils for part in parts]),
+        np.concatenate(ion_offsets),
+        np.concatenate(recoil_offsets))
 
 
 class Collision:
@@ -481,13 +1689,52 @@ class Collision:
          filename for Collisions. Default ``COLLISON.txt``
 
     """
+    ion_header = b"  Ion    Energy"
+    index_version = 1
+
     def __init__(self, directory, filename='COLLISON.txt'):
         self.filename = os.path.join(directory, filename)
 
         with open(self.filename, encoding="latin-1") as f:
             self._read_header(f)
 
-        self._ion_index = buffered_findall(self.filename, b"  Ion    Energy")
+        self._offsets = self._load_index()
+
+    @property
+    def index_filename(self):
+        """Sidecar file storing offsets of ions ``<filename>.idx``"""
+        return self.filename + '.idx'
+
+    def _load_index(self):
+        """Offsets of every ion followed by the file size
+
+        Read (memory mapped) from :attr:`index_filename` when it was
+        built for a file of the same size and modification time
+        otherwise built with :func:`mmap_findall` and saved.
+        """
+        stat = os.stat(self.filename)
+        key = [self.index_version, stat.st_size, stat.st_mtime_ns]
+        try:
+            index = np.load(self.index_filename, mmap_mode='r', allow_pickle=False)
+            if index.ndim == 1 and len(index) > 3 and list(index[:3]) == key:
+                return index[3:]
+        except (IOError, OSError, ValueError):
+            pass
+
+        offsets = mmap_findall(self.filename, self.ion_header)
+        index = np.concatenate([key, offsets, [stat.st_size]]).astype(np.int64)
+        try:
+            with open(self.index_filename + '.tmp', 'wb') as f:
+                np.save(f, index)
+            os.replace(self.index_filename + '.tmp', self.index_filename)
+        except (IOError, OSError):  # read only directory
+            pass
+        return index[3:]
+
+    @property
+    def _ion_index(self):
+        """Offsets of every ion"""
+        return self._offsets[:-1]
 
     def _read_header(self, f):
         """Read Header of COLLISON.txt
@@ -613,7 +1860,6 @@ class Collision:
                 break
             tokens = line.split()[1:-1]
 
-            print(tokens)
             cascade.append({
                 'recoil': int(tokens[0]),
                 'atom': int(tokens[1]),
@@ -645,48 +1891,472 @@ class Collision:
 
         return target_disp, target_vac, target_replac, target_inter, cascade
 
-    def __getitem__(self, i):
-        start = self._ion_index[i]
-
-        if i == len(self._ion_index):
-            end = os.path.getsize(self.filename)
-        else:
-            end = self._ion_index[i+1]
+    def _read_bytes(self, i):
+        """Raw bytes of ion ``i`` (supports negative indicies)"""
+        num_ions = len(self)
+        if i < 0:
+            i += num_ions
+        if not 0 <= i < num_ions:
+            raise IndexError('ion index out of range')
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
 
         with open(self.filename, "rb") as f:
             f.seek(start)
             # We assume that ion_str will fit in RAM
-            ion_str = f.read(end - start)
-            return self._read_ion(ion_str.decode('latin-1'))
+            return f.read(end - start)
+
+    def __getitem__(self, i):
+        return self._read_ion(self._read_bytes(i).decode('latin-1'))
+
+    def _ion_ranges(self, start, stop, buffer_size):
+        """Consecutive ranges of whole ions at most ``buffer_size`` bytes (or one ion)"""
+        while start < stop:
+            end = int(np.searchsorted(self._offsets, self._offsets[start] + buffer_size, side='right')) - 1
+            end = min(max(end, start + 1), stop)
+            yield start, end
+            start = end
+
+    def iter_chunks(self, chunk_size=100000, atoms=None, min_recoil_energy=None,
+                    depth_range=None, buffer_size=64 * 1024**2):
+        """Iterate over collisions in fixed size batches
+
+        The file is read ``buffer_size`` bytes (of whole ions) at a
+        time so memory use is independent of the size of the
+        file. Filters are applied while parsing; rejected collisions
+        are never converted.
+
+        Parameters
+        ----------
+        chunk_size : :obj:`int`, optional
+            number of collisions in each batch. Default 100000. The
+            last batch may be smaller.
+        atoms : :obj:`list`, optional
+            only collisions with these recoil atoms (symbols or
+            :class:`srim.core.element.Element`)
+        min_recoil_energy : :obj:`float`, optional
+            only collisions with a recoil energy [eV] of at least this
+        depth_range : (:obj:`float`, :obj:`float`), optional
+            only collisions with depth [Angstroms] in this range
+            (inclusive)
+        buffer_size : :obj:`int`, optional
+            bytes read at a time. Default 64 MB.
+
+        Yields
+        ------
+        :class:`numpy.ndarray`
+            collisions with ``COLLISION_DTYPE``
+
+        Examples
+        --------
+        >>> energy = 0.0
+        >>> for chunk in collision.iter_chunks(atoms=['Si'], depth_range=(0, 1e4)):
+        ...     energy += chunk['recoil_energy'].sum()
+        """
+        row_filter = _collision_filter(atoms, min_recoil_energy, depth_range)
+
+        def blocks():
+            with open(self.filename, 'rb') as f:
+                for start, stop in self._ion_ranges(0, len(self), buffer_size):
+                    f.seek(int(self._offsets[start]))
+                    data = f.read(int(self._offsets[stop] - self._offsets[start]))
+                    yield _parse_collisions(data, row_filter).collisions
+
+        return _rebatch(blocks(), chunk_size)
+
+    def to_arrays(self, start=0, stop=None, jobs=None):
+        """Parse ions ``start`` to ``stop`` into numpy structured arrays
+
+        Much faster and smaller than reading ions one at a time with
+        ``collision[i]``.
+
+        Parameters
+        ----------
+        start : :obj:`int`, optional
+            first ion. Default 0.
+        stop : :obj:`int`, optional
+            ion after the last. Default all ions.
+        jobs : :obj:`int`, optional
+            number of processes to parse with. The ions are split in
+            contiguous ranges of about equal size in bytes which each
+            process reads with :mod:`mmap`. Default 1 (this process).
+
+        Returns
+        -------
+        :class:`srim.output.CollisionArrays`
+            per ion summary (``ions``), per collision table
+            (``collisions``) and cascade recoils (``recoils``) with
+            offsets of the collisions of each ion and recoils of each
+            collision (CSR layout). See ``ION_SUMMARY_DTYPE``,
+            ``COLLISION_DTYPE`` and ``RECOIL_DTYPE``.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        if jobs is None or jobs <= 1 or stop - start < 2:
+            return _parse_collision_range(self.filename, int(self._offsets[start]), int(self._offsets[stop]))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return self._parse_ranges(start, stop, jobs, executor)
+
+    def _parse_ranges(self, start, stop, jobs, executor):
+        """Parse ions ``start`` to ``stop`` split in ranges mapped over executor"""
+
+        # several ranges per process to even out differences in parsing time
+        boundaries = np.searchsorted(
+            self._offsets[start:stop + 1],
+            np.linspace(self._offsets[start], self._offsets[stop], 4 * jobs + 1)) + start
+        boundaries = np.unique(np.concatenate([[start], boundaries, [stop]]).clip(start, stop))
+        ranges = [(self.filename, int(self._offsets[i]), int(self._offsets[j]))
+                  for i, j in zip(boundaries[:-1], boundaries[1:])]
+        parts = list(executor.map(_parse_collision_range, *zip(*ranges)))
+        return _concatenate_collision_arrays(parts)
+
+    def convert(self, path, compact=True, buffer_size=64 * 1024**2, jobs=None):
+        """Write collisions to a columnar binary store
+
+        Ions are parsed ``buffer_size`` bytes at a time (see
+        :meth:`to_arrays` for ``jobs``) and appended to one ``.npy``
+        file per column so memory use is bounded.
+
+        Parameters
+        ----------
+        path : :obj:`str`
+            directory to create. See :class:`srim.output.CollisionStore`
+            for the layout.
+        compact : :obj:`bool`, optional
+            store floats as float32 and integers in the smallest type
+            that holds their range. Lossless for the at most five
+            significant digits SRIM writes. Default True.
+        buffer_size : :obj:`int`, optional
+            bytes parsed at a time. Default 64 MB.
+        jobs : :obj:`int`, optional
+            processes parsing each buffer. The processes are started
+            once and reused for every buffer. Default 1.
+
+        Returns
+        -------
+        :class:`srim.output.CollisionStore`
+        """
+        stat = os.stat(self.filename)
+        source = {
+            'filename': os.path.abspath(self.filename),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+        with contextlib.ExitStack() as stack:
+            writer = stack.enter_context(_CollisionStoreWriter(path, compact, source))
+            executor = None
+            if jobs is not None and jobs > 1:
+                # started once for all buffers
+                executor = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+            for start, stop in self._ion_ranges(0, len(self), buffer_size):
+                if executor is None or stop - start < 2:
+                    writer.append(self.to_arrays(start, stop))
+                else:
+                    writer.append(self._parse_ranges(start, stop, jobs, executor))
+        return CollisionStore(path)
 
     def __len__(self):
-        return len(self._ion_index) - 1
+        return len(self._offsets) - 1
+
+
+COLLISION_STORE_VERSION = 1
+
+# Compact dtypes of integer columns. Float columns are stored as float32.
+_COMPACT_INTEGER_DTYPES = {
+    ('ions', 'ion_number'): np.int32,
+    ('collisions', 'ion_number'): np.int32,
+    ('recoils', 'recoil'): np.int32,
+    ('recoils', 'atom'): np.uint8,
+    ('recoils', 'vac'): np.int16,
+    ('recoils', 'repl'): np.int16,
+}
+
+_COLLISION_TABLE_DTYPES = {
+    'ions': ION_SUMMARY_DTYPE,
+    'collisions': COLLISION_DTYPE,
+    'recoils': RECOIL_DTYPE,
+}
+
+_NPY_HEADER_SIZE = 128
+
+
+def _write_npy_header(f, dtype, length):
+    """Version 1.0 ``.npy`` header of fixed size so it can be rewritten"""
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+        np.lib.format.dtype_to_descr(np.dtype(dtype)), length)
+    header_length = _NPY_HEADER_SIZE - 10
+    f.write(b'\x93NUMPY\x01\x00')
+    f.write(np.uint16(header_length).tobytes())
+    f.write(header.ljust(header_length - 1).encode('latin-1') + b'\n')
+
+
+class _NpyColumnWriter(object):
+    """Append-only one dimensional ``.npy`` file"""
+    def __init__(self, filename, dtype):
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self._file = open(filename + '.tmp', 'wb')
+        _write_npy_header(self._file, self.dtype, 0)
+
+    def append(self, values):
+        converted = np.ascontiguousarray(values, dtype=self.dtype)
+        if self.dtype.kind in 'iu' and not np.array_equal(converted, values):
+            raise ValueError('{} does not fit in {}'.format(self.filename, self.dtype))
+        converted.tofile(self._file)
+        self.length += len(converted)
+
+    def close(self):
+        self._file.seek(0)
+        _write_npy_header(self._file, self.dtype, self.length)
+        self._file.close()
+        os.replace(self.filename + '.tmp', self.filename)
+
+
+class _CollisionStoreWriter(object):
+    """Write :class:`srim.output.CollisionArrays` incrementally to a store"""
+    def __init__(self, path, compact, source):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.source = source
+
+        self.columns = {}
+        for table, dtype in _COLLISION_TABLE_DTYPES.items():
+            for name in dtype.names:
+                column_dtype = dtype[name]
+                if compact and column_dtype.kind == 'f':
+                    column_dtype = np.dtype(np.float32)
+                elif compact:
+                    column_dtype = np.dtype(_COMPACT_INTEGER_DTYPES.get((table, name), column_dtype))
+                self.columns[table, name] = _NpyColumnWriter(
+                    os.path.join(path, '{}.{}.npy'.format(table, name)), column_dtype)
+        for offsets in ['ion_offsets', 'recoil_offsets']:
+            self.columns[offsets] = _NpyColumnWriter(os.path.join(path, offsets + '.npy'), np.int64)
+            self.columns[offsets].append([0])
+        self._num_collisions = self._num_recoils = 0
+
+    def append(self, arrays):
+        for table in _COLLISION_TABLE_DTYPES:
+            values = getattr(arrays, table)
+            for name in values.dtype.names:
+                self.columns[table, name].append(values[name])
+        self.columns['ion_offsets'].append(arrays.ion_offsets[1:] + self._num_collisions)
+        self.columns['recoil_offsets'].append(arrays.recoil_offsets[1:] + self._num_recoils)
+        self._num_collisions += len(arrays.collisions)
+        self._num_recoils += len(arrays.recoils)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for column in self.columns.values():
+            column.close()
+        if exc_type is not None:
+            return
+        schema = {
+            'format': 'pysrim-collision',
+            'version': COLLISION_STORE_VERSION,
+            'source': self.source,
+            'tables': {
+                table: {name: np.lib.format.dtype_to_descr(self.columns[table, name].dtype)
+                        for name in dtype.names}
+                for table, dtype in _COLLISION_TABLE_DTYPES.items()
+            },
+            'lengths': {
+                'ions': self.columns['ions', 'ion_number'].length,
+                'collisions': self._num_collisions,
+                'recoils': self._num_recoils,
+            },
+        }
+        # schema is written last and marks the store complete
+        with open(os.path.join(self.path, 'schema.json'), 'w') as f:
+            json.dump(schema, f, indent=2, sort_keys=True)
 
 
-def buffered_findall(filename, string, start=0):
-    """A method of reading a file in buffered pieces (needed for HUGE files)"""
+class CollisionStore(object):
+    """ Columnar binary copy of COLLISON.txt
+
+    Created with :meth:`srim.output.Collision.convert`. Every column
+    is memory mapped so opening is instant regardless of size and
+    only the accessed data is read. Supports the same queries as
+    :class:`srim.output.Collision`.
+
+    Layout of the store directory:
+      - ``schema.json`` format, version, source file and column dtypes
+      - ``<table>.<column>.npy`` for tables ``ions``, ``collisions``
+        and ``recoils`` (see ``ION_SUMMARY_DTYPE``,
+        ``COLLISION_DTYPE`` and ``RECOIL_DTYPE``)
+      - ``ion_offsets.npy`` and ``recoil_offsets.npy`` (CSR offsets)
+
+    Parameters
+    ----------
+    path : :obj:`str`
+        store directory
+
+    Examples
+    --------
+    >>> store = Collision('.').convert('collision.store')
+    >>> store = CollisionStore('collision.store')   # later
+    >>> store.collisions['depth'].mean()
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'schema.json')) as f:
+            self.schema = json.load(f)
+        if self.schema.get('format') != 'pysrim-collision':
+            raise ValueError('{} is not a collision store'.format(path))
+        if self.schema.get('version') != COLLISION_STORE_VERSION:
+            raise ValueError('unsupported collision store version {}'.format(self.schema.get('version')))
+
+        def load(filename):
+            return np.load(os.path.join(path, filename), mmap_mode='r', allow_pickle=False)
+
+        for table, columns in self.schema['tables'].items():
+            setattr(self, table, {name: load('{}.{}.npy'.format(table, name)) for name in columns})
+        self.ion_offsets = load('ion_offsets.npy')
+        self.recoil_offsets = load('recoil_offsets.npy')
+
+    def __len__(self):
+        return len(self.ion_offsets) - 1
+
+    @staticmethod
+    def _table(columns, dtype, start, stop):
+        table = np.empty(stop - start, dtype=dtype)
+        for name in dtype.names:
+            table[name] = columns[name][start:stop]
+        return table
+
+    def to_arrays(self, start=0, stop=None):
+        """Ions ``start`` to ``stop`` as :class:`srim.output.CollisionArrays`
+
+        See :meth:`srim.output.Collision.to_arrays`. Columns are
+        converted back to the full size dtypes.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        collision_start, collision_stop = int(self.ion_offsets[start]), int(self.ion_offsets[stop])
+        recoil_start, recoil_stop = int(self.recoil_offsets[collision_start]), int(self.recoil_offsets[collision_stop])
+        return CollisionArrays(
+            self._table(self.ions, ION_SUMMARY_DTYPE, start, stop),
+            self._table(self.collisions, COLLISION_DTYPE, collision_start, collision_stop),
+            self._table(self.recoils, RECOIL_DTYPE, recoil_start, recoil_stop),
+            np.array(self.ion_offsets[start:stop + 1]) - collision_start,
+            np.array(self.recoil_offsets[collision_start:collision_stop + 1]) - recoil_start)
+
+    def iter_chunks(self, chunk_size=100000, atoms=None, min_recoil_energy=None, depth_range=None):
+        """Iterate over collisions in fixed size batches
+
+        See :meth:`srim.output.Collision.iter_chunks`. Filters are
+        evaluated on the memory mapped columns.
+        """
+        if atoms is not None:
+            atoms = [getattr(atom, 'symbol', atom) for atom in atoms]
+            atoms = np.array([atom.encode('ascii') if not isinstance(atom, bytes) else atom for atom in atoms])
+        num_collisions = len(self.collisions['ion_number'])
+
+        def blocks():
+            for start in range(0, num_collisions, chunk_size):
+                stop = min(start + chunk_size, num_collisions)
+                mask = np.ones(stop - start, dtype=bool)
+                if atoms is not None:
+                    mask &= np.isin(self.collisions['atom'][start:stop], atoms)
+                if min_recoil_energy is not None:
+                    mask &= self.collisions['recoil_energy'][start:stop] >= min_recoil_energy
+                if depth_range is not None:
+                    depth = self.collisions['depth'][start:stop]
+                    mask &= (depth >= depth_range[0]) & (depth <= depth_range[1])
+                yield self._table(self.collisions, COLLISION_DTYPE, start, stop)[mask]
+
+        return _rebatch(blocks(), chunk_size)
+
+    def __getitem__(self, i):
+        """Ion ``i`` in the format of :class:`srim.output.Collision`"""
+        num_ions = len(self)
+        if i < 0:
+            i += num_ions
+        if not 0 <= i < num_ions:
+            raise IndexError('ion index out of range')
+
+        arrays = self.to_arrays(i, i + 1)
+        ion = {name: arrays.ions[0][name].item() for name in ION_SUMMARY_DTYPE.names}
+        ion['collisions'] = []
+        for j, row in enumerate(arrays.collisions):
+            collision = {name: row[name].item() for name in COLLISION_DTYPE.names}
+            collision['atom'] = collision['atom'].decode('ascii')
+            for name in ['target_disp', 'target_vac', 'target_replac', 'target_inter']:
+                if np.isnan(collision[name]):
+                    collision[name] = None
+            recoils = arrays.recoils[arrays.recoil_offsets[j]:arrays.recoil_offsets[j + 1]]
+            collision['cascade'] = [{
+                'recoil': recoil['recoil'].item(),
+                'atom': recoil['atom'].item(),
+                'recoil_energy': recoil['recoil_energy'].item(),
+                'position': np.array([recoil['x'], recoil['y'], recoil['z']]),
+                'vac': recoil['vac'].item(),
+                'repl': recoil['repl'].item(),
+            } for recoil in recoils] or None
+            ion['collisions'].append(collision)
+        return ion
+
+
+def mmap_findall(filename, string, start=0):
+    """Offsets of every occurrence of ``string`` in a file
+
+    The file is memory mapped and searched with :meth:`mmap.mmap.find`
+    so that files larger than memory are scanned at disk speed.
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        int64 offsets
+    """
+    offsets = []
     with open(filename, 'rb') as f:
-        filesize = os.path.getsize(filename)
-        BUFFERSIZE = 4096
-        overlap = len(string) - 1
-        buffer = None
-        positions = []
+        if os.fstat(f.fileno()).st_size == 0:
+            return np.array(offsets, dtype=np.int64)
+        with contextlib.closing(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)) as mm:
+            position = mm.find(string, start)
+            while position != -1:
+                offsets.append(position)
+                position = mm.find(string, position + len(string))
+    return np.array(offsets, dtype=np.int64)
 
-        if start > 0:
-            f.seek(start)
 
-        while True:
-            if (f.tell() >= overlap and f.tell() < filesize):
-                f.seek(f.tell() - overlap)
-            buffer = f.read(BUFFERSIZE)
-            if buffer:
-                buffer_positions = [m.start() for m in re.finditer(string, buffer)]
+def buffered_findall(filename, string, start=0):
+    """A method of reading a file in buffered pieces (needed for HUGE files)
+
+    Kept for compatibility. See :func:`srim.output.mmap_findall`.
+    """
+    return mmap_findall(filename, string, start).tolist()
+
+# Stopping units of SRSettings.output_type 1 to 8
+SR_STOPPING_UNITS = [
+    'eV/Angstrom', 'keV/micron', 'MeV/mm',
+    'keV/(ug/cm2)', 'MeV/(mg/cm2)', 'keV/(mg/cm2)',
+    'eV/(1E15 atoms/cm2)', 'L.S.S. reduced units',
+]
+
+
+def _stopping_unit_key(units):
+    """Stopping unit name ignoring spacing and case"""
+    return re.sub(r'\s+', '', units).lower()
+
+
+SR_TABLE_DTYPE = np.dtype([(name, np.float64) for name in [
+    'energy_keV', 'Se', 'Sn', 'range_um', 'long_straggle_um', 'lat_straggle_um']])
+
+# Conversion of units in SR_OUTPUT.txt to keV and um
+_SR_ENERGY_UNITS = {b'eV': 1e-3, b'keV': 1.0, b'MeV': 1e3, b'GeV': 1e6}
+_SR_LENGTH_UNITS = {b'A': 1e-4, b'um': 1.0, b'mm': 1e3, b'm': 1e6, b'km': 1e9}
+
+
+def _unit_factors(units, factors):
+    """Array of conversion factors of each unit name in ``units``"""
+    try:
+        return np.array(list(map(factors.__getitem__, units)))
+    except KeyError as error:
+        raise SRIMOutputParseError('unknown unit {}'.format(error.args[0].decode('utf-8', 'replace')))
 
-                for position in buffer_positions:
-                    if position >= 0:
-                        positions.append(f.tell() - len(buffer) + position)
-            else:
-                return positions
 
 class SRResults(object):
     """Read SR_OUTPUT.txt file generated by pysrim SR.run()"""
@@ -700,6 +2370,7 @@ class SRResults(object):
         self._data = self._read_stopping_table(output)
         self._ion = self._read_ion_info(output)
         self._target = self._read_target_info(output)
+        self._conversions = self._read_stopping_conversions(output)
 
     def _read_stopping_units(self, output):
         '''read stopping units used in the calculation'''
@@ -764,6 +2435,26 @@ class SRResults(object):
 
         return target_dict
 
+    def _read_stopping_conversions(self, output):
+        '''Factors to convert stopping to every unit from the table footer:
+         Multiply Stopping by        for Stopping Units
+         -------------------        ------------------
+          2.2299E+01                 eV / Angstrom
+          ...
+          1.8212E+01                L.S.S. reduced units
+         ==================================================================
+        '''
+        match = re.search(br'Multiply Stopping by.*\r?\n.*\r?\n((?:[ \t]*\S+[ \t]+.*\S[ \t]*\r?\n)+)', output)
+        if match is None:
+            return {}
+        conversions = {}
+        for line in match.group(1).decode('utf-8').splitlines():
+            factor, unit = line.split(None, 1)
+            if unit.startswith('='):
+                break
+            conversions[unit.strip()] = float(factor)
+        return conversions
+
     def _read_stopping_table(self, output):
         '''table header:
                 Ion        dE/dx      dE/dx     Projected  Longitudinal   Lateral
@@ -789,42 +2480,124 @@ class SRResults(object):
         table_header_regexp = r'\s+Ion\s+dE/dx\s+(.*\r\n){3}'
         table_header_match = re.search(table_header_regexp.encode('utf-8'), output)
 
-        table_footer_regexp = r'\s*-*\r\n\sMultiply'
-        table_footer_match = re.search(table_footer_regexp.encode('utf-8'), output)
-
         start_idx = table_header_match.end()
-        stop_idx = table_footer_match.start()
-
-        rawdata = BytesIO(output[start_idx:stop_idx]).read().decode('utf-8')
-
-        output_array = [[] for i in range(6)]
-
-        #function for
-        energy_conversion = lambda a: 1 if ('keV' in a) else (1e3 if ('MeV' in a) else (1e6 if 'GeV' in a else (1e-3 if 'eV' in a else None)))
-
-        #function for
-        length_conversion = lambda a: 1 if ('um' in a) else (1e-4 if ('A' in a) else (1e3 if ('mm' in a) else None))
-
-        for line in rawdata.split('\r\n'):
-            line_array = line.split()
-            #print(line_array)
-
-            #find conversion factors for all energy values (current unit --> keV)
-            E_coeff = list(map(energy_conversion,(filter(energy_conversion, line_array))))[0]
-
-            #find conversion factors for all length values (current unit --> um)
-            L_coeff = list(map(length_conversion, filter(length_conversion, line_array)))
-
-            energy = float(line_array[0])*E_coeff
-            Se = float(line_array[2])
-            Sn = float(line_array[3])
-            Range = float(line_array[4])*L_coeff[0]
-            long_straggle = float(line_array[6])*L_coeff[1]
-            lat_straggle = float(line_array[8])*L_coeff[2]
-
-            [output_array[i].append(d) for i, d in zip(range(6), [energy, Se, Sn, Range, long_straggle, lat_straggle])]
+        # table ends with a line of dashes before the footer
+        stop_idx = output.find(b'Multiply', start_idx)
+        if stop_idx == -1:
+            raise SRIMOutputParseError('unable to find end of stopping table')
+
+        # value and unit of energy, range and straggling in every row
+        tokens = output[start_idx:stop_idx].rstrip(b'- \t\r\n').split()
+        num_columns = 10
+        if len(tokens) % num_columns:
+            raise SRIMOutputParseError('rows of stopping table have different number of columns')
+
+        data = np.empty((6, len(tokens) // num_columns))
+        try:
+            for row, column in zip(data, [0, 2, 3, 4, 6, 8]):
+                row[:] = tokens[column::num_columns]
+        except ValueError:
+            raise SRIMOutputParseError('unable to parse numbers in stopping table')
+        data[0] *= _unit_factors(tokens[1::num_columns], _SR_ENERGY_UNITS)
+        for row, column in zip(data[3:], [5, 7, 9]):
+            row *= _unit_factors(tokens[column::num_columns], _SR_LENGTH_UNITS)
+        return data
+
+    def save(self, filename):
+        """Save parsed results to a compressed ``.npz`` file
+
+        Parameters
+        ----------
+        filename : :obj:`str`
+            path of file to write. ``.npz`` is appended if missing.
+        """
+        metadata = {'units': self._units, 'ion': self._ion, 'target': self._target,
+                    'conversions': self._conversions}
+        np.savez_compressed(filename, data=self._data, metadata=np.array(json.dumps(metadata)))
+
+    @classmethod
+    def load(cls, filename):
+        """Load results saved with :meth:`save`
+
+        Parameters
+        ----------
+        filename : :obj:`str`
+            path to ``.npz`` file
+        """
+        with np.load(filename) as npz:
+            data = npz['data']
+            metadata = json.loads(str(npz['metadata']))
+
+        return cls.from_data(data, metadata['units'], metadata['ion'], metadata['target'],
+                             metadata.get('conversions', {}))
+
+    @classmethod
+    def from_data(cls, data, units, ion, target, conversions=None):
+        """Results from a stopping table calculated without SRModule
+
+        Parameters
+        ----------
+        data : :class:`numpy.ndarray`
+            table with the layout of :attr:`data`
+        units : :obj:`str`
+            units of stopping in ``data``
+        ion : :obj:`dict`
+            see :attr:`ion`
+        target : :obj:`dict`
+            see :attr:`target`
+        conversions : :obj:`dict`, optional
+            factor to convert stopping to each unit name. See
+            :meth:`stopping`.
+        """
+        results = cls.__new__(cls)
+        results._units = units
+        results._data = np.asarray(data, dtype=np.float64)
+        results._ion = ion
+        results._target = target
+        results._conversions = conversions or {}
+        return results
+
+    def stopping(self, units=None):
+        """Electronic and nuclear stopping in any unit
+
+        SR_OUTPUT.txt lists factors to convert the stopping table to
+        every unit SRIM supports so one calculation is enough for all
+        of them.
+
+        Parameters
+        ----------
+        units : :obj:`str` or :obj:`int`, optional
+            unit name as printed by SRIM (spacing and case are ignored)
+            e.g. ``'eV/Angstrom'``, ``'MeV/(mg/cm2)'`` or
+            ``'eV/(1E15 atoms/cm2)'``, or ``output_type`` of
+            :class:`srim.srim.SRSettings` (1-8). See
+            :attr:`stopping_units`. Default :attr:`units` of table.
+
+        Returns
+        -------
+        electronic : :class:`numpy.ndarray`
+            electronic stopping in ``units`` at each energy
+        nuclear : :class:`numpy.ndarray`
+            nuclear stopping in ``units`` at each energy
+        """
+        if units is None:
+            factor = 1.0
+        else:
+            if isinstance(units, (int, np.integer)):
+                if not 1 <= units <= len(SR_STOPPING_UNITS):
+                    raise ValueError('output_type must be between 1 and {}'.format(len(SR_STOPPING_UNITS)))
+                units = SR_STOPPING_UNITS[units - 1]
+            conversions = {_stopping_unit_key(name): factor for name, factor in self._conversions.items()}
+            try:
+                factor = conversions[_stopping_unit_key(units)]
+            except KeyError:
+                raise ValueError('stopping units {} not in {}'.format(units, ', '.join(self.stopping_units)))
+        return self._data[1] * factor, self._data[2] * factor
 
-        return np.array(output_array)
+    @property
+    def stopping_units(self):
+        """Units available to :meth:`stopping`"""
+        return list(self._conversions)
 
     @property
     def units(self):
@@ -844,6 +2617,20 @@ class SRResults(object):
         """
         return self._data
 
+    @property
+    def table(self):
+        """Stopping table as structured array
+
+        Fields ``energy_keV``, ``Se`` and ``Sn`` (electronic and
+        nuclear stopping in :attr:`units`), ``range_um``,
+        ``long_straggle_um`` and ``lat_straggle_um``. Same values as
+        :attr:`data` one row per energy.
+        """
+        table = np.empty(self._data.shape[1], dtype=SR_TABLE_DTYPE)
+        for name, column in zip(SR_TABLE_DTYPE.names, self._data):
+            table[name] = column
+        return table
+
     @property
     def ion(self):
         """
@@ -873,3 +2660,4 @@ class SRResults(object):
         }
         """
         return self._target
+
@@ -0,0 +1,250 @@
+""" Run many TRIM calculations concurrently
+
+Every worker process owns a private sandbox (a copy of the SRIM
+directory, see :mod:`srim.sandbox`) so calculations never share
+``TRIM.IN``, ``TRIMAUTO`` or output files.
+"""
+import os
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .srim import TRIM
+from .output import Results
+from .sandbox import SandboxPool, reset_sandbox
+from .config import DEFAULT_SRIM_DIRECTORY
+
+
+# Sandbox owned by the current worker process
+_worker_sandbox = None
+
+
+def _init_worker(sandboxes):
+    """Claim a sandbox for the lifetime of the worker process"""
+    global _worker_sandbox
+    _worker_sandbox = sandboxes.get()
+
+
+def _run_trim(trim, output_directory, cache=None, watchdog=None, retry=None, load=False):
+    """Run TRIM in the worker's sandbox and harvest its output files
+
+    Output files are read from ``output_directory`` when accessed
+    unless ``load`` in which case they are read before returning.
+    """
+    if not os.path.isdir(output_directory):
+        os.makedirs(output_directory)
+
+    if cache is not None:
+        key = cache.key(trim, _worker_sandbox)
+        cache_directory = cache.get(key)
+        if cache_directory is not None:
+            TRIM.copy_output_files(cache_directory, output_directory)
+            results = Results(output_directory)
+            return results.load() if load else results
+
+    reset_sandbox(_worker_sandbox)
+    results = trim.run(_worker_sandbox, cache, watchdog, retry)
+    TRIM.store_results(results, output_directory)
+    if results.directory is not None:  # not merged by retry policy
+        # sandbox is reused by the next calculation
+        results.directory = output_directory
+    return results.load() if load else results
+
+
+class TRIMPool(object):
+    """ Pool of worker processes each with a private SRIM sandbox
+
+    Parameters
+    ----------
+    jobs : :obj:`int`, optional
+        number of TRIM calculations to run at the same time. Default
+        number of cpus.
+    srim_directory : :obj:`str`, optional
+        path to srim directory that will be copied for each
+        worker. Default ``/tmp/srim``.
+    work_directory : :obj:`str`, optional
+        directory to create sandboxes and default output directories
+        in. Default is a temporary directory that is removed on
+        :meth:`close`.
+    link : :obj:`bool`, optional
+        hardlink files of the SRIM installation that are never
+        written. See :class:`srim.sandbox.SandboxPool`. Default False.
+    tmpfs : :obj:`bool`, optional
+        place sandboxes in ``/dev/shm``. See
+        :class:`srim.sandbox.SandboxPool`. Default False.
+    sandboxes : :class:`srim.sandbox.SandboxPool`, optional
+        existing sandboxes to use (one worker per sandbox, at most
+        ``jobs``). Sandboxes are taken with
+        :meth:`srim.sandbox.SandboxPool.get`, waiting for those in
+        use, and returned on :meth:`close` so can be reused by
+        another pool. Default create sandboxes.
+    cache : :class:`srim.cache.TRIMCache`, optional
+        cache to look up calculations in before running TRIM and
+        store results in after. Default no caching.
+    watchdog : :class:`srim.watchdog.Watchdog`, optional
+        supervises each TRIM process. Default no limits.
+    retry : :class:`srim.watchdog.RetryPolicy`, optional
+        reruns failed calculations. Default no retries.
+
+    Examples
+    --------
+    Run several calculations four at a time.
+
+    >>> with TRIMPool(jobs=4) as pool:
+    ...     results = pool.map(trims, output_directories)
+    """
+    def __init__(self, jobs=None, srim_directory=DEFAULT_SRIM_DIRECTORY, work_directory=None,
+                 cache=None, watchdog=None, retry=None, link=False, tmpfs=False, sandboxes=None):
+        if sandboxes is not None:
+            jobs = min(jobs or len(sandboxes), len(sandboxes))
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.cache = cache
+        self.watchdog = watchdog
+        self.retry = retry
+
+        if work_directory is None:
+            self._work_directory = tempfile.mkdtemp(prefix='pysrim-')
+            self._remove_work_directory = True
+        else:
+            self._work_directory = os.path.abspath(work_directory)
+            self._remove_work_directory = False
+            if not os.path.isdir(self._work_directory):
+                os.makedirs(self._work_directory)
+
+        self._owns_sandboxes = sandboxes is None
+        if sandboxes is None:
+            sandboxes = SandboxPool(
+                srim_directory, self.jobs,
+                directory=None if tmpfs else os.path.join(self._work_directory, 'sandboxes'),
+                link=link, tmpfs=tmpfs)
+        self._sandboxes = sandboxes
+
+        # sandboxes may be shared with other users of the SandboxPool
+        self._claimed = [sandboxes.get() for _ in range(self.jobs)]
+        sandbox_queue = multiprocessing.Queue()
+        for sandbox in self._claimed:
+            sandbox_queue.put(sandbox)
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.jobs,
+            initializer=_init_worker,
+            initargs=(sandbox_queue,))
+        self._num_submitted = 0
+
+    @property
+    def work_directory(self):
+        """Directory containing sandboxes and default output directories"""
+        return self._work_directory
+
+    def submit(self, trim, output_directory=None):
+        """Schedule a TRIM calculation
+
+        Parameters
+        ----------
+        trim : :class:`srim.srim.TRIM`
+            calculation to run
+        output_directory : :obj:`str`, optional
+            directory to copy TRIM output files to. Default
+            ``<work_directory>/output/<n>`` where ``n`` is the order
+            of submission. Results are read lazily from this
+            directory except for the default output directory of a
+            temporary work directory which is read before returning.
+
+        Returns
+        -------
+        :class:`concurrent.futures.Future`
+            future resolving to :class:`srim.output.Results`
+        """
+        # default output directory may be removed on close
+        load = output_directory is None and self._remove_work_directory
+        if output_directory is None:
+            output_directory = os.path.join(
+                self._work_directory, 'output', str(self._num_submitted))
+        self._num_submitted += 1
+        return self._executor.submit(
+            _run_trim, trim, os.path.abspath(output_directory),
+            self.cache, self.watchdog, self.retry, load)
+
+    def map(self, trims, output_directories=None):
+        """Run TRIM calculations and return results in the same order
+
+        Parameters
+        ----------
+        trims : iterable of :class:`srim.srim.TRIM`
+            calculations to run
+        output_directories : iterable of :obj:`str`, optional
+            output directory for each calculation. See :meth:`submit`.
+
+        Returns
+        -------
+        :obj:`list` of :class:`srim.output.Results`
+        """
+        trims = list(trims)
+        if output_directories is None:
+            output_directories = [None] * len(trims)
+        else:
+            output_directories = list(output_directories)
+            if len(output_directories) != len(trims):
+                raise ValueError('must supply an output directory for every trim calculation')
+
+        futures = [self.submit(trim, output_directory) for trim, output_directory in zip(trims, output_directories)]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Wait for calculations to finish and remove sandboxes"""
+        self._executor.shutdown(wait=True)
+        if self._owns_sandboxes:
+            self._sandboxes.close(remove=True)
+            shutil.rmtree(self._sandboxes.directory, ignore_errors=True)
+        else:
+            for sandbox in self._claimed:
+                self._sandboxes.put(sandbox)
+            self._claimed = []
+        if self._remove_work_directory:
+            shutil.rmtree(self._work_directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def run_many(trims, jobs=None, srim_directory=DEFAULT_SRIM_DIRECTORY,
+             output_directories=None, work_directory=None, cache=None,
+             watchdog=None, retry=None, link=False, tmpfs=False, sandboxes=None):
+    """Run TRIM calculations concurrently each in a private sandbox
+
+    Parameters
+    ----------
+    trims : iterable of :class:`srim.srim.TRIM`
+        calculations to run
+    jobs : :obj:`int`, optional
+        number of TRIM calculations to run at the same time. Default
+        number of cpus. No more workers than calculations are started.
+    srim_directory : :obj:`str`, optional
+        path to srim directory. Default ``/tmp/srim``.
+    output_directories : iterable of :obj:`str`, optional
+        directory to copy output files of each calculation to
+    work_directory : :obj:`str`, optional
+        see :class:`srim.pool.TRIMPool`
+    cache : :class:`srim.cache.TRIMCache`, optional
+        see :class:`srim.pool.TRIMPool`
+    watchdog : :class:`srim.watchdog.Watchdog`, optional
+        see :class:`srim.pool.TRIMPool`
+    retry : :class:`srim.watchdog.RetryPolicy`, optional
+        see :class:`srim.pool.TRIMPool`
+    link, tmpfs, sandboxes :
+        see :class:`srim.pool.TRIMPool`
+
+    Returns
+    -------
+    :obj:`list` of :class:`srim.output.Results`
+    """
+    trims = list(trims)
+    # each worker prepares a sandbox so do not start idle ones
+    jobs = max(1, min(jobs or multiprocessing.cpu_count(), len(trims)))
+    with TRIMPool(jobs, srim_directory, work_directory, cache, watchdog, retry,
+                  link, tmpfs, sandboxes) as pool:
+        return pool.map(trims, output_directories)
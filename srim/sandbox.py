@@ -0,0 +1,250 @@
+""" Private copies of a SRIM installation
+
+TRIM and SR read their input from, and write their output to, the
+directory of the executable. Running several calculations at the same
+time therefore requires each calculation to have its own copy of the
+SRIM directory (a sandbox).
+
+Sandboxes can hardlink the files of the installation that SRIM never
+writes (executables, libraries, data tables) and be placed on a
+memory backed filesystem (``/dev/shm``). A :class:`SandboxPool`
+prepares sandboxes once and resets them between calculations.
+"""
+import os
+import errno
+import queue
+import shutil
+import asyncio
+import weakref
+import tempfile
+import contextlib
+
+
+TRIM_INPUT_FILES = {'TRIM.IN', 'TRIMAUTO'}
+
+TRIM_OUTPUT_FILES = {
+    'PHONON.txt', 'E2RECOIL.txt', 'IONIZ.txt',
+    'LATERAL.txt', 'NOVAC.txt', 'RANGE.txt', 'VACANCY.txt',
+    'COLLISON.txt', 'BACKSCAT.txt', 'SPUTTER.txt',
+    'RANGE_3D.txt', 'TRANSMIT.txt', 'TRIMOUT.txt',
+    'TDATA.txt'
+}
+
+SR_FILES = {'SR.IN', 'SR_OUTPUT.txt'}
+
+# Directories and file extensions SRIM writes to. These are always
+# copied never hardlinked since writing to a hardlink would modify the
+# original installation.
+WRITABLE_DIRECTORIES = {'SRIM Outputs', 'SRIM Restore'}
+WRITABLE_EXTENSIONS = {'.in', '.txt', '.sav', '.dat'}
+
+TMPFS_DIRECTORY = os.path.join(os.sep, 'dev', 'shm')
+
+_MARKER_FILENAME = '.pysrim-sandbox'
+
+
+def _is_writable(path):
+    """Whether SRIM may write to file at path"""
+    name = os.path.basename(path)
+    if name in TRIM_INPUT_FILES or os.path.splitext(name)[1].lower() in WRITABLE_EXTENSIONS:
+        return True
+    parts = os.path.normpath(path).split(os.sep)
+    return any(part in WRITABLE_DIRECTORIES for part in parts)
+
+
+def _link_or_copy(src, dst):
+    """Hardlink read only files falling back to copy across filesystems"""
+    if not _is_writable(src):
+        try:
+            os.link(src, dst)
+            return dst
+        except OSError as error:
+            if error.errno not in {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP}:
+                raise
+    return shutil.copy2(src, dst)
+
+
+def create_sandbox(srim_directory, directory, link=False):
+    """Copy SRIM installation to a new directory
+
+    Parameters
+    ----------
+    srim_directory : :obj:`str`
+        path to srim directory to copy. ``TRIM.exe`` should be located
+        in this directory.
+    directory : :obj:`str`
+        path of sandbox to create. Must not exist.
+    link : :obj:`bool`, optional
+        hardlink files SRIM never writes instead of copying
+        them. Falls back to copying when ``directory`` is on a
+        different filesystem. Default False.
+
+    Returns
+    -------
+    :obj:`str`
+        absolute path to sandbox
+    """
+    directory = os.path.abspath(directory)
+    copy_function = _link_or_copy if link else shutil.copy2
+    shutil.copytree(srim_directory, directory, symlinks=True, copy_function=copy_function)
+    reset_sandbox(directory)
+    return directory
+
+
+def reset_sandbox(directory, owned=True):
+    """Remove input and output files left by a previous calculation
+
+    Removes the files written by :class:`srim.input.AutoTRIM`,
+    :class:`srim.input.TRIMInput` and :class:`srim.input.SRInput`,
+    TRIM output files and everything in ``SRIM Outputs``.
+
+    Parameters
+    ----------
+    directory : :obj:`str`
+        path to sandbox (or srim directory)
+    owned : :obj:`bool`, optional
+        ``directory`` is a sandbox owned by pysrim. When False (a
+        user's SRIM installation) only TRIM output files are removed
+        from ``SRIM Outputs`` and ``SR Module`` is left alone. Default
+        True.
+    """
+    filenames = [os.path.join(directory, filename) for filename in TRIM_INPUT_FILES | TRIM_OUTPUT_FILES]
+    if owned:
+        filenames += [os.path.join(directory, 'SR Module', filename) for filename in SR_FILES]
+
+    srim_outputs_directory = os.path.join(directory, 'SRIM Outputs')
+    if owned and os.path.isdir(srim_outputs_directory):
+        filenames += [os.path.join(srim_outputs_directory, filename) for filename in os.listdir(srim_outputs_directory)]
+    else:
+        filenames += [os.path.join(srim_outputs_directory, filename) for filename in TRIM_OUTPUT_FILES]
+
+    for filename in filenames:
+        if os.path.isfile(filename):
+            os.remove(filename)
+
+
+def remove_sandbox(directory):
+    """Delete sandbox directory"""
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+class SandboxPool(object):
+    """ Sandboxes prepared once and reused between calculations
+
+    Parameters
+    ----------
+    srim_directory : :obj:`str`
+        path to srim directory to copy
+    size : :obj:`int`
+        number of sandboxes
+    directory : :obj:`str`, optional
+        directory to create sandboxes in. Sandboxes left in this
+        directory by an earlier pool of the same ``srim_directory``
+        are reused. Default a new temporary directory.
+    link : :obj:`bool`, optional
+        hardlink files SRIM never writes. See
+        :func:`srim.sandbox.create_sandbox`. Default False.
+    tmpfs : :obj:`bool`, optional
+        create default temporary directory in ``/dev/shm`` so that
+        TRIM output is written to memory. Default False.
+
+    Examples
+    --------
+    >>> with SandboxPool('/tmp/srim', 4, tmpfs=True) as sandboxes:
+    ...     with sandboxes.acquire() as sandbox:
+    ...         results = trim.run(sandbox)
+    """
+    def __init__(self, srim_directory, size, directory=None, link=False, tmpfs=False):
+        if size < 1:
+            raise ValueError('size must be at least 1')
+
+        srim_directory = os.path.abspath(srim_directory)
+        if directory is None:
+            if tmpfs and not os.path.isdir(TMPFS_DIRECTORY):
+                raise ValueError('tmpfs requires {}'.format(TMPFS_DIRECTORY))
+            self.directory = tempfile.mkdtemp(prefix='pysrim-', dir=TMPFS_DIRECTORY if tmpfs else None)
+            self._remove_directory = True
+        else:
+            self.directory = os.path.abspath(directory)
+            self._remove_directory = False
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+
+        self.sandboxes = []
+        self._available = queue.Queue()
+        self._semaphores = weakref.WeakKeyDictionary()
+        for i in range(size):
+            sandbox = os.path.join(self.directory, 'sandbox-{}'.format(i))
+            marker = os.path.join(sandbox, _MARKER_FILENAME)
+            if os.path.isfile(marker):
+                with open(marker) as f:
+                    if f.read() == srim_directory:
+                        reset_sandbox(sandbox)
+                    else:
+                        remove_sandbox(sandbox)
+            if not os.path.isfile(marker):
+                create_sandbox(srim_directory, sandbox, link=link)
+                with open(marker, 'w') as f:
+                    f.write(srim_directory)
+            self.sandboxes.append(sandbox)
+            self._available.put(sandbox)
+
+    def __len__(self):
+        return len(self.sandboxes)
+
+    def get(self, block=True, timeout=None):
+        """Take an unused sandbox
+
+        Raises :class:`queue.Empty` if none is available within
+        ``timeout`` seconds (immediately if ``block`` is False).
+        """
+        return self._available.get(block, timeout)
+
+    def put(self, sandbox):
+        """Reset sandbox and return it to the pool"""
+        reset_sandbox(sandbox)
+        self._available.put(sandbox)
+
+    def _async_semaphore(self):
+        """Semaphore of the running event loop with a slot for each sandbox
+
+        Coroutines wait on it for a sandbox instead of polling
+        :meth:`get`.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(len(self))
+        return self._semaphores[loop]
+
+    @contextlib.contextmanager
+    def acquire(self, timeout=None):
+        """Context manager yielding an unused sandbox"""
+        sandbox = self.get(timeout=timeout)
+        try:
+            yield sandbox
+        finally:
+            self.put(sandbox)
+
+    def close(self, remove=None):
+        """Remove sandboxes
+
+        Parameters
+        ----------
+        remove : :obj:`bool`, optional
+            Default remove sandboxes only when the pool created its
+            own temporary directory. Sandboxes in a user supplied
+            ``directory`` are kept for reuse.
+        """
+        if remove is None:
+            remove = self._remove_directory
+        if remove:
+            for sandbox in self.sandboxes:
+                remove_sandbox(sandbox)
+            if self._remove_directory:
+                shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,9 +2,14 @@
 
 """
 import os
+import copy
 import random
+import queue
+import asyncio
+import contextlib
 import subprocess
 import shutil
+import tempfile
 import distutils.spawn
 
 from .core.utils import (
@@ -16,11 +21,82 @@ from .core.utils import (
     is_quoteless
 )
 
-from .output import Results, SRResults
+from .output import Results, SRResults, MERGED_RESULTS_FILENAME
 from .input import AutoTRIM, TRIMInput, SRInput
+from .sandbox import TRIM_OUTPUT_FILES, create_sandbox
+from .checkpoint import Checkpoint
 from .config import DEFAULT_SRIM_DIRECTORY
 
 
+def _srim_command(directory, executable):
+    """Command that launches ``executable`` located in ``directory``
+
+    Make sure compatible with Windows, OSX, and Linux. If 'wine'
+    command exists use it to launch the executable.
+    """
+    executable = os.path.join(os.path.abspath(directory), executable)
+    if distutils.spawn.find_executable("wine"):
+        return ['wine', executable]
+    return [executable]
+
+
+async def _check_call_async(args, cwd):
+    """Asynchronous :func:`subprocess.check_call` killing the process on cancellation"""
+    process = await asyncio.create_subprocess_exec(*args, cwd=cwd)
+    try:
+        returncode = await process.wait()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, args)
+
+
+@contextlib.asynccontextmanager
+async def _async_sandbox(srim_directory, sandboxes=None, subdirectory=None):
+    """Private copy of ``srim_directory`` for an asynchronous calculation
+
+    Taken from ``sandboxes`` (:class:`srim.sandbox.SandboxPool`) when
+    given otherwise ``srim_directory`` (or only its ``subdirectory``)
+    is copied to a temporary directory.
+    """
+    loop = asyncio.get_event_loop()
+    if sandboxes is not None:
+        async with sandboxes._async_semaphore():
+            try:
+                sandbox = sandboxes.get(block=False)
+            except queue.Empty:
+                # sandbox is held outside of the event loop e.g. by
+                # SandboxPool.acquire or a TRIMPool sharing the SandboxPool
+                sandbox = await loop.run_in_executor(None, sandboxes.get)
+            try:
+                yield sandbox
+            finally:
+                await loop.run_in_executor(None, sandboxes.put, sandbox)
+    else:
+        work_directory = tempfile.mkdtemp(prefix='pysrim-')
+        try:
+            if subdirectory is None:
+                await loop.run_in_executor(
+                    None, create_sandbox, srim_directory, os.path.join(work_directory, 'srim'))
+            else:
+                await loop.run_in_executor(
+                    None, shutil.copytree, os.path.join(srim_directory, subdirectory),
+                    os.path.join(work_directory, 'srim', subdirectory))
+            yield os.path.join(work_directory, 'srim')
+        finally:
+            await loop.run_in_executor(None, shutil.rmtree, work_directory, True)
+
+
+async def _with_semaphore(semaphore, coroutine_function, *args):
+    """Await ``coroutine_function(*args)`` holding ``semaphore`` if given"""
+    if semaphore is None:
+        return await coroutine_function(*args)
+    async with semaphore:
+        return await coroutine_function(*args)
+
+
 class TRIMSettings(object):
     """ TRIM Settings
 
@@ -34,8 +110,9 @@ class TRIMSettings(object):
     reminders : :obj:`str`, optional
        TODO: could not find description. default 0
     autosave : :obj:`int`, optional
-       save calculations after every `autosave` steps. default 0 will
-       not autosave except at end
+       save calculations after every `autosave` ions. default 0 will
+       not autosave except at end. See
+       :meth:`srim.srim.TRIM.run_resumable`
     plot_mode : :obj:`int`, optional
        Default 5.
        (0) ion distribution with recoils projected on y-plane
@@ -89,14 +166,14 @@ class TRIMSettings(object):
         self._settings = {
             'description': check_input(str, is_quoteless, kwargs.get('description', 'pysrim run')),
             'reminders': check_input(int, is_zero_or_one, kwargs.get('reminders', 0)),
-            'autosave': check_input(int, is_zero_or_one, kwargs.get('autosave', 0)),
+            'autosave': check_input(int, is_positive, kwargs.get('autosave', 0)),
             'plot_mode': check_input(int, is_zero_to_five, kwargs.get('plot_mode', 5)),
             'plot_xmin': check_input(float, is_positive, kwargs.get('plot_xmin', 0.0)),
             'plot_xmax': check_input(float, is_positive, kwargs.get('plot_xmax', 0.0)),
             'ranges': check_input(int, is_zero_or_one, kwargs.get('ranges', 0)),
             'backscattered': check_input(int, is_zero_or_one, kwargs.get('backscattered', 0)),
             'transmit': check_input(int, is_zero_or_one, kwargs.get('transmit', 0)),
-            'sputtered': check_input(int, is_zero_or_one, kwargs.get('ranges', 0)),
+            'sputtered': check_input(int, is_zero_or_one, kwargs.get('sputtered', 0)),
             'collisions': check_input(int, is_zero_to_two, kwargs.get('collisions', 0)),
             'exyz': check_input(int, is_positive, kwargs.get('exyz', 0)),
             'angle_ions': check_input(float, is_srim_degrees, kwargs.get('angle_ions', 0.0)),
@@ -109,7 +186,12 @@ class TRIMSettings(object):
             raise ValueError('xmin must be <= xmax')
 
     def __getattr__(self, attr):
-        return self._settings[attr]
+        # Look in __dict__ so that copy and pickle (which probe for
+        # methods before _settings exists) do not recurse
+        try:
+            return self.__dict__['_settings'][attr]
+        except KeyError:
+            raise AttributeError(attr)
 
 
 class TRIM(object):
@@ -154,10 +236,14 @@ class TRIM(object):
         self.target = target
         self.ion = ion
 
-    def _write_input_files(self):
+    def _input_files(self):
+        """ Necissary TRIM input files for calculation """
+        return [AutoTRIM(), TRIMInput(self)]
+
+    def _write_input_files(self, directory='.'):
         """ Write necissary TRIM input files for calculation """
-        AutoTRIM().write()
-        TRIMInput(self).write()
+        for input_file in self._input_files():
+            input_file.write(directory)
 
     @staticmethod
     def copy_output_files(src_directory, dest_directory, check_srim_output=True):
@@ -172,13 +258,7 @@ class TRIM(object):
         check_srim_output : :obj:`bool`, optional
             ensure that all files exist
         """
-        known_files = {
-            'TRIM.IN', 'PHONON.txt', 'E2RECOIL.txt', 'IONIZ.txt',
-            'LATERAL.txt', 'NOVAC.txt', 'RANGE.txt', 'VACANCY.txt',
-            'COLLISON.txt', 'BACKSCAT.txt', 'SPUTTER.txt',
-            'RANGE_3D.txt', 'TRANSMIT.txt', 'TRIMOUT.txt',
-            'TDATA.txt'
-        }
+        known_files = {'TRIM.IN'} | TRIM_OUTPUT_FILES
 
         if not os.path.isdir(src_directory):
             raise ValueError('src_directory must be directory')
@@ -195,34 +275,294 @@ class TRIM(object):
                 shutil.move(os.path.join(
                     src_directory, 'SRIM Outputs', known_file), dest_directory)
 
-    def run(self, srim_directory=DEFAULT_SRIM_DIRECTORY):
+    @staticmethod
+    def store_results(results, dest_directory):
+        """Keep results of a calculation in destination directory
+
+        TRIM output files are copied from ``results.directory``.
+        Results merged from a split calculation (see
+        :class:`srim.watchdog.RetryPolicy`) have no directory of their
+        own, their working directory only holds the output of the last
+        shard, so they are saved with
+        :meth:`srim.output.Results.save` instead. Read them back with
+        :meth:`srim.output.Results.open`.
+
+        Parameters
+        ----------
+        results : :class:`srim.output.Results`
+            results returned by :meth:`run`
+        dest_directory : :obj:`str`
+            destination directory
+        """
+        merged_filename = os.path.join(dest_directory, MERGED_RESULTS_FILENAME)
+        if results.directory is None:
+            # partial output files of an earlier run must not be read instead
+            for filename in {'TRIM.IN'} | TRIM_OUTPUT_FILES:
+                if os.path.isfile(os.path.join(dest_directory, filename)):
+                    os.remove(os.path.join(dest_directory, filename))
+            results.save(dest_directory)
+        else:
+            if os.path.isfile(merged_filename):
+                os.remove(merged_filename)
+            TRIM.copy_output_files(results.directory, dest_directory)
+
+    def run(self, srim_directory=DEFAULT_SRIM_DIRECTORY, cache=None, watchdog=None, retry=None):
         """Run configured srim calculation
 
         This method:
          - writes the input file to ``<srim_directory>/TRIM.IN``
          - launches ``<srim_directory>/TRIM.exe``. Uses ``wine`` if available (needed for linux and osx)
 
+        The working directory of the python process is not changed
+        (TRIM is launched with ``cwd=srim_directory``). Two
+        calculations may still not share the same ``srim_directory``
+        at the same time, see :class:`srim.pool.TRIMPool` for running
+        many calculations concurrently.
+
         Parameters
         ----------
         srim_directory : :obj:`str`, optional
             path to srim directory. ``SRIM.exe`` should be located in
             this directory. Default ``/tmp/srim/`` will absolutely
             need to change for windows.
+        cache : :class:`srim.cache.TRIMCache`, optional
+            when given and an identical calculation is in the cache
+            its results are read and returned without running TRIM. Otherwise
+            output files are stored in the cache after running
+            TRIM. Default no caching.
+        watchdog : :class:`srim.watchdog.Watchdog`, optional
+            supervises TRIM with wall clock, idle output and memory
+            limits. Default wait for TRIM without limits.
+        retry : :class:`srim.watchdog.RetryPolicy`, optional
+            reruns TRIM when it fails. Failures are recorded in
+            ``results.failures``. Results of reseeded or split
+            calculations are not stored in ``cache``. Default no
+            retries.
         """
-        current_directory = os.getcwd()
-        try:
-            os.chdir(srim_directory)
-            self._write_input_files()
-            # Make sure compatible with Windows, OSX, and Linux
-            # If 'wine' command exists use it to launch TRIM
-            if distutils.spawn.find_executable("wine"):
-                subprocess.check_call(['wine', str(os.path.join('.', 'TRIM.exe'))])
+        if cache is not None:
+            key = cache.key(self, srim_directory)
+            cache_directory = cache.get(key)
+            if cache_directory is not None:
+                # entry may be evicted or pruned before outputs are accessed
+                return Results(cache_directory).load()
+
+        if retry is None:
+            self._execute(srim_directory, watchdog)
+            results, exact = Results(srim_directory), True
+        else:
+            results, exact = retry.run(self, srim_directory, watchdog)
+
+        if cache is not None and exact:
+            cache.put(key, srim_directory)
+        return results
+
+    async def run_async(self, srim_directory=DEFAULT_SRIM_DIRECTORY, output_directory=None,
+                        semaphore=None, sandboxes=None):
+        """Run configured srim calculation without blocking the event loop
+
+        ``srim_directory`` is copied to a temporary working directory
+        (or a sandbox is taken from ``sandboxes``) so that any number
+        of calculations can run at the same time. TRIM is launched
+        with :func:`asyncio.create_subprocess_exec` and file
+        operations are run in the default executor.
+
+        Parameters
+        ----------
+        srim_directory : :obj:`str`, optional
+            path to srim directory. Default ``/tmp/srim``. Only read
+            from.
+        output_directory : :obj:`str`, optional
+            directory to copy TRIM output files to. Default output
+            files are removed with the working directory.
+        semaphore : :class:`asyncio.Semaphore`, optional
+            held while the calculation runs to limit the number of
+            concurrent calculations
+        sandboxes : :class:`srim.sandbox.SandboxPool`, optional
+            prepared sandboxes to run in instead of copying
+            ``srim_directory``. Waits for a free sandbox.
+
+        Returns
+        -------
+        :class:`srim.output.Results`
+        """
+        return await _with_semaphore(semaphore, self._run_async, srim_directory, output_directory, sandboxes)
+
+    async def _run_async(self, srim_directory, output_directory, sandboxes):
+        loop = asyncio.get_event_loop()
+        async with _async_sandbox(srim_directory, sandboxes) as sandbox:
+            await loop.run_in_executor(None, self._write_input_files, sandbox)
+            await _check_call_async(_srim_command(sandbox, 'TRIM.exe'), cwd=sandbox)
+
+            if output_directory is None:
+                # sandbox is removed or reused so read everything now
+                return await loop.run_in_executor(None, lambda: Results(sandbox).load())
+
+            if not os.path.isdir(output_directory):
+                os.makedirs(output_directory)
+            await loop.run_in_executor(None, self.copy_output_files, sandbox, output_directory)
+            return Results(output_directory)
+
+    def run_sharded(self, shards, jobs=None, srim_directory=DEFAULT_SRIM_DIRECTORY, output_directory=None):
+        """Split calculation into smaller calculations run concurrently
+
+        ``number_ions`` is divided between ``shards`` calculations
+        each with a distinct random seed. Seeds are drawn from a
+        generator seeded with ``random_seed`` so the same calculation
+        always produces the same shards. Calculations are run with
+        :class:`srim.pool.TRIMPool` and merged with
+        :meth:`srim.output.Results.merge`.
+
+        Parameters
+        ----------
+        shards : :obj:`int`
+            number of calculations to split ``number_ions`` into
+        jobs : :obj:`int`, optional
+            number of calculations to run at the same time. Default
+            number of cpus.
+        srim_directory : :obj:`str`, optional
+            path to srim directory. Default ``/tmp/srim``.
+        output_directory : :obj:`str`, optional
+            when given output files of shard ``i`` are copied to
+            ``<output_directory>/shard-<i>``
+
+        Returns
+        -------
+        :class:`srim.output.Results`
+            results weighted by number of ions in each shard
+        """
+        from .pool import TRIMPool
+
+        trims = self.shards(shards)
+        output_directories = None
+        if output_directory is not None:
+            output_directories = [os.path.join(output_directory, 'shard-{}'.format(i)) for i in range(len(trims))]
+
+        with TRIMPool(jobs, srim_directory) as pool:
+            return Results.merge(pool.map(trims, output_directories))
+
+    def shards(self, shards):
+        """Split calculation into ``shards`` calculations with distinct random seeds
+
+        See :meth:`run_sharded`.
+
+        Returns
+        -------
+        :obj:`list` of :class:`srim.srim.TRIM`
+        """
+        shards = check_input(int, is_positive, shards)
+        if not 0 < shards <= self.number_ions:
+            raise ValueError('shards must be between 1 and number_ions')
+
+        seeds = random.Random(self.settings.random_seed).sample(range(100001), shards)
+        ions_per_shard, remainder = divmod(self.number_ions, shards)
+
+        trims = []
+        for i, seed in enumerate(seeds):
+            trims.append(self._replace(
+                number_ions=ions_per_shard + (1 if i < remainder else 0),
+                random_seed=seed))
+        return trims
+
+    def _replace(self, number_ions=None, **kwargs):
+        """Copy of calculation with different number of ions and settings"""
+        trim = copy.copy(self)
+        if number_ions is not None:
+            trim.number_ions = check_input(int, is_positive, number_ions)
+        trim.settings = TRIMSettings(**dict(self.settings._settings, **kwargs))
+        return trim
+
+    def run_resumable(self, job_directory, srim_directory=DEFAULT_SRIM_DIRECTORY,
+                      autosave=None, max_restarts=3, poll_interval=10.0):
+        """Run calculation that resumes from its last autosave after a crash
+
+        This method:
+         - enables TRIM autosave every ``autosave`` ions
+         - while TRIM runs copies ``<srim_directory>/SRIM Restore``
+           to ``<job_directory>/checkpoint`` whenever TRIM saves
+         - if TRIM crashes resumes the calculation from the last
+           checkpoint (``TRIMAUTO`` mode 2) up to ``max_restarts``
+           times
+         - copies output files to ``job_directory`` and removes the
+           checkpoint when the calculation finishes
+
+        If the python process itself is interrupted (e.g. node
+        preemption) calling this method again with the same
+        ``job_directory`` resumes from the checkpoint. The
+        ``srim_directory`` does not need to be the same.
+
+        Parameters
+        ----------
+        job_directory : :obj:`str`
+            directory to store checkpoints and output files in
+        srim_directory : :obj:`str`, optional
+            path to srim directory. Default ``/tmp/srim``.
+        autosave : :obj:`int`, optional
+            number of ions between saves. Default ``autosave``
+            setting if non zero otherwise a tenth of ``number_ions``.
+        max_restarts : :obj:`int`, optional
+            number of times to resume after TRIM exits with an
+            error. Default 3.
+        poll_interval : :obj:`float`, optional
+            seconds between checks for new autosave files. Default 10.
+
+        Returns
+        -------
+        :class:`srim.output.Results`
+        """
+        if autosave is None:
+            autosave = self.settings.autosave or max(1, self.number_ions // 10)
+        trim = self._replace(autosave=autosave)
+
+        job_directory = os.path.abspath(job_directory)
+        if not os.path.isdir(job_directory):
+            os.makedirs(job_directory)
+        checkpoint = Checkpoint(os.path.join(job_directory, 'checkpoint'))
+
+        restarts = 0
+        while True:
+            if checkpoint.exists:
+                checkpoint.restore(srim_directory)
+                auto_trim = AutoTRIM(mode=2)
             else:
-                subprocess.check_call([str(os.path.join('.', 'TRIM.exe'))])
-            os.chdir(current_directory)
-            return Results(srim_directory)
-        finally:
-            os.chdir(current_directory)
+                checkpoint.clear_restore_directory(srim_directory)
+                auto_trim = AutoTRIM(mode=1)
+            auto_trim.write(srim_directory)
+            TRIMInput(trim).write(srim_directory)
+
+            args = _srim_command(srim_directory, 'TRIM.exe')
+            process = subprocess.Popen(args, cwd=srim_directory)
+            try:
+                while True:
+                    try:
+                        returncode = process.wait(timeout=poll_interval)
+                        break
+                    except subprocess.TimeoutExpired:
+                        checkpoint.update(srim_directory)
+            except BaseException:
+                process.kill()
+                process.wait()
+                raise
+
+            if returncode == 0:
+                break
+
+            checkpoint.save(srim_directory)
+            restarts += 1
+            if restarts > max_restarts:
+                raise subprocess.CalledProcessError(returncode, args)
+
+        self.copy_output_files(srim_directory, job_directory)
+        checkpoint.clear()
+        return Results(job_directory)
+
+    def _execute(self, srim_directory, watchdog=None):
+        """Write input files to ``srim_directory`` and launch TRIM within it"""
+        self._write_input_files(srim_directory)
+        args = _srim_command(srim_directory, 'TRIM.exe')
+        if watchdog is None:
+            subprocess.check_call(args, cwd=srim_directory)
+        else:
+            watchdog.run(args, cwd=srim_directory)
 
 
 class SRSettings(object):
@@ -242,6 +582,8 @@ class SRSettings(object):
        (6) keV / (mg/cm2)
        (7) eV / (1E15 atoms/cm2)
        (8) L.S.S reduced units
+       Stopping in every other unit is available from the same
+       calculation with :meth:`srim.output.SRResults.stopping`.
     output_filename : :obj:`str`, optional
        filename to give for SR output from calcualtion
     correction : :obj:`float`, optional
@@ -263,7 +605,12 @@ class SRSettings(object):
         }
 
     def __getattr__(self, attr):
-        return self._settings[attr]
+        # Look in __dict__ so that copy and pickle (which probe for
+        # methods before _settings exists) do not recurse
+        try:
+            return self.__dict__['_settings'][attr]
+        except KeyError:
+            raise AttributeError(attr)
 
 
 class SR(object):
@@ -285,11 +632,11 @@ class SR(object):
         self.layer = layer
         self.ion = ion
 
-    def _write_input_file(self):
+    def _write_input_file(self, directory='.'):
         """ Write necissary SR input file for calculation """
-        SRInput(self).write()
+        SRInput(self).write(directory)
 
-    def run(self, srim_directory=DEFAULT_SRIM_DIRECTORY):
+    def run(self, srim_directory=DEFAULT_SRIM_DIRECTORY, cache=None):
         """Run configured srim calculation
 
         This method:
@@ -302,18 +649,62 @@ class SR(object):
             path to srim directory. ``SRIM.exe`` should be located in
             this directory. Default ``/tmp/srim`` will absolutely need
             to be changed for windows.
+        cache : :class:`srim.cache.SRCache`, optional
+            when given and a table for the same ion, layer and
+            settings covering the ion energy is in the cache it is
+            returned without running SRModule. Otherwise the parsed
+            table is stored in the cache. Default no caching.
         """
-        current_directory = os.getcwd()
-        try:
-            os.chdir(os.path.join(srim_directory, 'SR Module'))
-            self._write_input_file()
-            # Make sure compatible with Windows, OSX, and Linux
-            # If 'wine' command exists use it to launch TRIM
-            if distutils.spawn.find_executable("wine"):
-                subprocess.check_call(['wine', str(os.path.join('.', 'SRModule.exe'))])
-            else:
-                subprocess.check_call([str(os.path.join('.', 'SRModule.exe'))])
+        if cache is not None:
+            key = cache.key(self, srim_directory)
+            results = cache.lookup(key, self)
+            if results is not None:
+                return results
+
+        sr_directory = os.path.join(srim_directory, 'SR Module')
+        self._write_input_file(sr_directory)
+        subprocess.check_call(
+            _srim_command(sr_directory, 'SRModule.exe'), cwd=sr_directory)
+        results = SRResults(sr_directory, self.settings.output_filename)
+
+        if cache is not None:
+            cache.put(key, self, results)
+        return results
+
+    async def run_async(self, srim_directory=DEFAULT_SRIM_DIRECTORY, semaphore=None, sandboxes=None):
+        """Run configured srim calculation without blocking the event loop
+
+        ``<srim_directory>/SR Module`` is copied to a temporary
+        working directory (or a sandbox is taken from ``sandboxes``)
+        so that any number of calculations can run at the same
+        time. See :meth:`srim.srim.TRIM.run_async`.
 
-            return SRResults(os.path.join(srim_directory, 'SR Module'))
-        finally:
-            os.chdir(current_directory)
+        Parameters
+        ----------
+        srim_directory : :obj:`str`, optional
+            path to srim directory. Default ``/tmp/srim``. Only read
+            from.
+        semaphore : :class:`asyncio.Semaphore`, optional
+            held while the calculation runs to limit the number of
+            concurrent calculations
+        sandboxes : :class:`srim.sandbox.SandboxPool`, optional
+            prepared sandboxes to run in instead of copying
+            ``SR Module``. Waits for a free sandbox.
+
+        Returns
+        -------
+        :class:`srim.output.SRResults`
+        """
+        return await _with_semaphore(semaphore, self._run_async, srim_directory, sandboxes)
+
+    async def _run_async(self, srim_directory, sandboxes):
+        loop = asyncio.get_event_loop()
+        async with _async_sandbox(srim_directory, sandboxes, 'SR Module') as sandbox:
+            sr_directory = os.path.join(sandbox, 'SR Module')
+            output_filename = os.path.join(sr_directory, self.settings.output_filename)
+            if os.path.isfile(output_filename):
+                os.remove(output_filename)
+            await loop.run_in_executor(None, self._write_input_file, sr_directory)
+            await _check_call_async(_srim_command(sr_directory, 'SRModule.exe'), cwd=sr_directory)
+            return await loop.run_in_executor(
+                None, SRResults, sr_directory, self.settings.output_filename)
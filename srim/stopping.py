@@ -0,0 +1,228 @@
+""" Interpolation of SR stopping and range tables
+
+A :class:`StoppingTable` is built once from
+:class:`srim.output.SRResults` and evaluates stopping powers, range
+and straggling at any number of energies in a few vectorized numpy
+operations. Quantities are interpolated with monotone piecewise cubic
+Hermite polynomials (PCHIP) in log-log space which follow the power
+law behaviour of stopping and range between tabulated energies
+without overshooting.
+"""
+import numpy as np
+
+
+QUANTITIES = ('Se', 'Sn', 'total', 'range', 'long_straggle', 'lat_straggle')
+
+
+def _pchip_slopes(x, y):
+    """Derivatives at knots of monotone cubic interpolant (Fritsch-Carlson)"""
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    if len(x) == 2:
+        return np.array([delta[0], delta[0]])
+
+    slopes = np.zeros_like(y)
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same_sign = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        harmonic_mean = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+    slopes[1:-1] = np.where(same_sign, harmonic_mean, 0.0)
+
+    def edge(h0, h1, delta0, delta1):
+        slope = ((2 * h0 + h1) * delta0 - h0 * delta1) / (h0 + h1)
+        if np.sign(slope) != np.sign(delta0):
+            return 0.0
+        if np.sign(delta0) != np.sign(delta1) and abs(slope) > 3 * abs(delta0):
+            return 3 * delta0
+        return slope
+
+    slopes[0] = edge(h[0], h[1], delta[0], delta[1])
+    slopes[-1] = edge(h[-1], h[-2], delta[-1], delta[-2])
+    return slopes
+
+
+class StoppingTable(object):
+    """ Vectorized interpolation of stopping, range and straggling
+
+    Parameters
+    ----------
+    energy : :class:`numpy.ndarray`
+        increasing ion energies [keV]
+    Se : :class:`numpy.ndarray`
+        electronic stopping at each energy
+    Sn : :class:`numpy.ndarray`
+        nuclear stopping at each energy
+    range : :class:`numpy.ndarray`
+        projected range [um] at each energy
+    long_straggle : :class:`numpy.ndarray`
+        longitudinal straggling [um] at each energy
+    lat_straggle : :class:`numpy.ndarray`
+        lateral straggling [um] at each energy
+    units : :obj:`str`, optional
+        units of stopping
+    bounds : :obj:`str`, optional
+        handling of energies outside of the table. ``'raise'``
+        (default) raises :class:`ValueError`, ``'clip'`` uses the
+        value at the nearest tabulated energy, ``'nan'`` returns nan
+        and ``'extrapolate'`` continues the power law of the end
+        points (nan at non-positive energies).
+
+    Notes
+    -----
+        The table only holds numpy arrays so it pickles cheaply to
+        worker processes. :meth:`save` and :meth:`load` store it as
+        ``.npz``.
+
+    Examples
+    --------
+    >>> table = StoppingTable.from_results(SR(layer, ion).run(), units='eV/Angstrom')
+    >>> energies = np.logspace(1, 4, 1000000)  # keV
+    >>> stopping = table(energies, 'total')
+    >>> values = table(energies)  # every quantity
+    >>> values['range']
+    """
+    def __init__(self, energy, Se, Sn, range, long_straggle, lat_straggle, units=None, bounds='raise'):
+        if bounds not in {'raise', 'clip', 'nan', 'extrapolate'}:
+            raise ValueError('bounds must be raise, clip, nan or extrapolate')
+        energy = np.asarray(energy, dtype=np.float64)
+        if energy.ndim != 1 or len(energy) < 2:
+            raise ValueError('table must have at least two energies')
+        if np.any(energy <= 0) or np.any(np.diff(energy) <= 0):
+            raise ValueError('energies must be positive and increasing')
+
+        Se, Sn = np.asarray(Se, dtype=np.float64), np.asarray(Sn, dtype=np.float64)
+        values = [Se, Sn, Se + Sn, range, long_straggle, lat_straggle]
+        self.energy = energy
+        self.values = np.array([np.asarray(value, dtype=np.float64) for value in values])
+        if self.values.shape[1] != len(energy):
+            raise ValueError('every quantity must have a value at each energy')
+        self.units = units
+        self.bounds = bounds
+        self._build()
+
+    def _build(self):
+        """Precompute cubic coefficients of every interval in log-log space"""
+        x = np.log(self.energy)
+        h = np.diff(x)
+        # quantities with zeros (e.g. straggling at low energy) are
+        # interpolated linearly in value instead of log value
+        self._logarithmic = np.all(self.values > 0, axis=1)
+        self._coefficients = np.empty((len(QUANTITIES), 4, len(h)))
+        self._end_slopes = np.empty((len(QUANTITIES), 2))
+        for i, (values, logarithmic) in enumerate(zip(self.values, self._logarithmic)):
+            y = np.log(values) if logarithmic else values
+            slopes = _pchip_slopes(x, y)
+            delta = np.diff(y) / h
+            self._coefficients[i] = [
+                y[:-1],
+                h * slopes[:-1],
+                h * (3 * delta - 2 * slopes[:-1] - slopes[1:]),
+                h * (slopes[:-1] + slopes[1:] - 2 * delta),
+            ]
+            self._end_slopes[i] = slopes[0], slopes[-1]
+        self._x = x
+
+    @classmethod
+    def from_results(cls, results, units=None, bounds='raise'):
+        """Build table from SR calculation
+
+        Parameters
+        ----------
+        results : :class:`srim.output.SRResults`
+            results of SR calculation
+        units : :obj:`str` or :obj:`int`, optional
+            stopping units. See :meth:`srim.output.SRResults.stopping`.
+            Default units of calculation.
+        bounds : :obj:`str`, optional
+            see :class:`StoppingTable`
+        """
+        Se, Sn = results.stopping(units)
+        data = results.data
+        return cls(data[0], Se, Sn, data[3], data[4], data[5],
+                   units=results.units if units is None else units, bounds=bounds)
+
+    def _locate(self, energies):
+        """Interval index and position within interval of each energy"""
+        outside = (energies < self.energy[0]) | (energies > self.energy[-1])
+        if self.bounds == 'raise' and np.any(outside):
+            raise ValueError('energies outside of table {} - {} keV'.format(self.energy[0], self.energy[-1]))
+        if self.bounds == 'extrapolate':
+            # power laws have no value at non-positive energies
+            x = np.log(np.where(energies > 0, energies, np.nan))
+        else:
+            # energies outside are evaluated at the nearest end and
+            # replaced with nan afterwards for 'nan'
+            x = np.log(np.clip(energies, self.energy[0], self.energy[-1]))
+        index = np.clip(np.searchsorted(self._x, x, side='right') - 1, 0, len(self._x) - 2)
+        t = (x - self._x[index]) / (self._x[index + 1] - self._x[index])
+        return x, index, t, outside
+
+    def _evaluate(self, i, x, index, t, outside):
+        c0, c1, c2, c3 = (coefficient[index] for coefficient in self._coefficients[i])
+        y = c0 + t * (c1 + t * (c2 + t * c3))
+        if self.bounds == 'extrapolate' and np.any(outside):
+            below = x < self._x[0]
+            above = x > self._x[-1]
+            y_ends = self._coefficients[i, 0, 0], self._coefficients[i].sum(axis=0)[-1]
+            y = np.where(below, y_ends[0] + self._end_slopes[i, 0] * (x - self._x[0]), y)
+            y = np.where(above, y_ends[1] + self._end_slopes[i, 1] * (x - self._x[-1]), y)
+        if self._logarithmic[i]:
+            y = np.exp(y)
+        if self.bounds == 'nan':
+            y = np.where(outside, np.nan, y)
+        return y
+
+    def __call__(self, energies, quantity=None):
+        """Evaluate table at energies
+
+        Parameters
+        ----------
+        energies : :class:`numpy.ndarray`
+            ion energies [keV] of any shape
+        quantity : :obj:`str`, optional
+            one of ``'Se'``, ``'Sn'``, ``'total'``, ``'range'``,
+            ``'long_straggle'`` or ``'lat_straggle'``. Default all.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            values of ``quantity`` with the shape of ``energies`` or
+            structured array with a field for every quantity
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        if quantity is not None and quantity not in QUANTITIES:
+            raise ValueError('quantity must be one of {}'.format(', '.join(QUANTITIES)))
+        location = self._locate(energies.ravel())
+
+        if quantity is not None:
+            return self._evaluate(QUANTITIES.index(quantity), *location).reshape(energies.shape)
+        values = np.empty(energies.size, dtype=[(name, np.float64) for name in QUANTITIES])
+        for i, name in enumerate(QUANTITIES):
+            values[name] = self._evaluate(i, *location)
+        return values.reshape(energies.shape)
+
+    def __getstate__(self):
+        return {'energy': self.energy, 'values': self.values, 'units': self.units, 'bounds': self.bounds}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build()
+
+    def save(self, filename):
+        """Save table to ``.npz`` file"""
+        np.savez(filename, energy=self.energy, values=self.values,
+                 units=np.array(self.units or ''), bounds=np.array(self.bounds))
+
+    @classmethod
+    def load(cls, filename):
+        """Load table saved with :meth:`save`"""
+        with np.load(filename) as npz:
+            table = cls.__new__(cls)
+            table.__setstate__({
+                'energy': npz['energy'],
+                'values': npz['values'],
+                'units': str(npz['units']) or None,
+                'bounds': str(npz['bounds']),
+            })
+        return table
@@ -0,0 +1,255 @@
+""" Grids of TRIM calculations
+
+A :class:`Sweep` is the cartesian product of named axes (ions,
+targets, energies, settings, ...). Calculations are constructed
+lazily, calculations with identical input files are only run once and
+results are returned as they finish indexed by their coordinates in
+the grid.
+"""
+import os
+import random
+import itertools
+from collections import OrderedDict
+from concurrent.futures import wait, FIRST_COMPLETED
+
+import numpy as np
+
+from .srim import TRIM
+from .pool import TRIMPool
+from .config import DEFAULT_SRIM_DIRECTORY
+
+
+class Sweep(object):
+    """ Cartesian product of TRIM calculation parameters
+
+    Parameters
+    ----------
+    axes : :obj:`list` of (:obj:`str`, :obj:`list`) or :class:`collections.OrderedDict`
+        name and values of each axis in order. Names are keyword
+        arguments of ``factory``.
+    factory : callable, optional
+        called with the fixed keyword arguments and the value of
+        every axis at a point to create a :class:`srim.srim.TRIM`
+        calculation. Default :class:`srim.srim.TRIM` so axis names can
+        be ``ion``, ``target``, ``calculation``, ``number_ions`` or
+        any of :class:`srim.srim.TRIMSettings`.
+    kwargs :
+        keyword arguments passed to ``factory`` at every point
+
+    Notes
+    -----
+        Calculations are only run once when their input files,
+        including the random seed, are identical. With the default
+        factory and no ``random_seed`` axis or keyword argument one
+        random seed is drawn for the whole sweep. A ``factory`` must
+        set ``random_seed`` itself for duplicate points to be found.
+
+    Examples
+    --------
+    Ion energy and random seed directly as :class:`srim.srim.TRIM`
+    arguments.
+
+    >>> sweep = Sweep([
+    ...     ('ion', [Ion('Ni', energy) for energy in [1e6, 2e6, 3e6]]),
+    ...     ('random_seed', [1, 2]),
+    ... ], target=target, number_ions=100)
+    >>> sweep.shape
+    (3, 2)
+
+    Layer thickness and displacement energy through a factory.
+
+    >>> def make_trim(width, E_d):
+    ...     layer = Layer({'Ni': {'stoich': 1.0, 'E_d': E_d}}, 8.9, width)
+    ...     return TRIM(Target([layer]), Ion('Ni', 1e6), number_ions=100)
+    >>> sweep = Sweep([('width', [1e3, 1e4]), ('E_d', [25.0, 40.0])], make_trim)
+    >>> results = sweep.run(jobs=4)
+    >>> vacancies = Sweep.stack(results, lambda result: result.vacancy.knock_ons)
+    >>> vacancies.shape
+    (2, 2, 100)
+    """
+    def __init__(self, axes, factory=TRIM, **kwargs):
+        self.axes = OrderedDict(axes)
+        for name, values in self.axes.items():
+            self.axes[name] = list(values)
+            if not self.axes[name]:
+                raise ValueError('axis {} has no values'.format(name))
+        self.factory = factory
+        self.kwargs = kwargs
+        if factory is TRIM and 'random_seed' not in self.axes and 'random_seed' not in kwargs:
+            # otherwise every point draws its own seed and none are identical
+            self.kwargs['random_seed'] = random.randint(0, 100000)
+
+    @property
+    def names(self):
+        """Names of axes in order"""
+        return list(self.axes)
+
+    @property
+    def shape(self):
+        """Number of values along each axis"""
+        return tuple(len(values) for values in self.axes.values())
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    def coordinates(self, index):
+        """Value of every axis at ``index``
+
+        Returns
+        -------
+        :class:`collections.OrderedDict`
+            axis name to value
+        """
+        return OrderedDict(
+            (name, values[i]) for (name, values), i in zip(self.axes.items(), index))
+
+    def __getitem__(self, index):
+        """Calculation at ``index`` (a tuple with one integer per axis)"""
+        return self.factory(**dict(self.kwargs, **self.coordinates(index)))
+
+    def __iter__(self):
+        """Lazily create calculations in C order
+
+        Yields
+        ------
+        index : :obj:`tuple`
+            position in grid
+        trim : :class:`srim.srim.TRIM`
+            calculation at position
+        """
+        for index in itertools.product(*[range(n) for n in self.shape]):
+            yield index, self[index]
+
+    @staticmethod
+    def _key(trim):
+        """Bytes of generated input files identifying a calculation"""
+        return b'\0'.join(input_file.to_bytes() for input_file in trim._input_files())
+
+    def unique(self):
+        """Group grid positions by identical calculation
+
+        Returns
+        -------
+        :obj:`list` of (:class:`srim.srim.TRIM`, :obj:`list` of :obj:`tuple`)
+            each distinct calculation with all the indicies it is at
+        """
+        groups = OrderedDict()
+        for index, trim in self:
+            key = self._key(trim)
+            if key not in groups:
+                groups[key] = (trim, [])
+            groups[key][1].append(index)
+        return list(groups.values())
+
+    def as_completed(self, jobs=None, srim_directory=DEFAULT_SRIM_DIRECTORY,
+                     output_directory=None, pool=None, **kwargs):
+        """Run calculations yielding results as they finish
+
+        Calculations are submitted lazily keeping at most twice the
+        number of workers queued. A calculation whose input files are
+        identical to one already submitted is not run again. Its
+        results are yielded for each of its indicies.
+
+        Parameters
+        ----------
+        jobs : :obj:`int`, optional
+            number of TRIM calculations to run at the same time. Default
+            number of cpus.
+        srim_directory : :obj:`str`, optional
+            path to srim directory. Default ``/tmp/srim``.
+        output_directory : :obj:`str`, optional
+            directory to copy output files of each calculation to
+            ``<output_directory>/<i>_<j>_...`` named after the index of
+            its first occurrence. Default output files are removed.
+        pool : :class:`srim.pool.TRIMPool`, optional
+            pool to run calculations in. Default a new pool created
+            with ``jobs``, ``srim_directory`` and ``kwargs``.
+        kwargs :
+            see :class:`srim.pool.TRIMPool`
+
+        Yields
+        ------
+        index : :obj:`tuple`
+            position in grid
+        results : :class:`srim.output.Results`
+            results of calculation at position
+        """
+        if pool is None:
+            with TRIMPool(jobs, srim_directory, **kwargs) as pool:
+                for item in self.as_completed(pool=pool, output_directory=output_directory):
+                    yield item
+            return
+
+        pending = {}     # key -> indicies waiting for calculation
+        finished = {}    # key -> results of finished calculation
+        futures = {}     # future -> key
+        max_pending = 2 * pool.jobs
+        points = iter(self)
+        exhausted = False
+        while not exhausted or futures:
+            while not exhausted and len(futures) < max_pending:
+                try:
+                    index, trim = next(points)
+                except StopIteration:
+                    exhausted = True
+                    break
+                key = self._key(trim)
+                if key in finished:
+                    yield index, finished[key]
+                    continue
+                if key in pending:
+                    pending[key].append(index)
+                    continue
+                pending[key] = [index]
+                directory = None
+                if output_directory is not None:
+                    directory = os.path.join(output_directory, '_'.join(str(i) for i in index))
+                futures[pool.submit(trim, directory)] = key
+
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = futures.pop(future)
+                finished[key] = future.result()
+                for index in pending.pop(key):
+                    yield index, finished[key]
+
+    def run(self, jobs=None, srim_directory=DEFAULT_SRIM_DIRECTORY,
+            output_directory=None, pool=None, **kwargs):
+        """Run all calculations
+
+        See :meth:`as_completed` for parameters.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            object array of :class:`srim.output.Results` with
+            :attr:`shape`
+        """
+        results = np.empty(self.shape, dtype=object)
+        for index, result in self.as_completed(jobs, srim_directory, output_directory, pool, **kwargs):
+            results[index] = result
+        return results
+
+    @staticmethod
+    def stack(results, key):
+        """Combine a quantity of every result into one array
+
+        Parameters
+        ----------
+        results : :class:`numpy.ndarray`
+            object array returned by :meth:`run`
+        key : callable
+            applied to every :class:`srim.output.Results` returning an
+            array of the same shape for all of them e.g. ``lambda
+            result: result.ioniz.ions``
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            array of shape ``results.shape + key(result).shape``
+        """
+        values = [np.asarray(key(result)) for result in results.flat]
+        return np.stack(values).reshape(results.shape + values[0].shape)
+
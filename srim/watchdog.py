@@ -0,0 +1,275 @@
+""" Supervise TRIM processes that hang, run away or crash
+
+TRIM under ``wine`` may hang or die without an error. A
+:class:`Watchdog` launches the process in its own process group and
+terminates the whole group (``wine`` and ``TRIM.exe``) when it exceeds
+a wall clock limit, stops writing output, or uses too much memory. A
+:class:`RetryPolicy` reruns failed calculations optionally with a new
+random seed or split into smaller calculations.
+
+Every failure is recorded as a :class:`Failure`.
+"""
+import os
+import time
+import random
+import signal
+import subprocess
+from collections import namedtuple
+
+from .output import Results
+from .sandbox import reset_sandbox
+
+
+Failure = namedtuple('Failure', [
+    'reason',       # 'exit', 'timeout', 'idle', or 'memory'
+    'returncode',   # exit code of process (negative for signal)
+    'elapsed',      # seconds process ran for
+    'message',      # human readable description
+    'attempt',      # attempt number starting at 1 (set by RetryPolicy)
+    'number_ions',  # number of ions of attempted calculation
+    'random_seed',  # random seed of attempted calculation
+])
+Failure.__new__.__defaults__ = (None, None, None)
+
+
+class WatchdogError(Exception):
+    """TRIM process failed or was terminated by the watchdog"""
+    def __init__(self, failure):
+        super(WatchdogError, self).__init__(failure.message)
+        self.failure = failure
+
+
+class TRIMRunError(Exception):
+    """TRIM calculation failed after all retries"""
+    def __init__(self, failures):
+        super(TRIMRunError, self).__init__(
+            'TRIM failed {} times: {}'.format(
+                len(failures), ', '.join(failure.reason for failure in failures)))
+        self.failures = failures
+
+
+def _output_signature(directory):
+    """(name, size, mtime) of files written by TRIM"""
+    signature = []
+    for subdirectory in ['', 'SRIM Outputs', 'SRIM Restore']:
+        path = os.path.join(directory, subdirectory)
+        if not os.path.isdir(path):
+            continue
+        for filename in os.listdir(path):
+            filename = os.path.join(path, filename)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            signature.append((filename, stat.st_size, stat.st_mtime))
+    return sorted(signature)
+
+
+def _process_group_rss(pgid):
+    """Resident memory [bytes] of all processes in process group (linux only)"""
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    rss = 0
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(os.path.join('/proc', pid, 'stat')) as f:
+                # fields after the executable name which may contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (IOError, OSError):
+            continue
+        if int(fields[2]) == pgid:
+            rss += int(fields[21]) * page_size
+    return rss
+
+
+class Watchdog(object):
+    """ Launch and supervise a TRIM process
+
+    Parameters
+    ----------
+    timeout : :obj:`float`, optional
+        maximum wall clock seconds. Default no limit.
+    idle_timeout : :obj:`float`, optional
+        maximum seconds without any file in the working directory,
+        ``SRIM Outputs`` or ``SRIM Restore`` changing. TRIM writes
+        most output files at the end of a calculation so this is
+        useful together with ``collisions`` or ``autosave``. Default
+        no limit.
+    memory_limit : :obj:`int`, optional
+        maximum resident memory in bytes of the process group. Only
+        available on linux. Default no limit.
+    poll_interval : :obj:`float`, optional
+        seconds between checks. Default 1.
+    terminate_timeout : :obj:`float`, optional
+        seconds to wait after ``SIGTERM`` before ``SIGKILL``. Default 5.
+    """
+    def __init__(self, timeout=None, idle_timeout=None, memory_limit=None,
+                 poll_interval=1.0, terminate_timeout=5.0):
+        if memory_limit is not None and not os.path.isdir('/proc'):
+            raise ValueError('memory_limit requires /proc (linux)')
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.memory_limit = memory_limit
+        self.poll_interval = poll_interval
+        self.terminate_timeout = terminate_timeout
+
+    def _terminate(self, process):
+        """Terminate process and all of its children"""
+        if hasattr(os, 'killpg'):
+            kill = lambda sig: os.killpg(process.pid, sig)
+            kill_signals = [signal.SIGTERM, signal.SIGKILL]
+        else:
+            kill = lambda sig: process.kill()
+            kill_signals = [None, None]
+
+        for kill_signal in kill_signals:
+            try:
+                kill(kill_signal)
+            except OSError:  # process group already gone
+                pass
+            try:
+                process.wait(timeout=self.terminate_timeout)
+                return
+            except subprocess.TimeoutExpired:
+                continue
+
+    def _check(self, process, directory, start, last_change):
+        """Reason and message to terminate process or ``None``"""
+        now = time.time()
+        if self.timeout is not None and now - start > self.timeout:
+            return 'timeout', 'exceeded wall clock limit of {} s'.format(self.timeout)
+        if self.idle_timeout is not None and now - last_change > self.idle_timeout:
+            return 'idle', 'no output for {} s'.format(self.idle_timeout)
+        if self.memory_limit is not None:
+            rss = _process_group_rss(process.pid)
+            if rss > self.memory_limit:
+                return 'memory', 'resident memory {} exceeded limit {} bytes'.format(rss, self.memory_limit)
+        return None
+
+    def run(self, args, cwd):
+        """Run command until it exits or is terminated
+
+        Parameters
+        ----------
+        args : :obj:`list`
+            command to run
+        cwd : :obj:`str`
+            working directory of command, watched for output
+
+        Raises
+        ------
+        :class:`srim.watchdog.WatchdogError`
+            when the process exits with an error or is terminated
+        """
+        kwargs = {'start_new_session': True} if hasattr(os, 'killpg') else {}
+        start = last_change = time.time()
+        signature = _output_signature(cwd)
+        process = subprocess.Popen(args, cwd=cwd, **kwargs)
+        try:
+            while True:
+                try:
+                    returncode = process.wait(timeout=self.poll_interval)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+
+                new_signature = _output_signature(cwd)
+                if new_signature != signature:
+                    signature, last_change = new_signature, time.time()
+
+                stop = self._check(process, cwd, start, last_change)
+                if stop is not None:
+                    self._terminate(process)
+                    reason, message = stop
+                    raise WatchdogError(Failure(reason, process.returncode, time.time() - start, message))
+        except BaseException:
+            if process.poll() is None:
+                self._terminate(process)
+            raise
+
+        if returncode != 0:
+            raise WatchdogError(Failure(
+                'exit', returncode, time.time() - start,
+                '{} exited with status {}'.format(args[-1], returncode)))
+
+
+class RetryPolicy(object):
+    """ Rerun failed TRIM calculations
+
+    Parameters
+    ----------
+    max_attempts : :obj:`int`, optional
+        number of times to run calculation before giving up (or
+        splitting). Default 3.
+    reseed : :obj:`bool`, optional
+        use a new random seed for every retry. Default True. Seeds are
+        drawn from a generator seeded with the original seed so
+        retries are reproducible.
+    split : :obj:`bool`, optional
+        after ``max_attempts`` failures split the calculation in two
+        halves (each retried in the same way) and merge the
+        results. Default False.
+    max_splits : :obj:`int`, optional
+        maximum times a calculation is split. Default 3.
+
+    Notes
+    -----
+        Failures are recorded on the returned results as
+        ``results.failures`` or on the raised
+        :class:`srim.watchdog.TRIMRunError` as ``failures``.
+    """
+    def __init__(self, max_attempts=3, reseed=True, split=False, max_splits=3):
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be at least 1')
+        self.max_attempts = max_attempts
+        self.reseed = reseed
+        self.split = split
+        self.max_splits = max_splits
+
+    def run(self, trim, srim_directory, watchdog=None):
+        """Run ``trim`` in ``srim_directory`` retrying on failure
+
+        Returns
+        -------
+        results : :class:`srim.output.Results`
+            results with attribute ``failures`` (:obj:`list` of
+            :class:`srim.watchdog.Failure`)
+        exact : :obj:`bool`
+            whether results are those of ``trim`` unchanged (not
+            reseeded or split). Output files in ``srim_directory`` are
+            only complete when True.
+        """
+        failures = []
+        results, used_trim = self._run(trim, srim_directory, watchdog, failures, 0)
+        results.failures = failures
+        return results, used_trim is trim
+
+    def _run(self, trim, srim_directory, watchdog, failures, splits):
+        seeds = random.Random(trim.settings.random_seed)
+        attempt_trim = trim
+        for attempt in range(1, self.max_attempts + 1):
+            # srim_directory may be the user's installation
+            reset_sandbox(srim_directory, owned=False)
+            try:
+                attempt_trim._execute(srim_directory, watchdog)
+                return Results(srim_directory), attempt_trim
+            except WatchdogError as error:
+                failure = error.failure
+            except subprocess.CalledProcessError as error:
+                failure = Failure('exit', error.returncode, None, str(error))
+            failures.append(failure._replace(
+                attempt=attempt,
+                number_ions=attempt_trim.number_ions,
+                random_seed=attempt_trim.settings.random_seed))
+
+            if self.reseed:
+                attempt_trim = trim._replace(random_seed=seeds.randint(0, 100000))
+
+        if self.split and splits < self.max_splits and trim.number_ions > 1:
+            # read every shard before the sandbox is reset for the next
+            shard_results = [self._run(shard, srim_directory, watchdog, failures, splits + 1)[0].load()
+                             for shard in trim.shards(2)]
+            return Results.merge(shard_results), None
+
+        raise TRIMRunError(failures)
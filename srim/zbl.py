@@ -0,0 +1,361 @@
+""" Stopping and range tables calculated with numpy
+
+:class:`ZBL` calculates approximate stopping and range tables offline,
+in the format of :class:`srim.srim.SR`, without ``wine`` or
+``SRModule.exe``. Stopping of compounds is the sum of the stopping of
+each element weighted by atom fraction (Bragg additivity) times the
+compound correction.
+
+ - nuclear stopping uses the ZBL universal potential and agrees with
+   SRModule to within a few percent
+ - electronic stopping is a smooth interpolation between Lindhard-Scharff
+   stopping at low velocity and Bethe stopping (with the effective
+   charge of partially stripped ions) at high velocity. It does not
+   include the fitted coefficients SRIM uses for each element and is
+   typically within 40% of SRModule.
+ - projected range, longitudinal and lateral straggling are first order
+   (small angle) moments of the ion path. Within a factor of two of
+   SRModule.
+
+The tables are good for quick estimates, energy grids of any size and
+environments without the SRIM executables. Use :class:`srim.srim.SR`
+when SRIM values are needed.
+"""
+import numpy as np
+
+from .output import SRResults, SR_STOPPING_UNITS
+from .srim import SRSettings
+from .stopping import StoppingTable
+
+
+AVOGADRO = 6.02214076e23         # atoms/mol
+AMU_KEV = 931494.10242           # keV/amu
+ELECTRON_MASS_EV = 510998.95     # eV
+FINE_STRUCTURE = 1 / 137.035999  # v0 / c
+
+# Stopping constants in eV/(1E15 atoms/cm2)
+LSS_CONSTANT = 19.1512           # 8 pi e^2 a0
+BETHE_CONSTANT = 5.09906e-4      # 4 pi r_e^2 m_e c^2
+BOHR_STRAGGLING = 260.57         # 4 pi e^4 [eV^2/(1E15 atoms/cm2)]
+
+# Energy grid of SRModule tables in every decade
+SR_GRID_MANTISSAS = np.array([
+    1.0, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7, 1.8, 2.0, 2.25, 2.5, 2.75,
+    3.0, 3.25, 3.5, 3.75, 4.0, 4.5, 5.0, 5.5, 6.0, 6.5, 7.0, 8.0, 9.0])
+
+
+def sr_energy_grid(energy_min, energy_max):
+    """Energies [keV] SRModule tabulates between ``energy_min`` and ``energy_max`` [keV]"""
+    decades = np.arange(np.floor(np.log10(energy_min)), np.ceil(np.log10(energy_max)) + 1)
+    grid = (SR_GRID_MANTISSAS[None, :] * 10**decades[:, None]).ravel()
+    grid = grid[(grid > energy_min * (1 + 1e-9)) & (grid < energy_max * (1 - 1e-9))]
+    return np.concatenate([[energy_min], grid, [energy_max]])
+
+
+def _beta_squared(energy, ion_mass):
+    """(v/c)^2 of ion with energy [keV]"""
+    gamma = 1 + energy / (ion_mass * AMU_KEV)
+    return 1 - 1 / gamma**2
+
+
+def effective_charge_fraction(energy, ion_z, ion_mass):
+    """Squared fraction of ion charge not screened by its electrons
+
+    Bohr stripping criterion ``1 - exp(-v / (v0 Z1^(2/3)))``.
+    """
+    velocity = np.sqrt(_beta_squared(energy, ion_mass)) / FINE_STRUCTURE
+    return (1 - np.exp(-velocity / ion_z**(2 / 3)))**2
+
+
+def mean_excitation_energy(target_z):
+    """Mean excitation energy [eV] of element (Segre approximation)"""
+    target_z = np.asarray(target_z, dtype=np.float64)
+    return np.where(target_z < 13,
+                    12 * target_z + 7,
+                    9.76 * target_z + 58.8 * target_z**-0.19)
+
+
+def nuclear_stopping(energy, ion_z, ion_mass, target_z, target_mass):
+    """ZBL universal nuclear stopping
+
+    Parameters
+    ----------
+    energy : :class:`numpy.ndarray`
+        ion energies [keV]
+    ion_z : :obj:`int`
+        atomic number of ion
+    ion_mass : :obj:`float`
+        mass [amu] of ion
+    target_z : :obj:`int`
+        atomic number of target element
+    target_mass : :obj:`float`
+        mass [amu] of target element
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        nuclear stopping [eV/(1E15 atoms/cm2)]
+    """
+    energy = np.asarray(energy, dtype=np.float64)
+    screening = ion_z**0.23 + target_z**0.23
+    epsilon = 32.53 * target_mass * energy / (ion_z * target_z * (ion_mass + target_mass) * screening)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reduced = np.where(
+            epsilon <= 30,
+            np.log1p(1.1383 * epsilon) / (2 * (epsilon + 0.01321 * epsilon**0.21226 + 0.19593 * np.sqrt(epsilon))),
+            np.log(epsilon) / (2 * epsilon))
+    return 8.462 * ion_z * target_z * ion_mass * reduced / ((ion_mass + target_mass) * screening)
+
+
+def electronic_stopping(energy, ion_z, ion_mass, target_z):
+    """Electronic stopping from Lindhard-Scharff and Bethe stopping
+
+    Stopping is the harmonic mean of Lindhard-Scharff stopping
+    (proportional to velocity) and Bethe stopping of the bare ion
+    which is then reduced by the effective charge of the ion as Bethe
+    stopping takes over.
+
+    Parameters
+    ----------
+    energy : :class:`numpy.ndarray`
+        ion energies [keV]
+    ion_z : :obj:`int`
+        atomic number of ion
+    ion_mass : :obj:`float`
+        mass [amu] of ion
+    target_z : :obj:`int`
+        atomic number of target element
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        electronic stopping [eV/(1E15 atoms/cm2)]
+    """
+    energy = np.asarray(energy, dtype=np.float64)
+    beta_squared = _beta_squared(energy, ion_mass)
+    velocity = np.sqrt(beta_squared) / FINE_STRUCTURE
+
+    low = LSS_CONSTANT * ion_z**(7 / 6) * target_z / (ion_z**(2 / 3) + target_z**(2 / 3))**1.5 * velocity
+    # log(1 + x) keeps Bethe stopping positive below its range of validity
+    bethe_log = np.log1p(2 * ELECTRON_MASS_EV * beta_squared / (1 - beta_squared) / mean_excitation_energy(target_z))
+    high = BETHE_CONSTANT * ion_z**2 * target_z / beta_squared * (bethe_log - beta_squared)
+
+    weight = high / (low + high)
+    charge = weight + (1 - weight) * effective_charge_fraction(energy, ion_z, ion_mass)
+    return low * high / (low + high) * charge
+
+
+def _cumulative_integral(values, energy):
+    """Trapezoid integral of ``values`` from first energy to each energy"""
+    return np.concatenate([[0.0], np.cumsum(0.5 * (values[1:] + values[:-1]) * np.diff(energy))])
+
+
+def _range_moments(energy, stopping, deflection, straggling):
+    """Projected range and variance of range along and across ion direction
+
+    Every energy on increasing grid ``energy`` [eV] is a starting
+    energy. Path lengths are in 1E15 atoms/cm2. Small angle transport:
+    the ion direction is a random walk whose variance grows by
+    ``deflection * dE / (E S)`` and energy loss fluctuates with
+    ``straggling`` [eV^2/(1E15 atoms/cm2)].
+
+    The mean square angle at a point of the path of an ion starting at
+    energy ``E0`` is ``angle(E0) - angle(E)``. Powers of it are
+    expanded so that every moment is a combination of cumulative
+    integrals and memory and time are linear in the grid size.
+
+    Returns
+    -------
+    path, projected range, longitudinal variance, lateral variance
+    """
+    weight = 1 / stopping
+    path = _cumulative_integral(weight, energy)
+    angle = _cumulative_integral(deflection / (energy * stopping), energy)
+    path_variance = _cumulative_integral(straggling / stopping**3, energy)
+
+    # integral of exp(-(angle(E0) - angle(E)) / 2) / S summed in log space
+    # as exp(angle / 2) alone overflows for heavy ions
+    with np.errstate(divide='ignore'):
+        log_values = angle / 2 + np.log(weight)
+    log_intervals = np.log(0.5 * np.diff(energy)) + np.logaddexp(log_values[1:], log_values[:-1])
+    projected = np.concatenate([[0.0], np.exp(np.logaddexp.accumulate(log_intervals) - angle[1:] / 2)])
+
+    moments = [_cumulative_integral(angle**k * path * weight, energy) for k in range(3)]
+    lateral = angle * moments[0] - moments[1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        projection = np.where(path > 0, projected / path, 1.0)
+    longitudinal = (angle**2 * moments[0] - 2 * angle * moments[1] + moments[2]) / 2 + path_variance * projection**2
+    return path, projected, np.maximum(longitudinal, 0), np.maximum(lateral, 0)
+
+
+def _layer_arrays(layer):
+    """Atomic number, mass and atom fraction of each element of layer"""
+    elements = list(layer.elements)
+    return (
+        np.array([element.atomic_number for element in elements], dtype=np.float64),
+        np.array([element.mass for element in elements]),
+        np.array([layer.elements[element]['stoich'] for element in elements]),
+    )
+
+
+def stopping_conversions(ion, layer):
+    """Factor to convert eV/(1E15 atoms/cm2) to each of :data:`srim.output.SR_STOPPING_UNITS`
+
+    Parameters
+    ----------
+    ion : :class:`srim.core.ion.Ion`
+        ion (only used for L.S.S. reduced units)
+    layer : :class:`srim.core.layer.Layer`
+        target layer
+
+    Returns
+    -------
+    :obj:`dict`
+        factor for each unit name
+    """
+    z2, m2, fraction = _layer_arrays(layer)
+    mean_z, mean_mass = np.dot(fraction, z2), np.dot(fraction, m2)
+    z1, m1 = ion.atomic_number, ion.mass
+    atom_density = layer.density * AVOGADRO / mean_mass
+    per_mass = AVOGADRO * 1e-24 / mean_mass  # keV/(ug/cm2)
+    factors = [
+        atom_density * 1e-23, atom_density * 1e-22, atom_density * 1e-22,
+        per_mass, per_mass, per_mass * 1e3,
+        1.0,
+        (m1 + mean_mass) * np.sqrt(z1**(2 / 3) + mean_z**(2 / 3)) / (8.462 * z1 * mean_z * m1),
+    ]
+    return dict(zip(SR_STOPPING_UNITS, [float(factor) for factor in factors]))
+
+
+class ZBL(object):
+    """ SR calculations without SRModule
+
+    Parameters
+    ----------
+    layer : :class:`srim.core.layer.Layer`
+        constructed layer for SR calculation
+    ion : :class:`srim.core.ion.Ion`
+        constructed ion for SR calculation. Its energy is the highest
+        energy of the table.
+    kwargs :
+        See :class:`srim.srim.SRSettings`. ``output_filename`` is not
+        used.
+
+    Examples
+    --------
+    >>> layer = Layer.from_formula('SiC', density=3.21, width=1e4)
+    >>> results = ZBL(layer, Ion('Xe', 1.2e9), output_type=5).run()
+    >>> results.stopping('eV/Angstrom')
+    """
+    def __init__(self, layer, ion, **kwargs):
+        self.settings = SRSettings(**kwargs)
+        self.layer = layer
+        self.ion = ion
+
+    @property
+    def _target_arrays(self):
+        return _layer_arrays(self.layer)
+
+    def stopping(self, energies):
+        """Electronic and nuclear stopping of layer at energies
+
+        Parameters
+        ----------
+        energies : :class:`numpy.ndarray`
+            ion energies [keV]
+
+        Returns
+        -------
+        electronic : :class:`numpy.ndarray`
+            electronic stopping [eV/(1E15 atoms/cm2)] including compound correction
+        nuclear : :class:`numpy.ndarray`
+            nuclear stopping [eV/(1E15 atoms/cm2)]
+        """
+        energies = np.asarray(energies, dtype=np.float64)
+        z1, m1 = self.ion.atomic_number, self.ion.mass
+        electronic = np.zeros_like(energies)
+        nuclear = np.zeros_like(energies)
+        for z2, m2, fraction in zip(*self._target_arrays):
+            electronic += fraction * electronic_stopping(energies, z1, m1, z2)
+            nuclear += fraction * nuclear_stopping(energies, z1, m1, z2, m2)
+        return electronic * self.settings.correction, nuclear
+
+    def conversions(self):
+        """Factor to convert eV/(1E15 atoms/cm2) to each of :data:`srim.output.SR_STOPPING_UNITS`"""
+        return stopping_conversions(self.ion, self.layer)
+
+    def _table(self, energies):
+        """Stopping table in eV/(1E15 atoms/cm2) and um at energies [keV]"""
+        z2, m2, fraction = self._target_arrays
+        z1, m1 = self.ion.atomic_number, self.ion.mass
+
+        # ions are followed down to 1 eV on the grid of SRModule and
+        # range moments interpolated to energies
+        low = min(1e-3, energies[0] / 10)
+        grid = sr_energy_grid(low, energies[-1])
+        electronic, nuclear = self.stopping(grid)
+
+        deflection = np.zeros_like(grid)
+        straggling = np.zeros_like(grid)
+        for z, m, f in zip(z2, m2, fraction):
+            element_nuclear = nuclear_stopping(grid, z1, m1, z, m)
+            deflection += f * (m / m1) * element_nuclear
+            transfer = 4 * m1 * m / (m1 + m)**2
+            straggling += f * (transfer * grid * 1e3 / 3 * element_nuclear +
+                               BOHR_STRAGGLING * z1**2 * z * effective_charge_fraction(grid, z1, m1))
+
+        _, projected, longitudinal, lateral = _range_moments(
+            grid * 1e3, electronic + nuclear, deflection, straggling)
+
+        # moments are zero at the lowest grid energy (below every energy)
+        # so interpolation starts at the next one
+        table = StoppingTable(grid[1:], electronic[1:], nuclear[1:], projected[1:],
+                              np.sqrt(longitudinal[1:]), np.sqrt(lateral[1:]), bounds='clip')
+        moments = table(energies)
+        electronic, nuclear = self.stopping(energies)
+        to_micron = 1e19 * np.dot(fraction, m2) / (self.layer.density * AVOGADRO)
+        return np.array([
+            energies, electronic, nuclear,
+            moments['range'] * to_micron,
+            moments['long_straggle'] * to_micron,
+            moments['lat_straggle'] * to_micron,
+        ])
+
+    def run(self, energies=None):
+        """Calculate stopping and range table
+
+        Parameters
+        ----------
+        energies : :class:`numpy.ndarray`, optional
+            increasing ion energies [keV]. Default energies SRModule
+            uses from ``energy_min`` to the ion energy.
+
+        Returns
+        -------
+        :class:`srim.output.SRResults`
+            table in ``output_type`` units
+        """
+        if energies is None:
+            energies = sr_energy_grid(self.settings.energy_min / 1e3, self.ion.energy / 1e3)
+        energies = np.asarray(energies, dtype=np.float64)
+        if energies.ndim != 1 or np.any(energies <= 0) or np.any(np.diff(energies) <= 0):
+            raise ValueError('energies must be positive and increasing')
+
+        units = SR_STOPPING_UNITS[self.settings.output_type - 1]
+        conversions = self.conversions()
+        data = self._table(energies)
+        data[1:3] *= conversions[units]
+        conversions = {name: factor / conversions[units] for name, factor in conversions.items()}
+
+        z2, m2, fraction = self._target_arrays
+        mass_fraction = fraction * m2 / np.dot(fraction, m2)
+        ion = {'name': self.ion.name, 'Z1': self.ion.atomic_number, 'A1': self.ion.mass}
+        target = {
+            'density g/cm3': self.layer.density,
+            'density atoms/cm3': self.layer.density * AVOGADRO / np.dot(fraction, m2),
+            'target composition': {
+                element.symbol: [element.atomic_number, 100 * f, 100 * mf]
+                for element, f, mf in zip(self.layer.elements, fraction, mass_fraction)
+            },
+        }
+        return SRResults.from_data(data, units, ion, target, conversions)
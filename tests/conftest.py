@@ -0,0 +1,48 @@
+import os
+import stat
+
+import pytest
+
+from srim.srim import TRIM
+from srim.core.target import Target
+from srim.core.layer import Layer
+from srim.core.ion import Ion
+
+TESTDATA_DIRECTORY = 'test_files'
+
+
+def _write_executable(path, script):
+    with open(path, 'w') as f:
+        f.write(script)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+@pytest.fixture
+def srim_directory(tmpdir):
+    """Fake SRIM installation
+
+    ``TRIM.exe`` copies the outputs of ``test_files/1`` and
+    ``SRModule.exe`` the output of ``test_files/SRIM`` into the
+    directory it was launched from.
+    """
+    directory = tmpdir.mkdir('srim')
+    directory.mkdir('SRIM Outputs')
+    directory.mkdir('SR Module')
+    _write_executable(str(directory.join('TRIM.exe')), (
+        '#!/bin/sh\n'
+        'cp "{}"/*.txt .\n'
+    ).format(os.path.abspath(os.path.join(TESTDATA_DIRECTORY, '1'))))
+    _write_executable(str(directory.join('SR Module', 'SRModule.exe')), (
+        '#!/bin/sh\n'
+        'cp "{}"/SR_OUTPUT.txt .\n'
+    ).format(os.path.abspath(os.path.join(TESTDATA_DIRECTORY, 'SRIM'))))
+    return str(directory)
+
+
+@pytest.fixture
+def make_trim():
+    """Factory of small TRIM calculations of a 1 MeV Ni ion in Ni"""
+    def make(number_ions=10, random_seed=1):
+        layer = Layer.from_formula('Ni', 8.9, 1000.0)
+        return TRIM(Target([layer]), Ion('Ni', 1.0e6), number_ions=number_ions, random_seed=random_seed)
+    return make
@@ -0,0 +1,114 @@
+import os
+import subprocess
+
+import numpy as np
+import pytest
+
+from srim.srim import TRIM, SR
+from srim.cache import TRIMCache, SRCache
+from srim.output import Results, SRResults
+from srim.cli import main, parse_size
+from srim.core.layer import Layer
+from srim.core.ion import Ion
+
+
+def test_trim_cache_key(srim_directory, tmpdir, make_trim):
+    cache = TRIMCache(str(tmpdir))
+    assert cache.key(make_trim(), srim_directory) == cache.key(make_trim(), srim_directory)
+    assert cache.key(make_trim(), srim_directory) != cache.key(make_trim(random_seed=2), srim_directory)
+    assert cache.key(make_trim(), srim_directory) != cache.key(make_trim(number_ions=11), srim_directory)
+
+
+def test_trim_run_cache_hit(srim_directory, tmpdir, monkeypatch, make_trim):
+    cache = TRIMCache(str(tmpdir.join('cache')))
+    assert isinstance(make_trim().run(srim_directory, cache=cache), Results)
+    assert len(cache.entries()) == 1
+
+    def launch_trim(*args):
+        raise AssertionError('TRIM launched on cache hit')
+
+    monkeypatch.setattr(TRIM, '_execute', launch_trim)
+    results = make_trim().run(srim_directory, cache=cache)
+    assert isinstance(results, Results)
+    # read before the entry is removed
+    cache.clear()
+    assert results.ioniz.num_ions > 0
+
+
+def test_trim_cache_key_executable(srim_directory, tmpdir, make_trim):
+    cache = TRIMCache(str(tmpdir))
+    key = cache.key(make_trim(), srim_directory)
+    with open(os.path.join(srim_directory, 'TRIM.exe'), 'a') as f:
+        f.write('# different build\n')
+    assert cache.key(make_trim(), srim_directory) != key
+
+
+def test_trim_cache_lru_eviction(srim_directory, tmpdir, make_trim):
+    cache = TRIMCache(str(tmpdir.join('cache')))
+    for seed in [1, 2, 3]:
+        make_trim(random_seed=seed).run(srim_directory, cache=cache)
+        key = cache.key(make_trim(random_seed=seed), srim_directory)
+        os.utime(cache.get(key), (seed, seed))
+    # mark first entry as most recently used
+    first_key = cache.key(make_trim(random_seed=1), srim_directory)
+    cache.get(first_key)
+
+    entry_size = cache.entries()[0].size
+    removed = cache.prune(2 * entry_size)
+    assert len(removed) == 1
+    assert removed[0].key == cache.key(make_trim(random_seed=2), srim_directory)
+    assert cache.entries()[-1].key == first_key
+
+
+def test_cli_cache(srim_directory, tmpdir, capsys, make_trim):
+    cache_directory = str(tmpdir.join('cache'))
+    make_trim().run(srim_directory, cache=TRIMCache(cache_directory))
+    assert main(['cache', '--directory', cache_directory, 'info']) == 0
+    assert '1 entries' in capsys.readouterr().out
+    assert main(['cache', '--directory', cache_directory, 'clear']) == 0
+    assert TRIMCache(cache_directory).entries() == []
+
+
+def test_parse_size():
+    assert parse_size('10') == 10
+    assert parse_size('1.5K') == 1536
+    assert parse_size('2G') == 2 * 1024**3
+
+
+def make_sr(energy=1.2e9, density=3.21):
+    return SR(Layer.from_formula('SiC', density, 10000.0), Ion('Xe', energy), output_type=5)
+
+
+def test_srresults_save_load(tmpdir):
+    results = SRResults(os.path.join('test_files', 'SRIM'))
+    filename = str(tmpdir.join('SR_OUTPUT.npz'))
+    results.save(filename)
+    loaded = SRResults.load(filename)
+    assert np.array_equal(loaded.data, results.data)
+    assert loaded.units == results.units
+    assert loaded.ion == results.ion
+    assert loaded.target == results.target
+
+
+def test_sr_cache_key(srim_directory, tmpdir):
+    cache = SRCache(str(tmpdir))
+    assert cache.key(make_sr(), srim_directory) == cache.key(make_sr(energy=1.0e6), srim_directory)
+    assert cache.key(make_sr(), srim_directory) != cache.key(make_sr(density=3.2), srim_directory)
+
+
+def test_sr_run_cache_energy_range(srim_directory, tmpdir, monkeypatch):
+    cache = SRCache(str(tmpdir.join('cache')))
+    results = make_sr().run(srim_directory, cache=cache)
+    assert results.data.shape == (6, 159)
+
+    def launch_srmodule(*args, **kwargs):
+        raise AssertionError('SRModule launched on cache hit')
+
+    monkeypatch.setattr(subprocess, 'check_call', launch_srmodule)
+    smaller = make_sr(energy=1.0e6).run(srim_directory, cache=cache)
+    assert np.all(smaller.data[0] <= 1.0e3)
+    assert np.array_equal(smaller.data, results.data[:, :smaller.data.shape[1]])
+
+    # larger energy range is not covered by cached table
+    with pytest.raises(AssertionError):
+        make_sr(energy=2.0e9).run(srim_directory, cache=cache)
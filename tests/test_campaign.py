@@ -0,0 +1,149 @@
+import os
+import json
+import subprocess
+import multiprocessing
+
+from srim.srim import TRIM, SR
+from srim.sweep import Sweep
+from srim.campaign import Campaign, PENDING, RUNNING, DONE, FAILED
+from srim.output import Results, SRResults
+from srim.sandbox import create_sandbox
+from srim.cache import TRIMCache, SRCache
+from srim.cli import main
+from srim.core.layer import Layer
+from srim.core.ion import Ion
+
+
+def test_campaign_add_deduplicates(tmpdir, make_trim):
+    with Campaign(str(tmpdir)) as campaign:
+        first = campaign.add(make_trim(10), name='a')
+        assert campaign.add(make_trim(10), name='b') == first
+        assert campaign.add(make_trim(20)) != first
+        assert campaign.counts() == {PENDING: 2, RUNNING: 0, DONE: 0, FAILED: 0}
+        assert campaign.load(first).number_ions == 10
+
+    # state persists between instances
+    with Campaign(str(tmpdir)) as campaign:
+        assert [job.name for job in campaign.jobs()] == ['a', None]
+
+
+def test_campaign_sweep(tmpdir, make_trim):
+    sweep = Sweep([('number_ions', [10, 20, 10])], make_trim)
+    with Campaign(str(tmpdir)) as campaign:
+        ids = campaign.add_sweep(sweep)
+        assert ids[0] == ids[2] != ids[1]
+        assert json.loads(campaign.get(ids[1]).name) == [1]
+
+
+def test_campaign_resume(srim_directory, tmpdir, make_trim):
+    with Campaign(str(tmpdir.join('campaign'))) as campaign:
+        ids = [campaign.add(make_trim(number_ions)) for number_ions in [10, 20, 30]]
+
+        # worker dies while running the first job
+        job = campaign.claim(worker='dead')
+        assert job.id == ids[0] and job.state == RUNNING and job.attempts == 1
+
+        # fail the second job
+        job = campaign.claim()
+        campaign.fail(job.id, 'crashed')
+        assert campaign.get(job.id).error == 'crashed'
+
+        assert campaign.work(srim_directory) == 1
+        assert campaign.counts() == {PENDING: 0, RUNNING: 1, DONE: 1, FAILED: 1}
+
+        assert campaign.resume(running_timeout=3600) == 1
+        assert campaign.resume() == 1
+        assert campaign.work(srim_directory) == 2
+        assert campaign.counts()[DONE] == 3
+        assert campaign.resume() == 0
+
+        job = campaign.get(ids[0])
+        assert job.attempts == 2
+        assert job.started <= job.finished
+        assert os.path.isfile(os.path.join(job.output, 'TRIM.IN'))
+        assert isinstance(campaign.results(ids[0]), Results)
+
+
+def test_campaign_sr_job(srim_directory, tmpdir):
+    sr = SR(Layer.from_formula('SiC', 3.21, 1000.0), Ion('Xe', 1.0e6))
+    with Campaign(str(tmpdir.join('campaign'))) as campaign:
+        job_id = campaign.add(sr)
+        assert campaign.work(srim_directory) == 1
+        assert isinstance(campaign.results(job_id), SRResults)
+
+
+def test_campaign_keeps_user_files(srim_directory, tmpdir, make_trim):
+    user_file = os.path.join(srim_directory, 'SRIM Outputs', 'my_calculation.txt')
+    with open(user_file, 'w') as f:
+        f.write('previous')
+    with Campaign(str(tmpdir.join('campaign'))) as campaign:
+        campaign.add(make_trim(10))
+        assert campaign.run_job(campaign.claim(), srim_directory)
+    assert os.path.isfile(user_file)
+
+
+def test_campaign_trim_cache_hit(srim_directory, tmpdir, monkeypatch, make_trim):
+    cache = TRIMCache(str(tmpdir.join('cache')))
+    make_trim(10).run(srim_directory, cache=cache)
+
+    def launch(*args, **kwargs):
+        raise AssertionError('SRIM launched on cache hit')
+
+    monkeypatch.setattr(subprocess, 'check_call', launch)
+    monkeypatch.setattr(TRIM, '_execute', launch)
+    with Campaign(str(tmpdir.join('campaign'))) as campaign:
+        job_id = campaign.add(make_trim(10))
+        assert campaign.work(srim_directory, cache=cache) == 1
+        assert campaign.get(job_id).state == DONE
+        assert os.path.isfile(os.path.join(campaign.get(job_id).output, 'IONIZ.txt'))
+        assert campaign.results(job_id).ioniz is not None
+
+
+def test_campaign_sr_cache(srim_directory, tmpdir, monkeypatch):
+    caches = (TRIMCache(str(tmpdir.join('cache'))), SRCache(str(tmpdir.join('cache'))))
+    with Campaign(str(tmpdir.join('campaign'))) as campaign:
+        campaign.add(SR(Layer.from_formula('SiC', 3.21, 1000.0), Ion('Xe', 1.0e6)))
+        assert campaign.work(srim_directory, cache=caches) == 1
+    assert len(caches[1].entries()) == 1
+
+    def launch(*args, **kwargs):
+        raise AssertionError('SRModule launched on cache hit')
+
+    monkeypatch.setattr(subprocess, 'check_call', launch)
+    with Campaign(str(tmpdir.join('other'))) as campaign:
+        job_id = campaign.add(SR(Layer.from_formula('SiC', 3.21, 1000.0), Ion('Xe', 1.0e6)))
+        assert campaign.work(srim_directory, cache=caches[1]) == 1
+        assert campaign.get(job_id).state == DONE
+
+
+def _work(directory, srim_directory):
+    with Campaign(directory) as campaign:
+        return campaign.work(srim_directory)
+
+
+def test_campaign_multiple_workers(srim_directory, tmpdir, make_trim):
+    directory = str(tmpdir.join('campaign'))
+    with Campaign(directory) as campaign:
+        for number_ions in range(1, 9):
+            campaign.add(make_trim(number_ions))
+
+    sandboxes = [create_sandbox(srim_directory, str(tmpdir.join('sandbox-{}'.format(i)))) for i in range(3)]
+    processes = [multiprocessing.Process(target=_work, args=(directory, sandbox)) for sandbox in sandboxes]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    with Campaign(directory) as campaign:
+        jobs = campaign.jobs()
+        assert all(job.state == DONE and job.attempts == 1 for job in jobs)
+
+
+def test_cli_campaign(srim_directory, tmpdir, capsys, make_trim):
+    directory = str(tmpdir.join('campaign'))
+    with Campaign(directory) as campaign:
+        campaign.add(make_trim(10))
+
+    assert main(['campaign', directory, 'work', '--srim-directory', srim_directory]) == 0
+    assert main(['campaign', directory, 'status']) == 0
+    assert 'done 1' in capsys.readouterr().out
@@ -0,0 +1,63 @@
+import os
+import stat
+import subprocess
+
+import pytest
+
+from srim.srim import TRIM
+from srim.input import AutoTRIM
+from srim.output import Results
+from srim.checkpoint import Checkpoint
+
+
+def crash_before_finishing(srim_directory, crashes):
+    """TRIM.exe that saves and crashes ``crashes`` times before finishing"""
+    filename = os.path.join(srim_directory, 'TRIM.exe')
+    with open(filename, 'w') as f:
+        f.write((
+            '#!/bin/sh\n'
+            'echo "$(head -c 1 TRIMAUTO)" >> launches\n'
+            'saves=$(cat "SRIM Restore/TRIM.sav" 2>/dev/null || echo 0)\n'
+            'if [ "$saves" -lt {crashes} ]; then\n'
+            '  echo $((saves + 1)) > "SRIM Restore/TRIM.sav"\n'
+            '  exit 1\n'
+            'fi\n'
+            'cp "{outputs}"/*.txt .\n'
+        ).format(crashes=crashes, outputs=os.path.abspath(os.path.join('test_files', '1'))))
+    os.chmod(filename, os.stat(filename).st_mode | stat.S_IEXEC)
+
+
+def test_autotrim_resume_directory():
+    assert AutoTRIM().to_bytes() == b'1'
+    assert AutoTRIM(2, 'SRIM Restore/job').to_bytes() == b'2\r\nSRIM Restore\\job\\'
+    with pytest.warns(DeprecationWarning):
+        assert AutoTRIM(2, restart_directroy='job').to_bytes() == b'2\r\njob\\'
+    with pytest.raises(ValueError):
+        AutoTRIM(3)
+
+
+def test_trim_autosave_number_of_ions(make_trim):
+    trim = TRIM(make_trim().target, make_trim().ion, autosave=500)
+    assert trim.settings.autosave == 500
+
+
+def test_run_resumable_resumes_after_crash(srim_directory, tmpdir, make_trim):
+    crash_before_finishing(srim_directory, crashes=2)
+    job_directory = str(tmpdir.join('job'))
+    results = make_trim(100).run_resumable(job_directory, srim_directory, poll_interval=0.01)
+
+    assert isinstance(results, Results)
+    with open(os.path.join(srim_directory, 'launches')) as f:
+        assert f.read().split() == ['1', '2', '2']
+    with open(os.path.join(job_directory, 'TRIM.IN'), 'rb') as f:
+        assert f.read().split(b'\r\n')[2].split()[-1] == b'10'  # autosave
+    assert not os.path.exists(os.path.join(job_directory, 'checkpoint'))
+
+
+def test_run_resumable_gives_up(srim_directory, tmpdir, make_trim):
+    crash_before_finishing(srim_directory, crashes=5)
+    job_directory = str(tmpdir.join('job'))
+    with pytest.raises(subprocess.CalledProcessError):
+        make_trim(100).run_resumable(job_directory, srim_directory, max_restarts=1, poll_interval=0.01)
+    # checkpoint survives for a later call
+    assert Checkpoint(os.path.join(job_directory, 'checkpoint')).exists
@@ -0,0 +1,100 @@
+import os
+import subprocess
+
+import numpy as np
+import pytest
+
+from srim.cache import SRCache
+from srim.core import Element, Ion, Layer
+from srim.library import StoppingLibrary
+from srim.output import SRResults
+from srim.zbl import ZBL
+
+TESTDATA_DIRECTORY = 'test_files'
+
+ELEMENTS = ['Si', 'C', 'O']
+
+
+@pytest.fixture
+def library():
+    library = StoppingLibrary()
+    assert library.build(Ion('Xe', 1e8), ELEMENTS, offline=True) == 3
+    return library
+
+
+@pytest.mark.parametrize('units', [1, 5, 7, 'keV / micron', 'L.S.S. reduced units'])
+def test_library_stopping_matches_compound(library, units):
+    layer = Layer({'Si': 1, 'O': 2}, density=2.2, width=1e4)
+    zbl = ZBL(layer, Ion('Xe', 1e8), correction=0.9)
+    electronic, nuclear = library.stopping(zbl, units)
+    expected_electronic, expected_nuclear = zbl.run(library.energy).stopping(units)
+    assert np.allclose(electronic, expected_electronic)
+    assert np.allclose(nuclear, expected_nuclear)
+
+
+def test_library_compound_stopping(library):
+    ion = Ion('Xe', 1e8)
+    fractions = np.random.RandomState(0).dirichlet([1, 1, 1], size=(4, 25))
+    electronic, nuclear = library.compound_stopping(ion, ELEMENTS, fractions * 3, correction=0.95)
+    assert electronic.shape == nuclear.shape == (4, 25, len(library.energy))
+
+    layer = Layer(dict(zip(ELEMENTS, fractions[2, 7])), density=2.0, width=1e4)
+    single = ZBL(layer, ion, correction=0.95).stopping(library.energy)
+    assert np.allclose(electronic[2, 7], single[0])
+    assert np.allclose(nuclear[2, 7], single[1])
+
+    corrections = np.linspace(0.9, 1.1, 25)
+    corrected, _ = library.compound_stopping(ion, ELEMENTS, fractions[0], correction=corrections)
+    assert np.allclose(corrected, electronic[0] / 0.95 * corrections[:, None])
+
+    with pytest.raises(ValueError):
+        library.compound_stopping(ion, ELEMENTS, fractions[..., :2])
+    with pytest.raises(KeyError):
+        library.compound_stopping(ion, ['Si', 'N'], [0.5, 0.5])
+    with pytest.raises(KeyError):
+        library.compound_stopping(Ion('Kr', 1e8), ELEMENTS, fractions[0])
+
+
+def test_library_save_load(library, tmpdir):
+    filename = str(tmpdir.join('library.npz'))
+    library.save(filename)
+    loaded = StoppingLibrary.load(filename)
+    assert sorted(loaded.keys()) == sorted(library.keys())
+    assert np.array_equal(loaded.energy, library.energy)
+
+    ion = Ion('Xe', 1e8)
+    assert loaded.build(ion, ELEMENTS + ['N'], offline=True) == 1
+    fractions = [0.2, 0.3, 0.5]
+    for a, b in zip(loaded.compound_stopping(ion, ELEMENTS, fractions),
+                    library.compound_stopping(ion, ELEMENTS, fractions)):
+        assert np.array_equal(a, b)
+
+
+def test_library_interpolates_energies():
+    ion = Ion('He', 2e6)
+    library = StoppingLibrary(np.logspace(1, 3, 20))
+    library.build(ion, ['Si'], offline=True)
+    zbl = ZBL(Layer({'Si': 1}, density=2.3, width=1e4), ion)
+    electronic, nuclear = library.compound_stopping(ion, ['Si'], [1.0])
+    assert np.allclose(electronic, zbl.stopping(library.energy)[0], rtol=1e-3)
+
+    with pytest.raises(ValueError):
+        library.add(ion, Element('C'), ZBL(Layer({'C': 1}, density=2.0, width=1e4), ion).run(np.logspace(2, 3, 10)))
+
+
+def test_library_build_srmodule_cache(srim_directory, tmpdir, monkeypatch):
+    cache = SRCache(str(tmpdir.join('cache')))
+    ion = Ion('Xe', 1.2e9)
+    library = StoppingLibrary()
+    assert library.build(ion, ['Si', 'C'], srim_directory, cache=cache) == 2
+    # fake SRModule always writes test_files/SRIM/SR_OUTPUT.txt
+    results = SRResults(os.path.join(TESTDATA_DIRECTORY, 'SRIM'))
+    assert np.array_equal(library.energy, results.data[0])
+    electronic, _ = library.compound_stopping(ion, ['Si'], [1.0])
+    assert np.allclose(electronic, results.stopping('eV/(1E15 atoms/cm2)')[0])
+
+    def launch_srmodule(*args, **kwargs):
+        raise AssertionError('SRModule launched on cache hit')
+
+    monkeypatch.setattr(subprocess, 'check_call', launch_srmodule)
+    assert StoppingLibrary().build(ion, ['C', 'Si'], srim_directory, cache=cache) == 2
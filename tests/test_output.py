@@ -1,10 +1,16 @@
 import os
+import json
+import pickle
+import shutil
 
+import numpy as np
 import pytest
 
 from srim.output import (
-    Ioniz, NoVacancy, Vacancy, EnergyToRecoils, Phonons, Range,
-    Results, SRResults
+    Ioniz, NoVacancy, Vacancy, EnergyToRecoils, Phonons, Range, Range3D,
+    Lateral, TData,
+    Backscat, Transmit, Sputter,
+    Results, SRResults, Collision, CollisionStore
 )
 
 TESTDATA_DIRECTORY = 'test_files'
@@ -38,6 +44,145 @@ def test_range_init(directory):
     assert range.depth.shape == (100,)
 
 
+@pytest.mark.parametrize("directory", [("1"), ("2"), ("3"), ("4"), ("SiC-C")])
+def test_lateral_init(directory):
+    lateral = Lateral(os.path.join(TESTDATA_DIRECTORY, directory))
+    assert lateral.depth.shape == (100,)
+    assert lateral.radial_straggle.shape == (100,)
+
+
+def test_tdata_init():
+    tdata = TData(os.path.join(TESTDATA_DIRECTORY, '3'))
+    assert tdata.title == 'B into W/SiO2/Silicon (Double Peak)'
+    assert tdata.ion.symbol == 'B'
+    assert tdata.ion.energy == 2.0e5
+    assert tdata.calculation is None
+    assert [layer['name'] for layer in tdata.layers] == ['Tungsten', 'SiO@2', 'Silicon']
+    assert tdata.layers[1]['elements']['O'] == {'atomic percent': 66.6, 'mass percent': 53.3}
+    assert tdata.layers[2]['depth'] == 3000.0
+    assert [energies['symbol'] for energies in tdata.target_energies] == ['W', 'Si', 'O', 'Si']
+    assert tdata.depth_range == (0.0, 3000.0)
+    assert tdata.num_ions == 382
+    assert tdata.backscattered == 20
+    assert tdata.transmitted == 275
+
+    tdata = TData(os.path.join(TESTDATA_DIRECTORY, '4'))
+    assert tdata.calculation == 'Kinchin-Pease Estimates'
+    assert tdata.ion.mass == 207.977
+
+
+def test_tdata_results():
+    assert Results(os.path.join(TESTDATA_DIRECTORY, 'SiC-C')).tdata is None
+    results = Results(os.path.join(TESTDATA_DIRECTORY, '3'), only=['tdata', 'lateral'])
+    merged = Results.merge([results, results])
+    assert merged.tdata.num_ions == 2 * 382
+    assert merged.tdata.transmitted == 2 * 275
+    assert np.isclose(merged.tdata.average_range, results.tdata.average_range)
+    assert np.allclose(merged.lateral.radial_range, results.lateral.radial_range)
+
+
+def test_range3d_init():
+    range3d = Range3D(os.path.join(TESTDATA_DIRECTORY, '1'))
+    # file ends in the middle of ion 997
+    assert range3d.num_ions == 996
+    assert range3d.positions.shape == (996, 3)
+    assert range3d.positions.flags['C_CONTIGUOUS']
+    assert np.array_equal(range3d.ion_numbers, np.arange(1, 997))
+    assert np.allclose(range3d.positions[0], [1.4281e4, -3.6408e3, 1.4055e3])
+    assert range3d.ion.symbol == 'Ni'
+
+    # statistics of RANGE.txt of the same (1000 ion) calculation
+    assert np.isclose(range3d.projected_range, 159.5e2, rtol=1e-2)
+    assert np.isclose(range3d.longitudinal_straggle, 308.0e1, rtol=1e-2)
+    assert np.isclose(range3d.lateral_range, 284.3e1, rtol=1e-2)
+    assert np.isclose(range3d.radial_range, 443.5e1, rtol=1e-2)
+    assert np.isclose(range3d.skewness, -0.9924, atol=1e-2)
+    assert np.isclose(range3d.kurtosis, 4.5863, atol=1e-1)
+
+    counts, edges = range3d.histogram(np.linspace(0, 25000, 11))
+    assert counts.sum() == 996
+    concentration, _ = range3d.histogram(edges, density=True)
+    assert np.isclose(np.sum(concentration * np.diff(edges) * 1e-8), 1.0)
+
+
+@pytest.mark.parametrize("row", [
+    (b'0000002 1.8767E+04'),     # not fixed width
+    (b'0000002    18767.000'),   # fixed width in another format
+])
+def test_range3d_irregular_rows(row, tmpdir):
+    with open(os.path.join(TESTDATA_DIRECTORY, '1', 'RANGE_3D.txt'), 'rb') as f:
+        output = f.read()
+    output = output.replace(b'0000002   1.8767E+04', row, 1)
+    with open(str(tmpdir.join('RANGE_3D.txt')), 'wb') as f:
+        f.write(output)
+    range3d = Range3D(str(tmpdir))
+    assert np.array_equal(range3d.positions, Range3D(os.path.join(TESTDATA_DIRECTORY, '1')).positions)
+
+
+def test_range3d_results_merge():
+    results = Results(os.path.join(TESTDATA_DIRECTORY, '1'))
+    merged = Results.merge([results, results])
+    assert merged.range3d.num_ions == 2 * 996
+    assert merged.range3d.ion_numbers[-1] == 2 * 996
+    assert Results(os.path.join(TESTDATA_DIRECTORY, '2')).range3d is None
+
+
+def test_range3d_merge_keeps_ion_numbers():
+    range3d = Range3D(os.path.join(TESTDATA_DIRECTORY, '1'))
+    gaps = Range3D.merge([range3d])
+    gaps._ion_numbers = np.array([2, 5, 9])
+    gaps._positions = range3d.positions[:3]
+    merged = Range3D.merge([gaps, gaps, range3d])
+    assert merged.ion_numbers.tolist()[:7] == [2, 5, 9, 11, 14, 18, 19]
+    assert merged.ion_numbers[-1] == 18 + 996
+
+
+@pytest.mark.parametrize("output_class, num_particles", [
+    (Backscat, 1), (Transmit, 3), (Sputter, 4)
+])
+def test_particles_init(output_class, num_particles):
+    particles = output_class(os.path.join(TESTDATA_DIRECTORY, 'particles'))
+    assert len(particles) == num_particles
+    assert particles.positions.shape == (num_particles, 3)
+    assert np.allclose(np.linalg.norm(particles.directions, axis=1), 1.0, atol=1e-4)
+
+    chunks = list(particles.iter_chunks(chunk_size=2, buffer_size=256))
+    assert [len(chunk) for chunk in chunks[:-1]] == [2] * (len(chunks) - 1)
+    assert np.array_equal(np.concatenate(chunks), particles.data)
+
+
+def test_particles_missing_file():
+    with pytest.raises(IOError):
+        Sputter(os.path.join(TESTDATA_DIRECTORY, '1'))
+
+
+def test_sputter_summaries():
+    sputter = Sputter(os.path.join(TESTDATA_DIRECTORY, 'particles'))
+    assert np.array_equal(sputter.ion_numbers, [1, 1, 3, 4])
+    assert sputter.yield_per_ion(4) == 1.0
+    assert sputter.yield_per_ion(4, atom='O') == 0.75
+    assert sputter.yield_per_ion(4, atom=14) == 0.25
+
+    counts, edges = sputter.energy_spectrum(np.array([0.0, 10.0, 100.0, 1000.0]))
+    assert np.array_equal(counts, [1, 2, 1])
+    spectrum, _ = sputter.energy_spectrum(edges, atom='O', num_ions=4)
+    assert np.allclose(spectrum, np.array([1, 1, 1]) / (4 * np.diff(edges)))
+
+    counts, edges = sputter.angular_distribution(3)
+    assert np.array_equal(edges, [0.0, 30.0, 60.0, 90.0])
+    assert np.array_equal(counts, [2, 1, 1])
+    per_sr, _ = sputter.angular_distribution(3, num_ions=4)
+    assert np.isclose(np.sum(per_sr * 2 * np.pi * -np.diff(np.cos(np.radians(edges)))), 1.0)
+
+
+def test_particles_comma_separated(tmpdir):
+    with open(str(tmpdir.join('TRANSMIT.txt')), 'wb') as f:
+        f.write(b' Numb Numb    (eV)\r\nT    7, 2,1.1877E+06,2.0000E+04,-2.4913E+02,1.6370E+02,.99996,-.00726,.00472\r\n')
+    transmit = Transmit(str(tmpdir))
+    assert transmit.ion_numbers[0] == 7
+    assert np.isclose(transmit.directions[0, 0], 0.99996)
+
+
 @pytest.mark.parametrize("directory", [("1"), ("2"), ("3")])
 def test_novacancy_init_full_calculation(directory):
     novac = NoVacancy(os.path.join(TESTDATA_DIRECTORY, directory))
@@ -65,6 +210,8 @@ def test_results_init_full(directory):
     assert isinstance(results.etorecoils, EnergyToRecoils)
     assert isinstance(results.phonons, Phonons)
     assert isinstance(results.range, Range)
+    assert isinstance(results.lateral, Lateral)
+    assert isinstance(results.tdata, TData)
 
 
 def test_resuls_init_kp_calculation():
@@ -76,6 +223,49 @@ def test_resuls_init_kp_calculation():
     assert isinstance(results.phonons, Phonons)
     assert isinstance(results.range, Range)
 
+def test_results_lazy_only_reads_requested(tmpdir):
+    shutil.copy(os.path.join(TESTDATA_DIRECTORY, '1', 'VACANCY.txt'), str(tmpdir))
+    results = Results(str(tmpdir), only=['vacancy'])
+    assert 'vacancy' not in vars(results)
+    assert isinstance(results.vacancy, Vacancy)
+    assert results.vacancy is results.vacancy
+    assert results.names == ('vacancy',)
+    with pytest.raises(AttributeError):
+        results.ioniz
+
+
+def test_results_exclude():
+    results = Results(os.path.join(TESTDATA_DIRECTORY, '1'), exclude=['range', 'phonons'])
+    assert results.names == ('ioniz', 'vacancy', 'novac', 'etorecoils', 'range3d', 'lateral', 'tdata')
+    with pytest.raises(AttributeError):
+        results.range
+    with pytest.raises(ValueError):
+        Results(os.path.join(TESTDATA_DIRECTORY, '1'), only=['collision'])
+
+
+def test_results_load_and_pickle(tmpdir):
+    for filename in os.listdir(os.path.join(TESTDATA_DIRECTORY, '1')):
+        shutil.copy(os.path.join(TESTDATA_DIRECTORY, '1', filename), str(tmpdir))
+    results = pickle.loads(pickle.dumps(Results(str(tmpdir)).load()))
+    shutil.rmtree(str(tmpdir))
+    assert isinstance(results.range, Range)
+    assert isinstance(results.novac, NoVacancy)
+
+
+def test_read_table_real_row_count(tmpdir):
+    with open(os.path.join(TESTDATA_DIRECTORY, '1', 'VACANCY.txt'), 'rb') as f:
+        output = f.read()
+    header, rows = output.split(b'-----------  \r\n', 1)
+    rows, footer = rows.split(b'\r\n\r\n', 1)
+    rows = rows.split(b'\r\n')
+    for extra, separator in [(rows[:50], b'\r\n\r\n'), (rows[:20], b'\r\n')]:
+        with open(str(tmpdir.join('VACANCY.txt')), 'wb') as f:
+            f.write(header + b'-----------  \r\n' + b'\r\n'.join(rows + extra) + separator + footer)
+        vacancy = Vacancy(str(tmpdir))
+        assert vacancy.depth.shape == (100 + len(extra),)
+        assert vacancy.knock_ons[-1] == vacancy.knock_ons[len(extra) - 1]
+
+
 def test_results_srim_calcluation():
     results = SRResults(os.path.join(TESTDATA_DIRECTORY, 'SRIM'))
     assert results.ion == {'A1': 131.293, 'Z1': 54, 'name': 'Xenon'}
@@ -89,3 +279,234 @@ def test_results_srim_calcluation():
             'Si': [14, 50.0, 70.05]
         }
     }
+
+
+def test_results_srim_table():
+    results = SRResults(os.path.join(TESTDATA_DIRECTORY, 'SRIM'))
+    table = results.table
+    assert table.dtype.names == (
+        'energy_keV', 'Se', 'Sn', 'range_um', 'long_straggle_um', 'lat_straggle_um')
+    for name, column in zip(table.dtype.names, results.data):
+        assert np.array_equal(table[name], column)
+
+    # 999.999 eV    1.599E-01  2.126E+00      27 A         8 A         6 A
+    assert np.allclose(list(table[0]), [0.999999, 0.1599, 2.126, 27e-4, 8e-4, 6e-4])
+    # units of energy (eV, keV, MeV, GeV) and length (A, um) change along the table
+    assert np.all(np.diff(table['energy_keV']) > 0)
+    assert np.all(np.diff(table['range_um']) > 0)
+
+
+def test_results_srim_stopping_units(tmpdir):
+    results = SRResults(os.path.join(TESTDATA_DIRECTORY, 'SRIM'))
+    assert len(results.stopping_units) == 8
+    electronic, nuclear = results.stopping()
+    assert np.array_equal(electronic, results.data[1])
+    assert np.array_equal(nuclear, results.data[2])
+
+    # 3.2099E+01  eV/Angstrom
+    electronic, nuclear = results.stopping('eV / angstrom')
+    assert np.allclose(electronic, 32.099 * results.data[1])
+    assert np.allclose(nuclear, 32.099 * results.data[2])
+    assert np.array_equal(results.stopping(1)[0], electronic)
+    assert np.array_equal(results.stopping(5)[0], results.data[1])
+    assert np.allclose(results.stopping('eV/(1E15 atoms/cm2)')[0], 33.29 * results.data[1])
+
+    with pytest.raises(ValueError):
+        results.stopping('furlongs/fortnight')
+    with pytest.raises(ValueError):
+        results.stopping(9)
+
+    filename = str(tmpdir.join('SR_OUTPUT.npz'))
+    results.save(filename)
+    assert np.array_equal(SRResults.load(filename).stopping(1)[0], electronic)
+
+
+def test_merge_weighted_by_num_ions():
+    ioniz_1 = Ioniz(os.path.join(TESTDATA_DIRECTORY, '1'))
+    ioniz_2 = Ioniz(os.path.join(TESTDATA_DIRECTORY, '1'))
+    ioniz_2._ions = ioniz_2.ions * 4.0
+    ioniz_2._num_ions = 3 * ioniz_1.num_ions
+
+    merged = Ioniz.merge([ioniz_1, ioniz_2])
+    assert merged.num_ions == 4 * ioniz_1.num_ions
+    assert np.allclose(merged.depth, ioniz_1.depth)
+    assert np.allclose(merged.ions, ioniz_1.ions * (1.0 + 3 * 4.0) / 4.0)
+    assert np.allclose(merged.recoils, ioniz_1.recoils)
+
+
+def test_merge_different_depth_bins():
+    with pytest.raises(ValueError):
+        Ioniz.merge([Ioniz(os.path.join(TESTDATA_DIRECTORY, '1')),
+                     Ioniz(os.path.join(TESTDATA_DIRECTORY, '2'))])
+
+
+def test_results_merge_kp_calculation():
+    results = Results(os.path.join(TESTDATA_DIRECTORY, '4'))
+    merged = Results.merge([results, results])
+    assert merged.novac is None
+    assert merged.range.num_ions == 2 * results.range.num_ions
+    assert np.allclose(merged.range.elements, results.range.elements)
+
+
+@pytest.fixture
+def collision_directory(tmpdir):
+    shutil.copy(os.path.join(TESTDATA_DIRECTORY, 'collision', 'COLLISON.txt'), str(tmpdir))
+    return str(tmpdir)
+
+
+def test_collision_index(collision_directory):
+    collision = Collision(collision_directory)
+    assert len(collision) == 3
+    assert os.path.isfile(collision.index_filename)
+    assert [collision[i]['ion_number'] for i in range(3)] == [1, 2, 3]
+    assert collision[-1]['ion_number'] == 3
+    assert len(collision[2]['collisions']) == 3
+    with pytest.raises(IndexError):
+        collision[3]
+
+
+def test_collision_index_reused_and_rebuilt(collision_directory, monkeypatch):
+    import srim.output
+
+    offsets = Collision(collision_directory)._ion_index.tolist()
+
+    def fail(*args, **kwargs):
+        raise AssertionError('index should not be rebuilt')
+    monkeypatch.setattr(srim.output, 'mmap_findall', fail)
+    assert Collision(collision_directory)._ion_index.tolist() == offsets
+    monkeypatch.undo()
+
+    # appending to the file invalidates the index
+    filename = os.path.join(collision_directory, 'COLLISON.txt')
+    with open(filename, 'rb') as f:
+        first_ion = f.read()[offsets[0]:offsets[1]]
+    with open(filename, 'ab') as f:
+        f.write(first_ion)
+    assert len(Collision(collision_directory)) == 4
+
+
+@pytest.mark.parametrize("directory", [("collision"), ("collision-cascades")])
+def test_collision_to_arrays_matches_dicts(directory, tmpdir):
+    shutil.copy(os.path.join(TESTDATA_DIRECTORY, directory, 'COLLISON.txt'), str(tmpdir))
+    collision = Collision(str(tmpdir))
+    arrays = collision.to_arrays()
+    assert len(arrays.ions) == len(collision)
+    assert arrays.ion_offsets[-1] == len(arrays.collisions)
+    assert arrays.recoil_offsets[-1] == len(arrays.recoils)
+
+    for i in range(len(collision)):
+        ion = collision[i]
+        assert arrays.ions[i]['ion_number'] == ion['ion_number']
+        assert arrays.ions[i]['vacancies'] == ion['vacancies']
+        collisions = arrays.collisions[arrays.ion_offsets[i]:arrays.ion_offsets[i + 1]]
+        assert len(collisions) == len(ion['collisions'])
+        for j, expected in zip(range(arrays.ion_offsets[i], arrays.ion_offsets[i + 1]), ion['collisions']):
+            row = arrays.collisions[j]
+            assert row['ion_number'] == expected['ion_number']
+            assert row['depth'] == expected['depth']
+            assert row['atom'].decode() == expected['atom']
+            if expected['target_disp'] is None:
+                assert np.isnan(row['target_disp'])
+            else:
+                assert row['target_disp'] == expected['target_disp']
+            recoils = arrays.recoils[arrays.recoil_offsets[j]:arrays.recoil_offsets[j + 1]]
+            cascade = expected['cascade'] or []
+            assert len(recoils) == len(cascade)
+            for recoil, expected_recoil in zip(recoils, cascade):
+                assert recoil['recoil_energy'] == expected_recoil['recoil_energy']
+                assert np.array_equal([recoil['x'], recoil['y'], recoil['z']], expected_recoil['position'])
+
+
+@pytest.mark.parametrize("directory", [("collision"), ("collision-cascades")])
+def test_collision_to_arrays_jobs(directory, tmpdir):
+    shutil.copy(os.path.join(TESTDATA_DIRECTORY, directory, 'COLLISON.txt'), str(tmpdir))
+    collision = Collision(str(tmpdir))
+    expected = collision.to_arrays()
+    arrays = collision.to_arrays(jobs=2)
+    for name in ['ions', 'recoils', 'ion_offsets', 'recoil_offsets']:
+        assert np.array_equal(getattr(arrays, name), getattr(expected, name))
+    for name in expected.collisions.dtype.names:
+        assert np.array_equal(arrays.collisions[name], expected.collisions[name], equal_nan=name != 'atom')
+
+
+def test_collision_to_arrays_range(collision_directory):
+    arrays = Collision(collision_directory).to_arrays(1, 3)
+    assert arrays.ions['ion_number'].tolist() == [2, 3]
+    assert arrays.ion_offsets.tolist() == [0, 1, 4]
+
+
+@pytest.mark.parametrize("directory", [("collision"), ("collision-cascades")])
+@pytest.mark.parametrize("chunk_size,buffer_size", [(1, 1), (2, 1024), (100, 1 << 20)])
+def test_collision_iter_chunks(directory, chunk_size, buffer_size, tmpdir):
+    shutil.copy(os.path.join(TESTDATA_DIRECTORY, directory, 'COLLISON.txt'), str(tmpdir))
+    collision = Collision(str(tmpdir))
+    expected = collision.to_arrays().collisions
+
+    chunks = list(collision.iter_chunks(chunk_size, buffer_size=buffer_size))
+    assert all(len(chunk) == chunk_size for chunk in chunks[:-1])
+    collisions = np.concatenate(chunks)
+    for name in expected.dtype.names:
+        assert np.array_equal(collisions[name], expected[name], equal_nan=name != 'atom')
+
+
+def test_collision_iter_chunks_filters(collision_directory):
+    collision = Collision(collision_directory)
+    expected = collision.to_arrays().collisions
+
+    def filtered(**kwargs):
+        return np.concatenate(list(collision.iter_chunks(2, **kwargs)))
+
+    mask = (expected['recoil_energy'] >= 100.0) & (expected['depth'] >= 100.0) & (expected['depth'] <= 600.0)
+    assert np.array_equal(filtered(min_recoil_energy=100.0, depth_range=(100.0, 600.0)), expected[mask])
+    assert len(filtered(atoms=['Ni'])) == len(expected)
+    assert list(collision.iter_chunks(atoms=['Si'])) == []
+
+
+@pytest.mark.parametrize("directory", [("collision"), ("collision-cascades")])
+@pytest.mark.parametrize("compact,jobs", [(True, None), (False, None), (True, 2)])
+def test_collision_convert(directory, compact, jobs, tmpdir):
+    shutil.copy(os.path.join(TESTDATA_DIRECTORY, directory, 'COLLISON.txt'), str(tmpdir))
+    collision = Collision(str(tmpdir))
+    store = collision.convert(str(tmpdir.join('store')), compact=compact, buffer_size=1024, jobs=jobs)
+    store = CollisionStore(str(tmpdir.join('store')))
+    assert isinstance(store.collisions['depth'], np.memmap)
+    assert store.collisions['depth'].dtype == (np.float32 if compact else np.float64)
+
+    assert len(store) == len(collision)
+    expected, arrays = collision.to_arrays(1), store.to_arrays(1)
+    for table in ['ions', 'collisions', 'recoils']:
+        for name in getattr(expected, table).dtype.names:
+            values, expected_values = getattr(arrays, table)[name], getattr(expected, table)[name]
+            if values.dtype.kind == 'f' and compact:
+                # lossless: float32 keeps the five significant digits SRIM writes
+                decimal = np.array([float('{:.4e}'.format(value)) for value in values])
+                assert np.array_equal(decimal, expected_values, equal_nan=True)
+            else:
+                assert np.array_equal(values, expected_values)
+    assert np.array_equal(arrays.ion_offsets, expected.ion_offsets)
+    assert np.array_equal(arrays.recoil_offsets, expected.recoil_offsets)
+
+    for i in range(len(collision)):
+        ion, stored_ion = collision[i], store[i]
+        assert stored_ion['ion_number'] == ion['ion_number']
+        assert len(stored_ion['collisions']) == len(ion['collisions'])
+        for stored, original in zip(stored_ion['collisions'], ion['collisions']):
+            assert stored['atom'] == original['atom']
+            assert (stored['cascade'] is None) == (original['cascade'] is None)
+            assert (stored['target_disp'] is None) == (original['target_disp'] is None)
+
+    chunks = list(store.iter_chunks(2, min_recoil_energy=100.0))
+    assert np.allclose(np.concatenate(chunks)['recoil_energy'],
+                       np.concatenate(list(collision.iter_chunks(2, min_recoil_energy=100.0)))['recoil_energy'])
+
+
+def test_collision_store_version(collision_directory, tmpdir):
+    path = str(tmpdir.join('store'))
+    Collision(collision_directory).convert(path)
+    with open(os.path.join(path, 'schema.json')) as f:
+        schema = json.load(f)
+    schema['version'] = 0
+    with open(os.path.join(path, 'schema.json'), 'w') as f:
+        json.dump(schema, f)
+    with pytest.raises(ValueError):
+        CollisionStore(path)
@@ -0,0 +1,145 @@
+import os
+import asyncio
+
+import numpy as np
+
+from srim.srim import SR
+from srim.pool import TRIMPool, run_many
+from srim.sandbox import SandboxPool
+from srim.output import Results, SRResults
+from srim.core.layer import Layer
+from srim.core.ion import Ion
+
+
+def test_trim_run_does_not_change_directory(srim_directory, make_trim):
+    current_directory = os.getcwd()
+    results = make_trim(10).run(srim_directory)
+    assert os.getcwd() == current_directory
+    assert isinstance(results, Results)
+    assert os.path.isfile(os.path.join(srim_directory, 'TRIM.IN'))
+
+
+def test_run_many_isolated_outputs(srim_directory, tmpdir, make_trim):
+    trims = [make_trim(number_ions) for number_ions in [10, 20, 30, 40]]
+    output_directories = [str(tmpdir.join('run-{}'.format(i))) for i in range(len(trims))]
+    results = run_many(trims, jobs=2, srim_directory=srim_directory,
+                       output_directories=output_directories)
+
+    assert len(results) == len(trims)
+    for trim, output_directory, result in zip(trims, output_directories, results):
+        assert isinstance(result, Results)
+        with open(os.path.join(output_directory, 'TRIM.IN'), 'rb') as f:
+            ion_line = f.read().split(b'\r\n')[2]
+        assert int(ion_line.split()[4]) == trim.number_ions
+    # shared srim directory is never written to
+    assert not os.path.isfile(os.path.join(srim_directory, 'TRIM.IN'))
+
+
+def test_run_many_no_more_workers_than_calculations(srim_directory, monkeypatch, make_trim):
+    jobs = []
+    close = TRIMPool.close
+
+    def record_close(pool):
+        jobs.append(pool.jobs)
+        close(pool)
+
+    monkeypatch.setattr(TRIMPool, 'close', record_close)
+    results = run_many((make_trim(number_ions) for number_ions in [10, 20]), jobs=8,
+                       srim_directory=srim_directory)
+    assert len(results) == 2
+    assert jobs == [2]
+
+
+def test_trim_pool_removes_temporary_work_directory(srim_directory, make_trim):
+    with TRIMPool(jobs=2, srim_directory=srim_directory) as pool:
+        work_directory = pool.work_directory
+        results = pool.submit(make_trim(10)).result()
+        assert isinstance(results, Results)
+        assert sorted(os.listdir(work_directory)) == ['output', 'sandboxes']
+    assert not os.path.exists(work_directory)
+
+
+def test_trim_shards_reproducible_seeds(make_trim):
+    trim = make_trim(1001)
+    shards = trim.shards(4)
+    assert [shard.number_ions for shard in shards] == [251, 250, 250, 250]
+    seeds = [shard.settings.random_seed for shard in shards]
+    assert len(set(seeds)) == 4
+    assert seeds == [shard.settings.random_seed for shard in trim.shards(4)]
+
+
+def test_trim_run_sharded(srim_directory, tmpdir, make_trim):
+    results = make_trim(100).run_sharded(3, jobs=2, srim_directory=srim_directory,
+                                        output_directory=str(tmpdir))
+    single = Results(os.path.join('test_files', '1'))
+    assert results.ioniz.num_ions == 3 * single.ioniz.num_ions
+    assert np.allclose(results.vacancy.vacancies, single.vacancy.vacancies)
+    assert sorted(os.listdir(str(tmpdir))) == ['shard-0', 'shard-1', 'shard-2', 'srim']
+
+
+def test_trim_run_async_concurrent(srim_directory, tmpdir, make_trim):
+    trims = [make_trim(number_ions) for number_ions in [10, 20, 30]]
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(2)
+        return await asyncio.gather(*[
+            trim.run_async(srim_directory, str(tmpdir.join(str(i))), semaphore=semaphore)
+            for i, trim in enumerate(trims)])
+
+    results = asyncio.run(run_all())
+    assert all(isinstance(result, Results) for result in results)
+    assert sorted(os.listdir(str(tmpdir))) == ['0', '1', '2', 'srim']
+    assert not os.path.isfile(os.path.join(srim_directory, 'TRIM.IN'))
+
+
+def test_sr_run_async(srim_directory):
+    sr = SR(Layer.from_formula('SiC', 3.21, 10000.0), Ion('Xe', 1.2e9), output_type=5)
+    results = asyncio.run(sr.run_async(srim_directory))
+    assert isinstance(results, SRResults)
+    assert not os.path.isfile(os.path.join(srim_directory, 'SR Module', 'SR.IN'))
+
+
+def test_trim_pool_reuses_sandboxes(srim_directory, tmpdir, make_trim):
+    with SandboxPool(srim_directory, 2, str(tmpdir.join('sandboxes')), link=True) as sandboxes:
+        for _ in range(2):
+            results = run_many([make_trim(10), make_trim(20)], srim_directory=srim_directory,
+                               sandboxes=sandboxes)
+            assert len(results) == 2
+            assert all(os.path.isdir(sandbox) for sandbox in sandboxes.sandboxes)
+
+        async def run_all():
+            return await asyncio.gather(*[
+                make_trim(number_ions).run_async(srim_directory, sandboxes=sandboxes)
+                for number_ions in [10, 20, 30]])
+
+        assert len(asyncio.run(run_all())) == 3
+
+
+def test_trim_pool_skips_sandboxes_in_use(srim_directory, tmpdir, make_trim):
+    with SandboxPool(srim_directory, 3, str(tmpdir.join('sandboxes'))) as sandboxes:
+        held = sandboxes.get()
+        with open(os.path.join(held, 'TRIM.IN'), 'w') as f:
+            f.write('in use')
+        with TRIMPool(2, srim_directory, sandboxes=sandboxes) as pool:
+            assert len(pool.map([make_trim(10), make_trim(20), make_trim(30)])) == 3
+            assert sandboxes._available.empty()
+        with open(os.path.join(held, 'TRIM.IN')) as f:
+            assert f.read() == 'in use'
+        assert sorted(sandboxes.get(block=False) for _ in range(2)) == sorted(
+            sandbox for sandbox in sandboxes.sandboxes if sandbox != held)
+
+
+def test_trim_run_async_waits_for_sandbox(srim_directory, tmpdir, monkeypatch, make_trim):
+    def sleep(delay, *args, **kwargs):
+        raise AssertionError('polled for a sandbox')
+
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    with SandboxPool(srim_directory, 1, str(tmpdir.join('sandboxes'))) as sandboxes:
+        async def run_all():
+            return await asyncio.gather(*[
+                make_trim(number_ions).run_async(srim_directory, sandboxes=sandboxes)
+                for number_ions in [10, 20, 30]])
+
+        assert len(asyncio.run(run_all())) == 3
+        assert len(asyncio.run(run_all())) == 3  # new event loop
+        assert sandboxes.get(block=False) == sandboxes.sandboxes[0]
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from srim.sandbox import create_sandbox, reset_sandbox, SandboxPool
+
+
+def test_create_sandbox_link(srim_directory, tmpdir):
+    with open(os.path.join(srim_directory, 'TRIM.IN'), 'w') as f:
+        f.write('old input')
+    sandbox = create_sandbox(srim_directory, str(tmpdir.join('sandbox')), link=True)
+
+    original = os.stat(os.path.join(srim_directory, 'TRIM.exe'))
+    assert os.stat(os.path.join(sandbox, 'TRIM.exe')).st_ino == original.st_ino
+    assert os.path.isfile(os.path.join(sandbox, 'SR Module', 'SRModule.exe'))
+    # input files are removed, never linked
+    assert not os.path.exists(os.path.join(sandbox, 'TRIM.IN'))
+
+
+def test_reset_sandbox(srim_directory):
+    for filename in ['TRIM.IN', 'TRIMAUTO', 'IONIZ.txt', os.path.join('SRIM Outputs', 'anything.txt'),
+                     os.path.join('SR Module', 'SR.IN')]:
+        with open(os.path.join(srim_directory, filename), 'w') as f:
+            f.write('')
+    reset_sandbox(srim_directory)
+    assert sorted(os.listdir(srim_directory)) == ['SR Module', 'SRIM Outputs', 'TRIM.exe']
+    assert os.listdir(os.path.join(srim_directory, 'SRIM Outputs')) == []
+    assert os.listdir(os.path.join(srim_directory, 'SR Module')) == ['SRModule.exe']
+
+
+def test_reset_user_installation(srim_directory):
+    filenames = ['TRIM.IN', 'IONIZ.txt', os.path.join('SRIM Outputs', 'IONIZ.txt'),
+                 os.path.join('SRIM Outputs', 'anything.txt'),
+                 os.path.join('SR Module', 'SR.IN'), os.path.join('SR Module', 'SR_OUTPUT.txt')]
+    for filename in filenames:
+        with open(os.path.join(srim_directory, filename), 'w') as f:
+            f.write('')
+    reset_sandbox(srim_directory, owned=False)
+    assert sorted(os.listdir(srim_directory)) == ['SR Module', 'SRIM Outputs', 'TRIM.exe']
+    assert os.listdir(os.path.join(srim_directory, 'SRIM Outputs')) == ['anything.txt']
+    assert sorted(os.listdir(os.path.join(srim_directory, 'SR Module'))) == ['SR.IN', 'SRModule.exe', 'SR_OUTPUT.txt']
+
+
+def test_sandbox_pool_reuse(srim_directory, tmpdir):
+    directory = str(tmpdir.join('sandboxes'))
+    with SandboxPool(srim_directory, 2, directory, link=True) as sandboxes:
+        assert len(sandboxes) == 2
+        with sandboxes.acquire() as sandbox:
+            with open(os.path.join(sandbox, 'TRIM.IN'), 'w') as f:
+                f.write('input')
+            marker = os.stat(os.path.join(sandbox, 'TRIM.exe'))
+        assert not os.path.exists(os.path.join(sandbox, 'TRIM.IN'))
+
+    # sandboxes in a user directory are kept and reused
+    with SandboxPool(srim_directory, 2, directory) as sandboxes:
+        assert os.stat(os.path.join(sandboxes.sandboxes[0], 'TRIM.exe')).st_mtime == marker.st_mtime
+        sandboxes.close(remove=True)
+    assert os.listdir(directory) == []
+
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='requires /dev/shm')
+def test_sandbox_pool_tmpfs(srim_directory):
+    with SandboxPool(srim_directory, 1, tmpfs=True) as sandboxes:
+        assert sandboxes.directory.startswith('/dev/shm')
+    assert not os.path.exists(sandboxes.directory)
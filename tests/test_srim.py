@@ -40,3 +40,11 @@ def test_simple_srim_init():
 
     # resulting file should be equal to
     # test_files/SRIM/SR_OUTPUT.txt
+
+
+def test_trim_settings_output_files():
+    ion = Ion('Ni', 1.0e6)
+    target = Target([Layer.from_formula('Ni', 8.9, 1000.0)])
+    trim = TRIM(target, ion, sputtered=1)
+    assert trim.settings.sputtered == 1
+    assert trim.settings.ranges == 0
@@ -0,0 +1,99 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from srim.output import SRResults
+from srim.stopping import StoppingTable
+
+TESTDATA_DIRECTORY = 'test_files'
+
+# values outside of the table must not be computed and masked afterwards
+pytestmark = pytest.mark.filterwarnings('error::RuntimeWarning')
+
+
+def power_law_table(**kwargs):
+    energy = np.logspace(0, 4, 9)
+    return StoppingTable(energy, 2 * energy**0.5, 3 * energy**-0.3, 0.1 * energy**1.2,
+                         0.05 * energy, 0.02 * energy, **kwargs)
+
+
+def test_stopping_table_exact_at_knots():
+    results = SRResults(os.path.join(TESTDATA_DIRECTORY, 'SRIM'))
+    table = StoppingTable.from_results(results, units='MeV/(mg/cm2)')
+    energy = results.data[0]
+    values = table(energy)
+
+    Se, Sn = results.stopping('MeV/(mg/cm2)')
+    assert table.units == 'MeV/(mg/cm2)'
+    assert np.allclose(values['Se'], Se, rtol=1e-12)
+    assert np.allclose(values['Sn'], Sn, rtol=1e-12)
+    assert np.allclose(values['total'], Se + Sn, rtol=1e-12)
+    assert np.allclose(values['range'], results.data[3], rtol=1e-12)
+    assert np.allclose(values['lat_straggle'], results.data[5], rtol=1e-12)
+
+
+def test_stopping_table_monotone_between_knots():
+    results = SRResults(os.path.join(TESTDATA_DIRECTORY, 'SRIM'))
+    table = StoppingTable.from_results(results)
+    energy = results.data[0]
+    energies = np.exp(np.linspace(np.log(energy[0]), np.log(energy[-1]), 10000)).clip(energy[0], energy[-1])
+    for quantity in ['range', 'long_straggle', 'lat_straggle']:
+        assert np.all(np.diff(table(energies, quantity)) >= 0)
+
+    # never overshoots the neighbouring knots
+    Se = table(energies, 'Se')
+    index = np.clip(np.searchsorted(energy, energies, side='right') - 1, 0, len(energy) - 2)
+    lower = np.minimum(results.data[1][index], results.data[1][index + 1])
+    upper = np.maximum(results.data[1][index], results.data[1][index + 1])
+    assert np.all((Se >= lower * (1 - 1e-12)) & (Se <= upper * (1 + 1e-12)))
+
+
+def test_stopping_table_power_law():
+    table = power_law_table()
+    energies = np.logspace(0, 4, 1001).reshape(7, 143)
+    assert table(energies, 'Se').shape == (7, 143)
+    assert np.allclose(table(energies, 'Se'), 2 * energies**0.5, rtol=1e-12)
+    assert np.allclose(table(energies, 'range'), 0.1 * energies**1.2, rtol=1e-12)
+    assert np.allclose(table(energies)['Sn'], 3 * energies**-0.3, rtol=1e-12)
+
+
+def test_stopping_table_bounds():
+    energies = np.array([0.5, 10.0, 2e4])
+    with pytest.raises(ValueError):
+        power_law_table()(energies)
+
+    clipped = power_law_table(bounds='clip')(energies, 'Se')
+    assert np.allclose(clipped, [2.0, 2 * 10**0.5, 200.0])
+
+    nan = power_law_table(bounds='nan')(energies, 'Se')
+    assert np.isnan(nan[0]) and np.isnan(nan[2])
+    assert np.isclose(nan[1], 2 * 10**0.5)
+
+    extrapolated = power_law_table(bounds='extrapolate')(energies, 'Se')
+    assert np.allclose(extrapolated, 2 * energies**0.5)
+
+    energies = np.array([-1.0, 0.0, 1e300])
+    assert np.allclose(power_law_table(bounds='clip')(energies, 'Se'), [2.0, 2.0, 200.0])
+    assert np.all(np.isnan(power_law_table(bounds='nan')(energies, 'Se')))
+    assert np.all(np.isnan(power_law_table(bounds='extrapolate')(energies[:2], 'Se')))
+
+    with pytest.raises(ValueError):
+        power_law_table(bounds='wrap')
+    with pytest.raises(ValueError):
+        power_law_table()(energies[1:2], 'Z')
+
+
+def test_stopping_table_pickle_save_load(tmpdir):
+    table = StoppingTable.from_results(SRResults(os.path.join(TESTDATA_DIRECTORY, 'SRIM')), bounds='nan')
+    energies = np.logspace(-1, 7, 200)
+
+    filename = str(tmpdir.join('table.npz'))
+    table.save(filename)
+    for other in [pickle.loads(pickle.dumps(table)), StoppingTable.load(filename)]:
+        assert other.units == table.units
+        assert other.bounds == 'nan'
+        values, other_values = table(energies), other(energies)
+        for quantity in values.dtype.names:
+            assert np.array_equal(other_values[quantity], values[quantity], equal_nan=True)
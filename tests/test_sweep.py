@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from srim.srim import TRIM
+from srim.sweep import Sweep
+from srim.output import Results
+from srim.core.target import Target
+from srim.core.layer import Layer
+from srim.core.ion import Ion
+
+
+TARGET = Target([Layer.from_formula('Ni', 8.9, 1000.0)])
+
+
+def test_sweep_lazy_expansion():
+    sweep = Sweep([
+        ('ion', [Ion('Ni', energy) for energy in [1.0e6, 2.0e6, 3.0e6]]),
+        ('random_seed', [1, 2]),
+    ], target=TARGET, number_ions=10)
+    assert sweep.names == ['ion', 'random_seed']
+    assert sweep.shape == (3, 2)
+    assert len(sweep) == 6
+
+    trim = sweep[2, 1]
+    assert trim.ion.energy == 3.0e6
+    assert trim.settings.random_seed == 2
+    assert [index for index, _ in sweep] == [(i, j) for i in range(3) for j in range(2)]
+
+
+def test_sweep_factory_and_unique():
+    def make_trim(width, E_d):
+        layer = Layer({'Ni': {'stoich': 1.0, 'E_d': E_d}}, 8.9, width)
+        return TRIM(Target([layer]), Ion('Ni', 1.0e6), number_ions=10, random_seed=1)
+
+    sweep = Sweep([('width', [1000.0, 1000.0]), ('E_d', [25.0, 40.0])], make_trim)
+    groups = sweep.unique()
+    assert len(groups) == 2
+    assert groups[0][1] == [(0, 0), (1, 0)]
+    assert groups[1][1] == [(0, 1), (1, 1)]
+
+
+def test_sweep_run_deduplicates(srim_directory, tmpdir):
+    sweep = Sweep([
+        ('number_ions', [10, 20, 10]),
+        ('random_seed', [1, 2]),
+    ], target=TARGET, ion=Ion('Ni', 1.0e6))
+
+    output_directory = str(tmpdir.join('sweep'))
+    streamed = list(sweep.as_completed(jobs=2, srim_directory=srim_directory,
+                                       output_directory=output_directory))
+    assert sorted(index for index, _ in streamed) == [(i, j) for i in range(3) for j in range(2)]
+    # third row duplicates the first and is not run again
+    assert sorted(os.listdir(output_directory)) == ['0_0', '0_1', '1_0', '1_1']
+
+    results = sweep.run(jobs=2, srim_directory=srim_directory)
+    assert results.shape == (3, 2)
+    assert all(isinstance(result, Results) for result in results.flat)
+    assert results[0, 0] is results[2, 0]
+
+    ions = Sweep.stack(results, lambda result: result.ioniz.ions)
+    assert ions.shape == (3, 2, 100)
+    assert np.allclose(ions[0, 0], results[0, 0].ioniz.ions)
+
+
+def test_sweep_default_factory_shares_random_seed():
+    sweep = Sweep([('number_ions', [10, 20, 10])], target=TARGET, ion=Ion('Ni', 1.0e6))
+    seeds = {trim.settings.random_seed for _, trim in sweep}
+    assert len(seeds) == 1
+    groups = sweep.unique()
+    assert [indicies for _, indicies in groups] == [[(0,), (2,)], [(1,)]]
@@ -0,0 +1,102 @@
+import os
+import stat
+import time
+
+import pytest
+
+from srim.output import Results, MERGED_RESULTS_FILENAME
+from srim.pool import TRIMPool
+from srim.campaign import Campaign
+from srim.watchdog import Watchdog, WatchdogError, RetryPolicy, TRIMRunError
+
+
+def fail_first(srim_directory, failures):
+    """TRIM.exe that exits with an error the first ``failures`` launches"""
+    filename = os.path.join(srim_directory, 'TRIM.exe')
+    with open(filename, 'w') as f:
+        f.write((
+            '#!/bin/sh\n'
+            'head -n 5 TRIM.IN | tail -n 1 >> seeds\n'
+            'if [ "$(wc -l < seeds)" -le {failures} ]; then exit 2; fi\n'
+            'cp "{outputs}"/*.txt .\n'
+        ).format(failures=failures, outputs=os.path.abspath(os.path.join('test_files', '1'))))
+    os.chmod(filename, os.stat(filename).st_mode | stat.S_IEXEC)
+
+
+@pytest.mark.parametrize('watchdog, command, reason', [
+    (Watchdog(timeout=0.2, poll_interval=0.05), ['sleep', '10'], 'timeout'),
+    (Watchdog(idle_timeout=0.2, poll_interval=0.05), ['sleep', '10'], 'idle'),
+    (Watchdog(memory_limit=1, poll_interval=0.05), ['sleep', '10'], 'memory'),
+    (Watchdog(poll_interval=0.05), ['sh', '-c', 'exit 3'], 'exit'),
+])
+def test_watchdog_failure_reason(tmpdir, watchdog, command, reason):
+    start = time.time()
+    with pytest.raises(WatchdogError) as excinfo:
+        watchdog.run(command, cwd=str(tmpdir))
+    assert excinfo.value.failure.reason == reason
+    assert time.time() - start < 5.0
+
+
+def test_watchdog_output_resets_idle_timer(tmpdir):
+    watchdog = Watchdog(idle_timeout=0.5, poll_interval=0.05)
+    watchdog.run(['sh', '-c', 'for i in 1 2 3 4 5 6; do echo $i >> out; sleep 0.2; done'], cwd=str(tmpdir))
+
+
+def test_retry_reseeds(srim_directory, make_trim):
+    fail_first(srim_directory, 2)
+    results = make_trim(100, random_seed=7).run(srim_directory, retry=RetryPolicy(max_attempts=3))
+    assert isinstance(results, Results)
+    assert [failure.reason for failure in results.failures] == ['exit', 'exit']
+    assert [failure.attempt for failure in results.failures] == [1, 2]
+    with open(os.path.join(srim_directory, 'seeds')) as f:
+        seeds = [line.split()[1] for line in f]
+    assert seeds[0] == '7' and len(set(seeds)) == 3
+
+
+def test_retry_gives_up(srim_directory, make_trim):
+    fail_first(srim_directory, 10)
+    with pytest.raises(TRIMRunError) as excinfo:
+        make_trim(100, random_seed=7).run(srim_directory, retry=RetryPolicy(max_attempts=2, reseed=False))
+    assert [failure.random_seed for failure in excinfo.value.failures] == [7, 7]
+
+
+def test_retry_split(srim_directory, make_trim):
+    fail_first(srim_directory, 1)
+    results = make_trim(100).run(srim_directory, retry=RetryPolicy(max_attempts=1, split=True))
+    assert results.ioniz.num_ions == 2 * Results(os.path.join('test_files', '1')).ioniz.num_ions
+    assert results.failures[0].number_ions == 100
+
+
+def test_retry_split_stores_merged_results(srim_directory, tmpdir, make_trim):
+    fail_first(srim_directory, 1)
+    with Campaign(str(tmpdir.join('campaign'))) as campaign:
+        job_id = campaign.add(make_trim(100))
+        assert campaign.work(srim_directory, retry=RetryPolicy(max_attempts=1, split=True)) == 1
+        output = campaign.get(job_id).output
+        # output files of the last shard alone must not be kept
+        assert os.listdir(output) == [MERGED_RESULTS_FILENAME]
+        results = campaign.results(job_id)
+        assert results.ioniz.num_ions == 2 * Results(os.path.join('test_files', '1')).ioniz.num_ions
+        assert results.failures[0].number_ions == 100
+
+
+def test_retry_split_pool_output_directory(srim_directory, tmpdir, make_trim):
+    fail_first(srim_directory, 1)
+    output = str(tmpdir.join('output'))
+    with TRIMPool(1, srim_directory, retry=RetryPolicy(max_attempts=1, split=True)) as pool:
+        results = pool.map([make_trim(100)], [output])[0]
+    assert results.ioniz.num_ions == 2 * Results(os.path.join('test_files', '1')).ioniz.num_ions
+    assert os.listdir(output) == [MERGED_RESULTS_FILENAME]
+    assert Results.open(output).ioniz.num_ions == results.ioniz.num_ions
+
+
+def test_retry_keeps_user_files(srim_directory, make_trim):
+    fail_first(srim_directory, 1)
+    user_file = os.path.join(srim_directory, 'SRIM Outputs', 'my_calculation.txt')
+    trim_file = os.path.join(srim_directory, 'SRIM Outputs', 'COLLISON.txt')
+    for filename in [user_file, trim_file]:
+        with open(filename, 'w') as f:
+            f.write('previous')
+    make_trim(100).run(srim_directory, retry=RetryPolicy(max_attempts=2))
+    assert os.path.isfile(user_file)
+    assert not os.path.exists(trim_file)
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pytest
+
+from srim.core import Ion, Layer
+from srim.output import SRResults
+from srim.zbl import ZBL, sr_energy_grid, nuclear_stopping, electronic_stopping
+
+TESTDATA_DIRECTORY = 'test_files'
+
+# layer, ion, energy_min [eV] and compound correction of SR.IN in each directory
+SR_CALCULATIONS = {
+    'SRIM': (Layer({'Si': 0.5, 'C': 0.5}, density=3.21, width=1e4), Ion('Xe', 1.2e9, 131.293), 1e3, 1.0),
+    '5': (Layer({'H': 8, 'C': 3, 'O': 2}, density=1.0597, width=1e4), Ion('H', 1e7, 1.008), 1e4, 0.9457121),
+}
+
+
+def zbl_results(directory):
+    layer, ion, energy_min, correction = SR_CALCULATIONS[directory]
+    return ZBL(layer, ion, output_type=5, energy_min=energy_min, correction=correction).run()
+
+
+@pytest.mark.parametrize('directory', ['SRIM', '5'])
+def test_zbl_energy_grid_and_units(directory):
+    results = SRResults(os.path.join(TESTDATA_DIRECTORY, directory))
+    zbl = zbl_results(directory)
+    assert np.allclose(zbl.data[0], results.data[0], rtol=1e-5)
+    assert zbl.units == results.units
+    assert zbl.ion['Z1'] == results.ion['Z1']
+    assert np.isclose(zbl.target['density atoms/cm3'], results.target['density atoms/cm3'], rtol=1e-3)
+    for units, factor in results._conversions.items():
+        assert np.isclose(zbl._conversions[units], factor, rtol=2e-3)
+
+
+@pytest.mark.parametrize('directory', ['SRIM', '5'])
+def test_zbl_against_sr_output(directory):
+    """Nuclear stopping is ZBL. Other columns come from simpler models
+    than SRModule so only agree loosely"""
+    results = SRResults(os.path.join(TESTDATA_DIRECTORY, directory))
+    ratio = zbl_results(directory).data[1:] / results.data[1:]
+    electronic, nuclear, projected, longitudinal, lateral = ratio
+
+    assert np.allclose(nuclear, 1.0, rtol=0.02)
+    assert np.all((electronic > 0.6) & (electronic < 1.05))
+    assert np.all((projected > 0.9) & (projected < 1.5))
+    for straggle in [longitudinal, lateral]:
+        assert np.all((straggle > 1 / 2.6) & (straggle < 2.6))
+
+
+def test_zbl_bragg_additivity():
+    ion = Ion('Ar', 1e6)
+    energies = np.logspace(0, 3, 50)
+    compound = ZBL(Layer({'Si': 1, 'O': 2}, density=2.2, width=1e4), ion, correction=0.9)
+    silicon = ZBL(Layer({'Si': 1}, density=2.3, width=1e4), ion)
+    oxygen = ZBL(Layer({'O': 1}, density=1.0, width=1e4), ion)
+
+    expected = [(s + 2 * o) / 3 for s, o in zip(silicon.stopping(energies), oxygen.stopping(energies))]
+    electronic, nuclear = compound.stopping(energies)
+    assert np.allclose(electronic, 0.9 * expected[0])
+    assert np.allclose(nuclear, expected[1])
+
+
+def test_zbl_limits():
+    # electronic stopping proportional to velocity at low energy
+    energies = np.array([1e-2, 1e-1])
+    electronic = electronic_stopping(energies, 14, 28.0855, 14)
+    assert np.isclose(electronic[1] / electronic[0], np.sqrt(10), rtol=1e-2)
+    # and falls off at high energy (before the relativistic rise)
+    assert np.all(np.diff(electronic_stopping(np.logspace(4, 6, 10), 1, 1.008, 6)) < 0)
+    # nuclear stopping has a single maximum
+    nuclear = nuclear_stopping(np.logspace(-2, 6, 200), 14, 28.0855, 14, 28.0855)
+    assert np.all(nuclear > 0)
+    assert np.count_nonzero(np.diff(np.sign(np.diff(nuclear)))) == 1
+
+
+def test_zbl_run_energies():
+    zbl = ZBL(Layer({'Si': 1}, density=2.3212, width=1e4), Ion('He', 2e6))
+    energies = np.logspace(1, 3, 7)
+    results = zbl.run(energies)
+    assert results.data.shape == (6, 7)
+    assert np.array_equal(results.data[0], energies)
+    assert results.units == 'eV/Angstrom'
+    assert np.all(np.diff(results.data[3]) > 0)
+    assert np.allclose(sr_energy_grid(10, 2000)[[0, 1, -2, -1]], [10, 11, 1800, 2000])
+
+    with pytest.raises(ValueError):
+        zbl.run(energies[::-1])
+
+
+def test_zbl_run_many_energies():
+    """Range moments are calculated on the SRModule grid and interpolated"""
+    zbl = ZBL(*SR_CALCULATIONS['SRIM'][:2], output_type=5)
+    table = zbl.run().data
+    energies = np.union1d(np.logspace(0, 6, 200000), table[0])
+    data = zbl.run(energies).data
+    assert data.shape == (6, len(energies))
+    assert np.allclose(data[:, np.searchsorted(energies, table[0])], table, rtol=1e-9)
+    assert np.all(np.diff(data[3]) > 0)